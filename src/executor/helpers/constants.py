@@ -12,6 +12,11 @@ ENV_CLOUDSDK_CORE_PROJECT = "CLOUDSDK_CORE_PROJECT"
 
 AWS_DEFAULT_REGION = "us-east-1"
 
+# written by the profiling tracer next to Cloud Custodian's metadata.json
+POLICY_PROFILE_FILENAME = "profile.json"
+# region process appends every finished policy here, see PoliciesJournal
+POLICIES_JOURNAL_FILENAME = ".finished.jsonl"
+
 
 INVALID_CREDENTIALS_ERROR_CODES = {
     Cloud.AWS: {
@@ -0,0 +1,189 @@
+"""
+Incremental reading and writing of Cloud Custodian ``resources.json`` files.
+
+Cloud Custodian writes all resources of a policy as one indented JSON array.
+Decoding it at once keeps both the raw bytes and all decoded objects in
+memory, which for rules with hundreds of thousands of resources means
+gigabytes of RSS. The reader here decodes the array element by element from
+a bounded text buffer, so only decoded resources stay alive. Small files are
+still decoded at once with msgspec because that is faster.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import BinaryIO, Generator, Iterable
+
+import msgspec
+
+# files smaller than this are decoded at once
+STREAM_THRESHOLD = 32 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+_encoder = msgspec.json.Encoder()
+
+
+class _Buffer:
+    __slots__ = ('_fp', '_size', 'data', 'pos', 'eof')
+
+    def __init__(self, fp, size: int):
+        self._fp = fp
+        self._size = size
+        self.data = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> None:
+        """
+        Drops consumed text and reads more. Reads at least as much as is
+        already buffered so that a huge element is not re-parsed many times
+        """
+        chunk = self._fp.read(max(self._size, len(self.data) - self.pos))
+        if not chunk:
+            self.eof = True
+        self.data = self.data[self.pos :] + chunk
+        self.pos = 0
+
+    def peek(self, skip: str = _WHITESPACE) -> str:
+        """
+        Skips the given characters and returns the next one without
+        consuming it. Returns an empty string at the end of file
+        """
+        while True:
+            data, pos = self.data, self.pos
+            while pos < len(data) and data[pos] in skip:
+                pos += 1
+            self.pos = pos
+            if pos < len(data):
+                return data[pos]
+            if self.eof:
+                return ''
+            self.fill()
+
+
+def _iter_stream(
+    path: Path, buffer_size: int
+) -> Generator[dict, None, None]:
+    with open(path, 'r', encoding='utf-8') as fp:
+        buf = _Buffer(fp, buffer_size)
+        first = buf.peek()
+        if not first:
+            return
+        if first != '[':  # not an array, nothing to stream
+            buf.data = buf.data[buf.pos :] + fp.read()
+            yield _decoder.decode(buf.data)
+            return
+        buf.pos += 1
+        while True:
+            char = buf.peek(_WHITESPACE + ',')
+            if char == ']':
+                return
+            if not char:
+                raise ValueError(f'Unexpected end of {path}')
+            try:
+                item, end = _decoder.raw_decode(buf.data, buf.pos)
+            except json.JSONDecodeError:
+                if buf.eof:
+                    raise
+                buf.fill()
+                continue
+            if end == len(buf.data) and not buf.eof:
+                # a scalar could be cut by the buffer boundary
+                buf.fill()
+                continue
+            buf.pos = end
+            yield item
+
+
+def iter_resources(
+    path: Path,
+    threshold: int = STREAM_THRESHOLD,
+    buffer_size: int = BUFFER_SIZE,
+) -> Generator[dict, None, None]:
+    """
+    Yields resources from the given ``resources.json`` one by one. A file
+    that contains a single object instead of an array yields that object.
+    Empty file yields nothing
+    """
+    if path.stat().st_size < threshold:
+        with open(path, 'rb') as fp:
+            raw = fp.read()
+        if not raw.strip():
+            return
+        data = msgspec.json.decode(raw)
+        del raw
+        if isinstance(data, list):
+            yield from data
+        else:
+            yield data
+        return
+    yield from _iter_stream(path, buffer_size)
+
+
+def iter_resource_chunks(
+    path: Path, size: int, **kwargs
+) -> Generator[list[dict], None, None]:
+    """
+    Yields resources from the given ``resources.json`` in lists of at
+    most ``size`` items
+    """
+    chunk = []
+    for item in iter_resources(path, **kwargs):
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def load_resources(path: Path, **kwargs) -> list[dict]:
+    """
+    Builds the list of resources without keeping the raw file in memory
+    """
+    return list(iter_resources(path, **kwargs))
+
+
+class ResourcesWriter:
+    """
+    Writes a JSON array to a file one element at a time:
+
+    >>> with ResourcesWriter(Path('resources.json')) as writer:
+    ...     writer.write_many(iter_resources(Path('other.json')))
+    """
+
+    __slots__ = ('_path', '_fp', 'written')
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._fp: BinaryIO | None = None
+        self.written = 0
+
+    def __enter__(self) -> ResourcesWriter:
+        self._fp = open(self._path, 'wb')
+        self._fp.write(b'[')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        assert self._fp is not None
+        try:
+            self._fp.write(b']')
+        finally:
+            self._fp.close()
+            self._fp = None
+
+    def write(self, resource: dict) -> None:
+        assert self._fp is not None, 'writer must be opened'
+        if self.written:
+            self._fp.write(b',')
+        self._fp.write(_encoder.encode(resource))
+        self.written += 1
+
+    def write_many(self, resources: Iterable[dict]) -> int:
+        before = self.written
+        for resource in resources:
+            self.write(resource)
+        return self.written - before
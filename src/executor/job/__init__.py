@@ -133,6 +133,7 @@ from services.reports_bucket import (
     ReportsBucketKeysBuilder,
 )
 from services.sharding import (
+    PartsStore,
     ShardsCollection,
     ShardsCollectionFactory,
     ShardsS3IO,
@@ -160,7 +161,6 @@ from executor.job.integration.dojo import upload_to_dojo
 from executor.job.integration.license_manager import post_lm_job
 from executor.job.integration.siem import upload_to_siem
 from executor.job.policies.filter import (
-    expand_results_to_aliases,
     filter_policies,
     skip_duplicated_policies,
 )
@@ -179,6 +179,7 @@ from executor.job.rulesets.resolver import (
 )
 from executor.job.tasks.metadata import update_metadata
 from executor.job.tasks.reactive import task_reactive_job
+from executor.job.tasks.shards_parts import sweep_unreferenced_shard_parts
 from executor.job.tasks.standard import task_scheduled_job, task_standard_job
 from executor.job.types import JobExecutionError, ModeDict, PolicyDict
 
@@ -200,7 +201,6 @@ __all__ = (
     "PoliciesLoader",
     "PolicyDict",
     "Runner",
-    "expand_results_to_aliases",
     "filter_policies",
     "get_job_credentials",
     "get_platform_credentials",
@@ -225,6 +225,7 @@ __all__ = (
     "upload_to_dojo",
     "upload_to_siem",
     "remove_old_shard_parts",
+    "sweep_unreferenced_shard_parts",
 )
 
 
@@ -254,10 +255,12 @@ def _remove_stale_parts_from_collection(
     # Build the collection bound to the tenant and point its I/O at the
     # "latest" shards object in the reports bucket.
     collection: ShardsCollection = ShardsCollectionFactory.from_tenant(tenant)
+    bucket = SP.environment_service.default_reports_bucket_name()
     collection.io = ShardsS3IO(
-        bucket=SP.environment_service.default_reports_bucket_name(),
+        bucket=bucket,
         key=keys_builder.latest_key(),
         client=SP.s3,
+        parts=PartsStore(SP.s3, bucket, keys_builder.parts_folder()),
     )
     # Download all shard data from bucket.
     collection.fetch_all()
@@ -276,8 +279,11 @@ def _remove_stale_parts_from_collection(
 
     for part in parts_to_drop:
         collection.drop_part(part)
-    # Persist the (possibly smaller) collection back to bucket.
-    collection.write_all()
+    # The whole collection is here, so it can be moved to a layout that
+    # fits its current size.
+    collection.rebalance()
+    # Persist the shards that lost parts back to bucket.
+    collection.write_dirty()
 
 
 # TODO: move to a separate file
@@ -0,0 +1,118 @@
+"""
+Policy-level checkpoints of running regions.
+
+A region is checkpointed as a whole when it is finished. A long region that
+is interrupted (worker restart, deploy, spot interruption) would be scanned
+again from the beginning. Region processes record each finished policy in a
+local journal, and the job process periodically ships output of those
+policies to the scan partial. A resumed job executes only the policies that
+were not checkpointed.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterable
+
+from executor.job.scan.journal import (
+    PoliciesJournal,
+    entries_failed,
+    journal_path,
+)
+from executor.job.scan.partial_store import ScanPartialStore
+from executor.services.report_service import JobResult
+from helpers.log_helper import get_logger
+
+_LOG = get_logger(__name__)
+
+
+class PolicyCheckpoints:
+    __slots__ = (
+        '_store',
+        '_bucket',
+        '_partial_key',
+        '_result',
+        '_work_dir',
+        '_done',
+        '_offsets',
+        '_active',
+    )
+
+    def __init__(
+        self,
+        store: ScanPartialStore,
+        bucket: str,
+        partial_key: str,
+        result: JobResult,
+        work_dir: Path,
+        done: dict[str, set[str]] | None = None,
+    ):
+        """
+        :param done: region -> policies checkpointed by previous attempts
+        """
+        self._store = store
+        self._bucket = bucket
+        self._partial_key = partial_key
+        self._result = result
+        self._work_dir = work_dir
+        self._done: dict[str, set[str]] = done or {}
+        self._offsets: dict[str, int] = {}
+        self._active: set[str] = set()
+
+    def done(self, region: str) -> set[str]:
+        return self._done.get(region, set())
+
+    def start(self, regions: Iterable[str]) -> None:
+        """
+        Must be called before the regions are scanned. Journals of previous
+        attempts are dropped, their policies are executed again unless
+        they were checkpointed
+        """
+        for region in regions:
+            journal_path(self._work_dir, region).unlink(missing_ok=True)
+            self._offsets[region] = 0
+            self._active.add(region)
+
+    def flush(self) -> None:
+        """
+        Checkpoints policies that were finished since the previous call.
+        Errors are logged, the same policies are tried next time
+        """
+        for region in sorted(self._active):
+            try:
+                self._flush_region(region)
+            except Exception:
+                _LOG.exception(f'Could not checkpoint policies of {region}')
+
+    def _flush_region(self, region: str) -> None:
+        entries, offset = PoliciesJournal.read(
+            journal_path(self._work_dir, region), self._offsets[region]
+        )
+        done = self._done.setdefault(region, set())
+        entries = [e for e in entries if e.policy not in done]
+        if entries:
+            names = {e.policy for e in entries}
+            failed = entries_failed(region, entries)
+            self._store.write_policies_delta(
+                bucket=self._bucket,
+                partial_key=self._partial_key,
+                region=region,
+                policies=names,
+                parts=self._result.iter_shard_parts_for_region(
+                    region, failed, rules=names
+                ),
+                meta=self._result.rules_meta_for_region(region, rules=names),
+                failed=failed,
+                durations=self._result.durations(region, rules=names),
+            )
+            done.update(names)
+            _LOG.info(f'{len(names)} policies of {region} are checkpointed')
+        self._offsets[region] = offset
+
+    def finish(self, region: str) -> set[str]:
+        """
+        Stops checkpointing the finished region. Returns its policies that
+        are already checkpointed, so they are not put to the region delta
+        """
+        self._active.discard(region)
+        return self.done(region)
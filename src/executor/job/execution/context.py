@@ -1,6 +1,11 @@
 """Job execution context manager. Handles job lifecycle, locks, and cleanup."""
 
+import hashlib
+import os
+import re
+import shutil
 import tempfile
+import time
 from pathlib import Path
 from typing import Optional, cast
 
@@ -21,6 +26,58 @@ from services.platform_service import Platform
 
 _LOG = get_logger(__name__)
 
+_TENANT_CACHE_NAME = re.compile(r'^[0-9a-f]{64}$')
+
+
+def _last_used(path: str) -> float:
+    """
+    The latest mtime of the directory and its files
+    """
+    latest = os.stat(path).st_mtime
+    for entry in os.scandir(path):
+        try:
+            latest = max(latest, entry.stat().st_mtime)
+        except FileNotFoundError:  # removed by another process
+            continue
+    return latest
+
+
+def prune_resources_cache(
+    root: Path, keep: Path, period: int, max_size: int
+) -> None:
+    """
+    Tenant directories of the describe cache are kept after jobs. Those
+    not used within the cache period hold only expired entries and are
+    removed. Then least recently used ones are removed until the cache
+    fits its size. The directory of the current job is kept
+    :param period: cache TTL in minutes
+    :param max_size: bytes
+    """
+    expired = time.time() - period * 60
+    entries = []
+    total = 0
+    for entry in os.scandir(root):
+        if not _TENANT_CACHE_NAME.match(entry.name) or not entry.is_dir():
+            continue
+        try:
+            used = _last_used(entry.path)
+            size = sum(f.stat().st_size for f in os.scandir(entry.path))
+        except FileNotFoundError:
+            continue
+        if entry.path != str(keep) and used < expired:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            continue
+        entries.append((used, size, entry.path))
+        total += size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        if path == str(keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
 
 class JobExecutionContext:
     def __init__(
@@ -28,13 +85,23 @@ class JobExecutionContext:
         job: Job,
         tenant: Tenant,
         platform: Platform | None = None,
-        cache: str | None = 'memory',
-        cache_period: int = 30,
+        cache: str | None = None,
+        cache_period: int | None = None,
     ):
+        """
+        :param cache: Cloud Custodian resources cache. 'memory', None
+        (disabled), path to a file (removed after the job) or path to a
+        directory (kept after the job). Resolved from
+        SRE_EXECUTOR_RESOURCES_CACHE if not given. Default tenant
+        directories are pruned when the job starts
+        :param cache_period: cache TTL in minutes
+        """
         self.job = job
         self.tenant = tenant
         self.platform = platform
-        self.cache = cache
+        self.cache = cache if cache is not None else self._default_cache()
+        if cache_period is None:
+            cache_period = Env.EXECUTOR_RESOURCES_CACHE_PERIOD.as_int()
         self.cache_period = cache_period
 
         self.updater = JobUpdater(job)
@@ -44,12 +111,41 @@ class JobExecutionContext:
         self._exit_code = 0
 
         self.fingerprint_aliases: dict[str, list[str]] = {}
+        # peak RSS in bytes of processes that scanned a region
+        self.region_peak_memory: dict[str, int] = {}
 
     def set_lm_job_posted(self, posted: bool, /) -> None:
         if not posted:
             _LOG.warning('License manager job was not posted')
         self._lm_job_posted = posted
 
+    def _default_cache(self) -> str:
+        """
+        In "tenant" mode describe results are kept in sqlite files inside
+        a directory that belongs to the scanned account. Cloud Custodian
+        cache keys of some clouds do not contain account id, so the
+        directory must never be shared between tenants
+        """
+        if Env.EXECUTOR_RESOURCES_CACHE.get() != 'tenant':
+            return 'memory'
+        root = self._cache_root()
+        identity = ':'.join(
+            (
+                str(self.tenant.cloud),
+                str(self.tenant.project),
+                self.tenant.name,
+                self.platform.id if self.platform else '',
+            )
+        )
+        return str(root / hashlib.sha256(identity.encode()).hexdigest())
+
+    @staticmethod
+    def _cache_root() -> Path:
+        return Path(
+            Env.EXECUTOR_RESOURCES_CACHE_DIR.get()
+            or Path(tempfile.gettempdir()) / 'sre-resources-cache'
+        )
+
     def is_platform_job(self) -> bool:
         return self.platform is not None
 
@@ -83,12 +179,32 @@ class JobExecutionContext:
 
         _LOG.info('Creating a working dir')
         self._work_dir = tempfile.TemporaryDirectory()
+        self._prune_cache()
+
+    def _prune_cache(self) -> None:
+        """
+        Only the default directory of tenant caches is pruned, a given
+        directory may have other content
+        """
+        if self.cache is None or self.cache == 'memory':
+            return
+        path = Path(self.cache)
+        root = self._cache_root()
+        if path.parent != root:
+            return
+        size = Env.EXECUTOR_RESOURCES_CACHE_SIZE.as_int() * 1024 * 1024
+        try:
+            path.mkdir(parents=True, exist_ok=True)
+            os.utime(path)  # used by this job
+            prune_resources_cache(root, path, self.cache_period, size)
+        except OSError:
+            _LOG.warning('Cannot prune resources cache', exc_info=True)
 
     def _cleanup_cache(self) -> None:
         if self.cache is None or self.cache == 'memory':
             return
         f = Path(self.cache)
-        if f.exists():
+        if f.is_file():  # directories are shared between jobs of a tenant
             f.unlink(missing_ok=True)
 
     def _cleanup_work_dir(self) -> None:
@@ -4,23 +4,23 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, cast
+from typing import Any
 
-import billiard as multiprocessing
 from modular_sdk.commons.constants import (
     ENV_AZURE_CLIENT_CERTIFICATE_PATH,
     ENV_GOOGLE_APPLICATION_CREDENTIALS,
     ENV_KUBECONFIG,
 )
 
+from executor.job.execution.checkpoints import PolicyCheckpoints
 from executor.job.execution.context import JobExecutionContext
 from executor.job.execution.publish import finalize_standard_job_reports
-from executor.job.execution.region_executor import (
-    RegionScanResult,
-    job_initializer,
-    process_job_concurrent,
-)
+from executor.job.execution.region_pool import iter_region_scans
 from executor.job.job_failure import JobFailure, JobErrorCode
+from executor.job.policies.scheduling import (
+    RuleDurationsService,
+    schedule_policies,
+)
 from executor.job.scan import (
     FailedPoliciesMap,
     ScanCheckpoint,
@@ -30,7 +30,7 @@ from executor.job.scan import (
 )
 from executor.job.types import JobExecutionError
 from executor.services.report_service import JobResult
-from helpers.constants import GLOBAL_REGION, Cloud
+from helpers.constants import GLOBAL_REGION, Cloud, Env
 from helpers.log_helper import get_logger
 from helpers.time_helper import utc_iso
 from services import SP
@@ -87,39 +87,73 @@ def execute_job_region_scan(
     bucket = SP.environment_service.default_reports_bucket_name()
     partial_key = keys_builder.job_scan_partial(job)
     scan_partial = ScanPartialStore(SP.s3)
+    completed_regions = set(cp['completed_regions']) if cp else set()
     if cp:
-        failed = scan_partial.load_failed_policies_sidecar(bucket, partial_key)
+        failed = scan_partial.load_failed_policies(bucket, partial_key)
+        # a region delta is written before the checkpoint is updated, so
+        # the deltas may know about one more completed region
+        persisted = scan_partial.completed_regions(bucket, partial_key)
+        if missing := (persisted & regions) - completed_regions:
+            _LOG.info('Regions %s are restored from scan deltas', missing)
+            completed_regions.update(missing)
+            cp = ScanCheckpoint(
+                checkpoint_version=cp['checkpoint_version'],
+                completed_regions=sorted(completed_regions),
+                updated_at=cp['updated_at'],
+            )
 
     pending = pending_scan_regions(job, cp, all_regions=regions)
     successful = 0
     warnings: list[str] = []
     checkpoint_version = cp['checkpoint_version'] if cp else 0
-    completed_regions = set(cp['completed_regions']) if cp else set()
 
     _LOG.debug('Fingerprint aliases: %s', ctx.fingerprint_aliases)
 
-    for region in pending:
-        _LOG.info('Going to init pool for region %s', region)
-        with multiprocessing.Pool(
-            processes=1,
-            initializer=job_initializer,
-            initargs=(credentials,),
-        ) as pool:
-            scan = cast(
-                RegionScanResult,
-                pool.apply(
-                    process_job_concurrent,
-                    (
-                        policies,
-                        ctx.work_dir,
-                        cloud,
-                        region,
-                        scan_options.policy_bundle,
-                        scan_options.rule_events,
-                    ),
-                ),
-            )
-
+    policies = schedule_policies(
+        policies,
+        cloud,
+        RuleDurationsService(
+            SP.s3, SP.environment_service.get_statistics_bucket_name()
+        ),
+    )
+    result = JobResult(ctx.work_dir, cloud, ctx.fingerprint_aliases)
+    checkpoints = None
+    skip = None
+    interval = Env.EXECUTOR_POLICY_CHECKPOINT_INTERVAL.as_float()
+    if interval > 0:
+        checkpoints = PolicyCheckpoints(
+            store=scan_partial,
+            bucket=bucket,
+            partial_key=partial_key,
+            result=result,
+            work_dir=ctx.work_dir,
+            done=scan_partial.completed_policies(bucket, partial_key)
+            if cp
+            else None,
+        )
+        checkpoints.start(pending)
+        skip = {region: checkpoints.done(region) for region in pending}
+    for region, scan in iter_region_scans(
+        pending,
+        policies=policies,
+        work_dir=ctx.work_dir,
+        cloud=cloud,
+        credentials=credentials,
+        policy_bundle=scan_options.policy_bundle,
+        rule_events=scan_options.rule_events,
+        cache=ctx.cache,
+        cache_period=ctx.cache_period,
+        skip=skip,
+        on_tick=checkpoints.flush if checkpoints else None,
+        tick_interval=interval,
+    ):
+        _LOG.info(
+            'Region %s has been scanned, peak memory: %dMiB',
+            region,
+            scan.peak_memory >> 20,
+        )
+        if scan.peak_memory:
+            ctx.region_peak_memory[region] = scan.peak_memory
         if scan.load_error_detail is not None:
             _LOG.warning(
                 'Could not load policies for region %s: %s',
@@ -148,16 +182,21 @@ def execute_job_region_scan(
             warnings.append(w)
         failed.update(scan.failed)
 
-        result = JobResult(ctx.work_dir, cloud)
-        partial = scan_partial.load_partial_collection(cloud, bucket, partial_key)
-        ScanPartialStore.merge_delta_into_partial(
-            partial,
-            result.iter_shard_parts_for_region(region, failed),
-            result.rules_meta_for_region(region),
+        # checkpointed policies are already persisted
+        exclude = checkpoints.finish(region) if checkpoints else set()
+        result.index_region(region)
+        scan_partial.write_region_delta(
+            bucket=bucket,
+            partial_key=partial_key,
+            region=region,
+            parts=result.iter_shard_parts_for_region(
+                region, failed, exclude=exclude
+            ),
+            meta=result.rules_meta_for_region(region, exclude=exclude),
+            failed=failed,
+            durations=result.durations(region, exclude=exclude),
         )
-        partial.write_all()
-        partial.write_meta()
-        scan_partial.write_failed_policies_sidecar(bucket, partial_key, failed)
+        result.forget_region(region)  # parts are persisted, free the cache
         completed_regions.add(region)
         checkpoint_version += 1
         checkpoint = ScanCheckpoint(
@@ -194,8 +233,9 @@ def finalize_job_scan(
     scan_partial = ScanPartialStore(SP.s3)
 
     merged_collection = None
+    durations = None
     if completed_regions == regions:
-        merged_collection = scan_partial.load_partial_collection(
+        merged_collection, durations = scan_partial.load_partial(
             cloud, bucket, partial_key
         )
 
@@ -206,6 +246,7 @@ def finalize_job_scan(
         failed=failed,
         successful=successful,
         merged_collection=merged_collection,
+        durations=durations,
     )
 
     if completed_regions == regions:
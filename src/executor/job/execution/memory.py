@@ -0,0 +1,130 @@
+"""
+Memory watchdog of a region process.
+
+A thread samples RSS of the current process. When the configured budget is
+exceeded the given callback is invoked once (the runner stops starting new
+policies) so the process can finish and return its memory. Peak RSS is
+reported either way so operators can size workers.
+"""
+
+from __future__ import annotations
+
+import os
+import resource
+import threading
+from typing import Callable
+
+from helpers.constants import Env
+from helpers.log_helper import get_logger
+
+_LOG = get_logger(__name__)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss() -> int:
+    """
+    Resident set size of the current process in bytes, 0 if it cannot be
+    determined on this platform
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as fp:
+            return int(fp.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def max_rss() -> int:
+    """
+    Peak resident set size of the current process in bytes as reported by
+    the kernel
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def memory_limit() -> int | None:
+    """
+    Region process budget in bytes, None if unlimited
+    """
+    if not Env.EXECUTOR_REGION_MEMORY_LIMIT.is_set():
+        return None
+    limit = Env.EXECUTOR_REGION_MEMORY_LIMIT.as_int()
+    return limit * 1024 * 1024 if limit > 0 else None
+
+
+class MemoryWatchdog:
+    """
+    >>> with MemoryWatchdog(limit, on_exceeded=runner.stop) as watchdog:
+    ...     runner.start()
+    >>> watchdog.peak
+    """
+
+    __slots__ = (
+        '_limit',
+        '_on_exceeded',
+        '_interval',
+        '_stop',
+        '_thread',
+        '_peak',
+        'exceeded',
+    )
+
+    def __init__(
+        self,
+        limit: int | None,
+        on_exceeded: Callable[[], None],
+        interval: float | None = None,
+    ):
+        self._limit = limit
+        self._on_exceeded = on_exceeded
+        if interval is None:
+            interval = Env.EXECUTOR_MEMORY_WATCHDOG_INTERVAL.as_float()
+        self._interval = max(interval, 0.01)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._peak = 0
+        self.exceeded = False
+
+    @property
+    def peak(self) -> int:
+        """
+        Peak RSS in bytes observed while the watchdog was running
+        """
+        return max(self._peak, current_rss())
+
+    def check(self) -> None:
+        rss = current_rss()
+        self._peak = max(self._peak, rss)
+        if self._limit is None or self.exceeded or rss <= self._limit:
+            return
+        _LOG.warning(
+            f'Process RSS {rss >> 20}MiB exceeded the budget of '
+            f'{self._limit >> 20}MiB. Remaining policies will be moved '
+            f'to another process'
+        )
+        self.exceeded = True
+        self._on_exceeded()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                self.check()
+            except Exception:
+                _LOG.exception('Memory watchdog failed')
+                return
+
+    def __enter__(self) -> MemoryWatchdog:
+        self.check()
+        self._thread = threading.Thread(
+            target=self._watch, name='memory-watchdog', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # the kernel also catches spikes between samples
+        self._peak = max(self._peak, current_rss(), max_rss())
@@ -2,14 +2,22 @@
 
 from __future__ import annotations
 
+import msgspec
+
 from executor.job.execution.context import JobExecutionContext
-from executor.services.report_service import JobResult, statistics_from_shards_collection
+from executor.job.policies.scheduling import RuleDurationsService
+from executor.services.report_service import (
+    JobResult,
+    job_profile,
+    statistics_from_shards_collection,
+)
 from helpers.constants import Cloud
 from helpers.log_helper import get_logger
 from executor.job.scan.types import FailedPoliciesMap
 from services import SP
 from services.reports_bucket import ReportsBucketKeysBuilder, StatisticsBucketKeysBuilder
 from services.sharding import (
+    PartsStore,
     ShardPart,
     ShardsCollection,
     ShardsCollectionFactory,
@@ -23,40 +31,35 @@ def _expand_collection_fingerprint_aliases(
     ctx: JobExecutionContext,
     collection: ShardsCollection,
 ) -> None:
-    """Mirror filesystem alias expansion for S3-merged collections (resume path)."""
+    """
+    Scan deltas already contain parts of aliases. This adds the missing
+    ones for partials written before that. Alias parts share resources of
+    their primary part, nothing is copied
+    """
     parts = list(collection.iter_all_parts())
+    existing = {(p.policy, p.location) for p in parts}
     extra_parts: list[ShardPart] = []
-    for fp, names in ctx.fingerprint_aliases.items():
+    for names in ctx.fingerprint_aliases.values():
         if len(names) <= 1:
             continue
-        primary = names[0]
-        if not any(p.policy == primary for p in parts) and primary not in collection.meta:
-            continue
-        for alias in names[1:]:
-            _LOG.info(
-                f'Expanding results from {primary} to alias {alias} '
-                f'(fp={fp})'
-            )
-            for part in parts:
-                if part.policy != primary:
+        primary, *aliases = names
+        for part in parts:
+            if part.policy != primary:
+                continue
+            for alias in aliases:
+                if (alias, part.location) in existing:
                     continue
                 extra_parts.append(
-                    ShardPart(
-                        policy=alias,
-                        location=part.location,
-                        timestamp=part.timestamp,
-                        resources=list(part.resources),
-                        error=part.error,
-                        previous_timestamp=part.previous_timestamp,
-                    )
+                    msgspec.structs.replace(part, policy=alias)
                 )
-            if primary in collection.meta:
+        if primary in collection.meta:
+            for alias in aliases:
                 collection.meta.setdefault(alias, {}).update(
-                    dict(collection.meta[primary])
+                    collection.meta[primary]
                 )
     if extra_parts:
+        _LOG.info(f'Expanded {len(extra_parts)} parts to fingerprint aliases')
         collection.put_parts(extra_parts)
-    _LOG.info('Finished expanding results to aliases')
 
 
 def finalize_standard_job_reports(
@@ -67,6 +70,7 @@ def finalize_standard_job_reports(
     successful: int,
     *,
     merged_collection: ShardsCollection | None = None,
+    durations: dict[tuple[str, str], float] | None = None,
 ) -> None:
     """
     Writes full job result to S3, merges into latest, uploads statistics.
@@ -74,7 +78,8 @@ def finalize_standard_job_reports(
     When ``merged_collection`` is set (all regions finished; data was merged
     incrementally to S3 partial), the final report is built from that
     collection so resumed jobs include every region, not only the current
-    worker ``work_dir``.
+    worker ``work_dir``. ``durations`` of its policies are restored from
+    the same deltas.
     """
     if merged_collection is not None:
         collection = merged_collection
@@ -85,19 +90,12 @@ def finalize_standard_job_reports(
             )
             _expand_collection_fingerprint_aliases(ctx, collection)
         has_successful = any(collection.iter_parts())
-        stats = statistics_from_shards_collection(ctx.tenant, failed, collection)
+        stats = statistics_from_shards_collection(
+            ctx.tenant, failed, collection, durations
+        )
         meta = collection.meta
     else:
-        if ctx.fingerprint_aliases:
-            _LOG.info(
-                'Expanding scan results to fingerprint aliases (count: %d)',
-                len(ctx.fingerprint_aliases),
-            )
-            from executor.job.policies.filter import expand_results_to_aliases
-
-            expand_results_to_aliases(ctx, ctx.work_dir)
-
-        result = JobResult(ctx.work_dir, cloud)
+        result = JobResult(ctx.work_dir, cloud, ctx.fingerprint_aliases)
 
         collection = ShardsCollectionFactory.from_cloud(cloud)
         collection.put_parts(result.iter_shard_parts(failed))
@@ -113,35 +111,76 @@ def finalize_standard_job_reports(
 
         upload_to_siem(ctx=ctx, collection=collection)
 
+    bucket = SP.environment_service.default_reports_bucket_name()
+    # job report and latest share large parts, latest is pulled first so
+    # that its parts are known and not checked again
+    parts = PartsStore(SP.s3, bucket, keys_builder.parts_folder())
     collection.io = ShardsS3IO(
-        bucket=SP.environment_service.default_reports_bucket_name(),
+        bucket=bucket,
         key=keys_builder.job_result(ctx.job),
         client=SP.s3,
+        parts=parts,
     )
-
-    _LOG.debug('Writing job report')
-    collection.write_all()
-
     latest = ShardsCollectionFactory.from_cloud(cloud)
     latest.io = ShardsS3IO(
-        bucket=SP.environment_service.default_reports_bucket_name(),
+        bucket=bucket,
         key=keys_builder.latest_key(),
         client=SP.s3,
+        parts=parts,
     )
 
     _LOG.debug('Pulling latest state')
-    latest.fetch_by_indexes(collection.shards.keys())
     latest.fetch_meta()
+    latest.fetch_by_indexes(latest.shards_of(collection.iter_all_parts()))
+
+    if collection.rebalance():
+        layout = collection.distributor.layout
+        assert layout is not None
+        _LOG.info(f'Job report is written in {layout.id} shards layout')
+    _LOG.debug('Writing job report')
+    collection.write_all()
 
     _LOG.debug('Writing latest state')
     latest.update(collection)
     latest.update_meta(meta)
-    latest.write_all()
-    latest.write_meta()
-
+    # the total is kept in meta.json, so latest states that grow through
+    # many small jobs are migrated too. Unknown for states written before
+    # it was counted, they are fetched entirely once
+    total = latest.total_resources()
+    complete = total is None or not latest.fits(total)
+    if complete:
+        # the whole collection is needed to migrate it to a bigger layout
+        _LOG.info('Fetching all shards of latest state to rebalance it')
+        latest.fetch_rest()
+    if complete and latest.rebalance():
+        layout = latest.distributor.layout
+        assert layout is not None
+        _LOG.info(f'Migrating latest state to {layout.id}')
+    latest.write_dirty()
+
+    for item in stats:
+        if peak := ctx.region_peak_memory.get(item['region']):
+            item['region_peak_memory'] = peak
     _LOG.info('Writing statistics')
     SP.s3.gz_put_json(
         bucket=SP.environment_service.get_statistics_bucket_name(),
         key=StatisticsBucketKeysBuilder.job_statistics(ctx.job),
         obj=stats,
     )
+
+    try:
+        RuleDurationsService(
+            SP.s3, SP.environment_service.get_statistics_bucket_name()
+        ).update(cloud, stats)
+    except Exception:
+        _LOG.exception('Could not update rules durations')
+
+    _LOG.info('Writing job profile')
+    try:
+        SP.s3.gz_put_json(
+            bucket=SP.environment_service.get_statistics_bucket_name(),
+            key=StatisticsBucketKeysBuilder.job_profile(ctx.job),
+            obj=job_profile(JobResult(ctx.work_dir, cloud).profile()),
+        )
+    except Exception:  # the profile is diagnostics, must not fail the job
+        _LOG.exception('Could not write job profile')
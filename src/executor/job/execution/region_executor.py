@@ -17,9 +17,11 @@ from typing import Any, NamedTuple
 import billiard as multiprocessing
 
 from executor.helpers.constants import AWS_DEFAULT_REGION
+from executor.job.execution.memory import MemoryWatchdog, memory_limit
 from executor.job.job_failure import failure_detail_from_exception
 from executor.job.policies.loader import PoliciesLoader
 from executor.job.policies.runners import Runner
+from executor.job.scan.journal import PoliciesJournal, journal_path
 from executor.job.types import PolicyDict
 from executor.plugins import register_all
 from helpers.constants import Cloud, Env
@@ -35,6 +37,9 @@ class RegionScanResult(NamedTuple):
     n_successful: int
     failed: dict | None
     load_error_detail: str | None
+    peak_memory: int = 0  # bytes
+    # policies that were not executed because the memory budget was hit
+    remaining: tuple[str, ...] = ()
 
 
 def job_initializer(envs: dict):
@@ -45,6 +50,21 @@ def job_initializer(envs: dict):
     os.environ.setdefault('AWS_DEFAULT_REGION', AWS_DEFAULT_REGION)
 
 
+def region_cache(cache: str | None, region: str) -> str | None:
+    """
+    Directory cache is split into one sqlite file per region. AWS cache
+    keys contain region anyway, so nothing is lost, but concurrent region
+    processes do not contend for one sqlite lock
+    """
+    if cache is None or cache == 'memory':
+        return cache
+    path = Path(cache)
+    if path.suffix:  # a file
+        return cache
+    path.mkdir(parents=True, exist_ok=True)
+    return str(path / f'{region}.sqlite')
+
+
 def process_job_concurrent(
     items: list[PolicyDict],
     work_dir: Path,
@@ -52,6 +72,9 @@ def process_job_concurrent(
     region: str,
     policy_bundle: BundleFilters | None = None,
     rule_events: dict[str, list[dict[str, Any]]] | None = None,
+    cache: str | None = 'memory',
+    cache_period: int = 120,
+    workers: int | None = None,
 ) -> RegionScanResult:
     if Env.ENABLE_CUSTOM_CC_PLUGINS.is_set():
         register_all()
@@ -61,7 +84,8 @@ def process_job_concurrent(
         cloud=cloud,
         output_dir=work_dir,
         regions={region},
-        cache_period=120,
+        cache=region_cache(cache, region),
+        cache_period=cache_period,
     )
     try:
         _LOG.debug(f'Going to load {len(items)} policies dicts')
@@ -77,13 +101,28 @@ def process_job_concurrent(
         f'to be executed (one policy instance per available region)'
     )
     _LOG.info('Starting runner')
+    journal = None
+    if Env.EXECUTOR_POLICY_CHECKPOINT_INTERVAL.as_float() > 0:
+        journal = PoliciesJournal(journal_path(work_dir, region))
     runner = Runner.factory(
         cloud=cloud,
         policies=policies,
         policy_bundle=policy_bundle,
         rule_events=rule_events,
+        workers=workers or Env.EXECUTOR_POLICIES_CONCURRENCY.as_int(),
+        journal=journal,
+    )
+    with MemoryWatchdog(memory_limit(), on_exceeded=runner.stop) as watchdog:
+        runner.start()
+    _LOG.info(
+        f'Runner has finished. Peak memory: {watchdog.peak >> 20}MiB, '
+        f'skipped policies: {len(runner.skipped)}'
     )
-    runner.start()
-    _LOG.info('Runner has finished')
 
-    return RegionScanResult(runner.n_successful, runner.failed, None)
+    return RegionScanResult(
+        n_successful=runner.n_successful,
+        failed=runner.failed,
+        load_error_detail=None,
+        peak_memory=watchdog.peak,
+        remaining=tuple(runner.skipped),
+    )
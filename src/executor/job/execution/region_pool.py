@@ -0,0 +1,308 @@
+"""
+Bounded parallel execution of region scans.
+
+Each region is still executed in its own short-lived billiard process
+(``maxtasksperchild=1``) so Cloud Custodian memory is freed as soon as the
+region is finished. The difference from the sequential loop is that up to N
+such processes can be alive at once. N is limited by two budgets:
+
+- per-job: ``SRE_EXECUTOR_REGIONS_CONCURRENCY``;
+- per-worker (host): ``SRE_EXECUTOR_WORKER_REGIONS_CONCURRENCY``. Celery
+  prefork children do not share memory, so this budget is implemented as a
+  set of slot files locked with ``flock``. Unset means no worker-wide limit.
+
+Results are yielded in completion order so the caller can checkpoint each
+region as soon as it finishes.
+
+While regions are running, ``on_tick`` is called every ``tick_interval``
+seconds so the caller can checkpoint finished policies.
+
+Each region process also has an RSS budget
+(``SRE_EXECUTOR_REGION_MEMORY_LIMIT``). A process that exceeds it stops
+starting policies and exits, the rest of its policies are split off to a
+fresh process with fewer policy threads.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import queue
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Generator, Iterable
+
+import billiard as multiprocessing
+
+from executor.job.execution.region_executor import (
+    RegionScanResult,
+    job_initializer,
+    process_job_concurrent,
+)
+from executor.job.execution.warmup import preloaded
+from executor.job.policies.runners import Runner
+from executor.job.types import PolicyDict
+from helpers.constants import Cloud, Env, PolicyErrorType
+from helpers.log_helper import get_logger
+from services.job_policy_filters.types import BundleFilters
+
+_LOG = get_logger(__name__)
+
+
+class RegionSlots:
+    """
+    Host-wide counting semaphore built on top of ``flock``. Each slot is
+    a file, holding the lock on a file means owning the slot. Locks are
+    released by the kernel if the process dies, so slots cannot leak
+    """
+
+    __slots__ = ('_root', '_size', '_held')
+
+    def __init__(self, size: int, root: Path | None = None):
+        self._root = root or Path(tempfile.gettempdir()) / 'sre-region-slots'
+        self._size = max(size, 1)
+        self._held: list[int] = []
+
+    @property
+    def held(self) -> int:
+        return len(self._held)
+
+    def _try_lock(self, n: int, block: bool) -> int | None:
+        fd = os.open(self._root / f'{n}.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        flags = fcntl.LOCK_EX if block else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, flags)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def acquire(self, n: int) -> int:
+        """
+        Acquires up to ``n`` free slots. Blocks until at least one slot is
+        available so that a job always makes progress. Returns the number
+        of acquired slots
+        """
+        self._root.mkdir(parents=True, exist_ok=True)
+        for i in range(self._size):
+            if len(self._held) >= n:
+                break
+            if (fd := self._try_lock(i, block=False)) is not None:
+                self._held.append(fd)
+        if not self._held:
+            _LOG.info('All region slots are busy on this worker. Waiting')
+            # all slots are taken, waiting for one that depends on pid so
+            # that concurrent jobs do not queue up on the same file
+            fd = self._try_lock(os.getpid() % self._size, block=True)
+            assert fd is not None
+            self._held.append(fd)
+        return len(self._held)
+
+    def release(self) -> None:
+        while self._held:
+            fd = self._held.pop()
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+
+def regions_concurrency(pending: int) -> int:
+    """
+    Number of regions a job wants to scan in parallel, before the
+    worker-wide budget is applied
+    """
+    per_job = max(Env.EXECUTOR_REGIONS_CONCURRENCY.as_int(), 1)
+    return max(min(per_job, pending), 1)
+
+
+_ScanTask = tuple[
+    list[PolicyDict],
+    Path,
+    Cloud,
+    str,
+    BundleFilters | None,
+    dict[str, list[dict[str, Any]]] | None,
+    str | None,
+    int,
+    int | None,
+]
+
+
+def _scan_region(args: _ScanTask) -> tuple[str, RegionScanResult]:
+    region = args[3]
+    return region, process_job_concurrent(*args)
+
+
+def _without(
+    policies: list[PolicyDict], names: set[str] | None
+) -> list[PolicyDict]:
+    if not names:
+        return policies
+    return [p for p in policies if p['name'] not in names]
+
+
+def follow_up_task(task: _ScanTask, remaining: Iterable[str]) -> _ScanTask:
+    """
+    Task for policies that a region process skipped because of its memory
+    budget. They are executed by a fresh process with half of the threads
+    """
+    names = set(remaining)
+    policies, *rest, workers = task
+    workers = workers or Env.EXECUTOR_POLICIES_CONCURRENCY.as_int()
+    return (
+        [p for p in policies if p['name'] in names],
+        *rest,
+        max(workers // 2, 1),
+    )  # type: ignore[return-value]
+
+
+def merge_region_scans(
+    region: str,
+    total: RegionScanResult | None,
+    scan: RegionScanResult,
+    task: _ScanTask,
+) -> RegionScanResult:
+    """
+    Combines results of processes that executed parts of one region. If a
+    follow-up process could not load its policies, they are marked as
+    failed instead of failing the region whose other policies are done
+    """
+    if total is None:
+        return scan
+    failed = dict(total.failed or {})
+    if scan.load_error_detail is not None:
+        for policy in task[0]:
+            Runner.add_failed(
+                failed,
+                region,
+                policy['name'],
+                PolicyErrorType.INTERNAL,
+                message=scan.load_error_detail,
+            )
+    else:
+        failed.update(scan.failed or {})
+    return RegionScanResult(
+        n_successful=total.n_successful + scan.n_successful,
+        failed=failed,
+        load_error_detail=total.load_error_detail,
+        peak_memory=max(total.peak_memory, scan.peak_memory),
+        remaining=scan.remaining,
+    )
+
+
+def iter_region_scans(
+    regions: Iterable[str],
+    *,
+    policies: list[PolicyDict],
+    work_dir: Path,
+    cloud: Cloud,
+    credentials: dict[str, str],
+    policy_bundle: BundleFilters | None = None,
+    rule_events: dict[str, list[dict[str, Any]]] | None = None,
+    cache: str | None = 'memory',
+    cache_period: int = 120,
+    skip: dict[str, set[str]] | None = None,
+    on_tick: Callable[[], None] | None = None,
+    tick_interval: float = 60,
+) -> Generator[tuple[str, RegionScanResult], None, None]:
+    """
+    Scans the given regions using a bounded pool of one-shot processes and
+    yields ``(region, result)`` pairs as soon as each region is finished.
+    If a region process hits its memory budget, policies it did not start
+    are executed by another process and the region is yielded when all
+    of them are finished
+    :param skip: region -> policies that must not be executed there
+    :param on_tick: called periodically while regions are running
+    """
+    skip = skip or {}
+    tasks: list[_ScanTask] = [
+        (
+            _without(policies, skip.get(region)),
+            work_dir,
+            cloud,
+            region,
+            policy_bundle,
+            rule_events,
+            cache,
+            cache_period,
+            None,
+        )
+        for region in regions
+    ]
+    if not tasks:
+        return
+    wanted = regions_concurrency(len(tasks))
+
+    worker_budget = None
+    if Env.EXECUTOR_WORKER_REGIONS_CONCURRENCY.is_set():
+        worker_budget = Env.EXECUTOR_WORKER_REGIONS_CONCURRENCY.as_int()
+
+    slots = RegionSlots(worker_budget) if worker_budget else None
+    try:
+        processes = slots.acquire(wanted) if slots else wanted
+        _LOG.info(
+            f'Scanning {len(tasks)} regions with {processes} parallel '
+            f'processes (wanted: {wanted}, worker budget: {worker_budget})'
+        )
+        with (
+            preloaded((cloud,)),
+            multiprocessing.Pool(
+                processes=processes,
+                initializer=job_initializer,
+                initargs=(credentials,),
+                maxtasksperchild=1,
+            ) as pool,
+        ):
+            yield from _run_tasks(pool, tasks, on_tick, tick_interval)
+    finally:
+        if slots:
+            slots.release()
+
+
+def _run_tasks(
+    pool,
+    tasks: list[_ScanTask],
+    on_tick: Callable[[], None] | None = None,
+    tick_interval: float = 60,
+) -> Generator[tuple[str, RegionScanResult], None, None]:
+    done: queue.SimpleQueue = queue.SimpleQueue()
+    timeout = tick_interval if on_tick is not None else None
+    next_tick = time.monotonic() + tick_interval
+    running: dict[str, _ScanTask] = {}
+    totals: dict[str, RegionScanResult] = {}
+
+    def submit(task: _ScanTask) -> None:
+        running[task[3]] = task
+        pool.apply_async(
+            _scan_region, (task,), callback=done.put, error_callback=done.put
+        )
+
+    for task in tasks:
+        submit(task)
+    while running:
+        try:
+            item = done.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+        if on_tick is not None and time.monotonic() >= next_tick:
+            on_tick()
+            next_tick = time.monotonic() + tick_interval
+        if item is None:
+            continue
+        if isinstance(item, BaseException):
+            raise item
+        region, scan = item
+        task = running.pop(region)
+        total = merge_region_scans(region, totals.get(region), scan, task)
+        if scan.remaining:
+            _LOG.warning(
+                f'Region {region} process reached its memory budget, '
+                f'{len(scan.remaining)} policies are moved to a new process'
+            )
+            totals[region] = total
+            submit(follow_up_task(task, scan.remaining))
+            continue
+        totals.pop(region, None)
+        yield region, total
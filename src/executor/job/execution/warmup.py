@@ -0,0 +1,72 @@
+"""
+Pre-warming of the process that forks region subprocesses.
+
+Billiard forks region processes from the Celery worker child that runs the
+job. Without warming, each region process imports Cloud Custodian resource
+modules of its provider and registers Rule Engine plugins by itself, which
+takes seconds of CPU and a lot of private memory per region. Here it is
+done once in the parent, so forked children get everything ready and share
+those pages copy-on-write. Each region is still executed in a one-shot
+process, so memory leaks stay contained.
+"""
+
+import gc
+from contextlib import contextmanager
+from typing import Generator, Iterable
+
+from helpers.constants import Cloud, Env
+from helpers.log_helper import get_logger
+
+_LOG = get_logger(__name__)
+
+_WARMED: set[Cloud] = set()
+
+
+def warm_up(cloud: Cloud) -> bool:
+    """
+    Loads Cloud Custodian provider with all its resources and registers
+    custom plugins in the current process. Safe to call multiple times,
+    the work is done once per process. Returns whether the provider is
+    loaded
+    """
+    if not Env.EXECUTOR_PRELOAD_CC.as_bool():
+        return False
+    if cloud in _WARMED:
+        return True
+    from c7n.resources import load_resources
+
+    from executor.job.policies.loader import PoliciesLoader
+    from executor.plugins import register_all
+
+    provider = PoliciesLoader.cc_provider_name(cloud)
+    _LOG.info(f'Preloading Cloud Custodian resources for {provider}')
+    try:
+        load_resources((f'{provider}.*',))
+        if Env.ENABLE_CUSTOM_CC_PLUGINS.is_set():
+            register_all()
+    except Exception:
+        _LOG.exception('Could not preload Cloud Custodian resources')
+        return False
+    _WARMED.add(cloud)
+    return True
+
+
+@contextmanager
+def preloaded(clouds: Iterable[Cloud]) -> Generator[None, None, None]:
+    """
+    Warms the process up for the given clouds before forking children
+    inside the block. Everything that exists when the block is entered is
+    moved to the permanent generation, so GC in children won't touch these
+    objects and copy their pages. The process is a Celery worker child
+    that runs more tasks after this one, so the generation is unfrozen on
+    exit and objects of the finished task can be collected
+    """
+    if not any([warm_up(cloud) for cloud in clouds]):
+        yield
+        return
+    gc.collect()
+    gc.freeze()
+    try:
+        yield
+    finally:
+        gc.unfreeze()
@@ -1,5 +1,4 @@
 from executor.job.policies.filter import (
-    expand_results_to_aliases,
     filter_policies,
     skip_duplicated_policies,
 )
@@ -19,7 +18,6 @@ __all__ = (
     "K8SRunner",
     "Runner",
     "PoliciesLoader",
-    "expand_results_to_aliases",
     "filter_policies",
     "skip_duplicated_policies",
 )
@@ -0,0 +1,212 @@
+"""
+Cross-job cache of Cloud Custodian policy validation.
+
+Each region of each job builds and validates all policies of its rulesets
+again. Rulesets are shared between many tenants, so the same definitions
+are checked thousands of times a day on one worker. Verdicts here are
+addressed by the hash of the policy definition together with the cloud,
+Cloud Custodian version and whether Rule Engine plugins are registered, so
+a new ruleset version invalidates only the rules that actually changed and
+enabling plugins gives rejected rules another chance.
+
+Policies known to be invalid are dropped before they are built and
+expanded to regions. Policies known to be valid skip the checks of
+``Policy.validate()``; only the parts of it that initialise state of
+conditions, filters and actions are still called (see the loader).
+Verdicts are small files on local disk written atomically, so all region
+processes and subsequent jobs on the worker share them. Their total size
+is bounded, least recently used verdicts are evicted. Rejections that do
+not come from the definition itself (e.g. assertions of a resource
+manager) are kept only in memory.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import msgspec
+from c7n.version import version as c7n_version
+
+from executor.job.types import PolicyDict
+from helpers.__version__ import __version__
+from helpers.constants import Cloud, Env
+from helpers.log_helper import get_logger
+
+_LOG = get_logger(__name__)
+
+_encoder = msgspec.json.Encoder(order='sorted')
+
+
+class _Verdict(msgspec.Struct, frozen=True):
+    name: str
+    reason: str | None = None  # None for valid policies
+
+
+class PoliciesValidationCache:
+    """
+    >>> cache = PoliciesValidationCache(Path('/tmp/policies'), Cloud.AWS)
+    >>> key = cache.key(policy)
+    >>> if cache.rejection(key) is None:
+    ...     try:
+    ...         build_and_validate(policy, full=not cache.is_valid(key))
+    ...     except PolicyValidationError as e:
+    ...         cache.reject(key, policy['name'], str(e))
+    ...     else:
+    ...         cache.accept(key, policy['name'])
+    """
+
+    version = 1
+    max_reason_length = 1024
+    # eviction scans the whole directory, it's done at most that often
+    prune_interval = 3600
+
+    __slots__ = ('_root', '_cloud', '_max_size', '_known', '_pruned')
+
+    def __init__(self, root: Path, cloud: Cloud, max_size: int | None = None):
+        """
+        :param max_size: bytes, SRE_EXECUTOR_POLICIES_CACHE_SIZE by default
+        """
+        self._root = root / str(self.version) / cloud.value.lower()
+        self._cloud = cloud
+        if max_size is None:
+            max_size = Env.EXECUTOR_POLICIES_CACHE_SIZE.as_int() * 1024 * 1024
+        self._max_size = max_size
+        # key -> verdict, None if the policy was not checked before
+        self._known: dict[str, _Verdict | None] = {}
+        self._pruned = False
+
+    @classmethod
+    def from_env(cls, cloud: Cloud) -> 'PoliciesValidationCache | None':
+        if not Env.EXECUTOR_POLICIES_CACHE.as_bool():
+            return None
+        root = Path(
+            Env.EXECUTOR_POLICIES_CACHE_DIR.get()
+            or Path(tempfile.gettempdir()) / 'sre-policies-cache'
+        )
+        return cls(root, cloud)
+
+    def key(self, policy: PolicyDict) -> str:
+        """
+        Content hash of the policy definition. Keys are independent of
+        dicts order
+        """
+        plugins = int(Env.ENABLE_CUSTOM_CC_PLUGINS.is_set())
+        h = hashlib.sha256()
+        h.update(
+            f'{self._cloud.value}:{c7n_version}:{__version__}:'
+            f'{plugins}:'.encode()
+        )
+        h.update(_encoder.encode(policy))
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self._root / key[:2] / f'{key}.json'
+
+    def _verdict(self, key: str) -> _Verdict | None:
+        if key in self._known:
+            return self._known[key]
+        path = self._path(key)
+        try:
+            verdict = msgspec.json.decode(path.read_bytes(), type=_Verdict)
+            os.utime(path)  # used recently, evicted last
+        except FileNotFoundError:
+            verdict = None
+        except (OSError, msgspec.DecodeError):
+            _LOG.warning(f'Cannot read policy verdict {key}', exc_info=True)
+            verdict = None
+        self._known[key] = verdict
+        return verdict
+
+    def rejection(self, key: str) -> str | None:
+        """
+        Returns the reason if a policy with such key was rejected before
+        """
+        verdict = self._verdict(key)
+        return verdict.reason if verdict else None
+
+    def is_valid(self, key: str) -> bool:
+        """
+        Whether a policy with such key passed validation before
+        """
+        verdict = self._verdict(key)
+        return verdict is not None and verdict.reason is None
+
+    def accept(self, key: str, name: str) -> None:
+        """
+        Remembers that the policy passed validation
+        """
+        if self.is_valid(key):
+            return
+        self._save(key, _Verdict(name))
+
+    def reject(
+        self, key: str, name: str, reason: str, persist: bool = True
+    ) -> None:
+        """
+        :param persist: whether other processes and jobs should know about
+        the rejection. Otherwise, it's kept only by this instance
+        """
+        verdict = _Verdict(name, reason[: self.max_reason_length])
+        if persist:
+            self._save(key, verdict)
+        else:
+            self._known[key] = verdict
+
+    def _save(self, key: str, verdict: _Verdict) -> None:
+        self._known[key] = verdict
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(msgspec.json.encode(verdict))
+            os.replace(tmp, path)
+        except OSError:
+            _LOG.warning(
+                f'Cannot save verdict of {verdict.name}', exc_info=True
+            )
+            return
+        self._prune()
+
+    def _prune(self) -> None:
+        """
+        Removes least recently used verdicts until the cache fits its size.
+        Processes of the worker share a stamp, so the directory is scanned
+        at most once per prune interval
+        """
+        if self._pruned:
+            return
+        self._pruned = True
+        stamp = self._root / '.pruned'
+        try:
+            if time.time() - stamp.stat().st_mtime < self.prune_interval:
+                return
+        except FileNotFoundError:
+            pass
+        try:
+            stamp.touch()
+            entries = []
+            total = 0
+            for sub in os.scandir(self._root):
+                if not sub.is_dir():
+                    continue
+                for entry in os.scandir(sub.path):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:  # removed by another process
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self._max_size:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        except OSError:
+            _LOG.warning('Cannot prune policies verdicts', exc_info=True)
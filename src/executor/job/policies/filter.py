@@ -1,6 +1,5 @@
 """Policy filtering and deduplication."""
 
-from pathlib import Path
 from typing import Iterable
 
 from helpers.log_helper import get_logger
@@ -34,9 +33,9 @@ def skip_duplicated_policies(
     Second level (``deduplicate_by_fingerprint=True``): if two policies
     have different names but the same ``fingerprint`` field, only the
     first one is executed.  The mapping between fingerprint and all
-    skipped aliases is stored in ``ctx.fingerprint_aliases`` so results
-    can later be expanded to all aliases via
-    ``expand_results_to_aliases``.
+    skipped aliases is stored in ``ctx.fingerprint_aliases``. Results of
+    the executed policy are reported for all its aliases when they are
+    read (see ``JobResult``), nothing is copied.
     """
     emitted_names: set[str] = set()
     emitted_fps: dict[str, str] = {}
@@ -79,37 +78,3 @@ def skip_duplicated_policies(
     if fp_skipped:
         _LOG.info(f'Fingerprint dedup: skipped {len(fp_skipped)} policies')
         _LOG.debug(f'Fingerprint dedup: skipped policies: {fp_skipped}')
-
-
-def expand_results_to_aliases(
-    ctx: JobExecutionContext,
-    work_dir: Path,
-) -> None:
-    """
-    After scanning, duplicate the output files of each "primary" policy
-    to all its fingerprint aliases so that reports attribute findings
-    correctly to every rule name.
-
-    Cloud Custodian writes its results to ``<work_dir>/<policy_name>/``.
-    For every fingerprint group that has aliases, this function copies
-    the primary result directory to each alias directory.
-    """
-    import shutil
-
-    for fp, names in ctx.fingerprint_aliases.items():
-        if len(names) <= 1:
-            continue
-        primary = names[0]
-        primary_dir = work_dir / primary
-        if not primary_dir.exists():
-            continue
-        for alias in names[1:]:
-            alias_dir = work_dir / alias
-            if alias_dir.exists():
-                continue
-            _LOG.info(
-                f'Expanding results from {primary} to alias {alias} '
-                f'(fp={fp})'
-            )
-            shutil.copytree(primary_dir, alias_dir)
-    _LOG.info('Finished expanding results to aliases')
@@ -9,8 +9,10 @@ from pathlib import Path
 from typing import Callable, Generator
 
 from botocore.exceptions import ClientError
+from c7n.actions import Action
 from c7n.config import Config
 from c7n.exceptions import PolicyValidationError
+from c7n.filters.core import BooleanGroupFilter, Filter, ValueFilter
 from c7n.policy import Policy, PolicyCollection
 from c7n.provider import clouds
 from c7n.resources import load_resources
@@ -19,14 +21,21 @@ from modular_sdk.commons.constants import ENV_KUBECONFIG
 
 import executor.job.policies.modes  # noqa: F401
 from executor.helpers.constants import AWS_DEFAULT_REGION
+from executor.job.policies.cache import PoliciesValidationCache
+from executor.job.policies.profiler import TRACER_NAME
 from executor.job.types import PolicyDict
-from helpers.constants import GLOBAL_REGION, Cloud
+from helpers.constants import GLOBAL_REGION, Cloud, Env
 from helpers.log_helper import get_logger
 from helpers.regions import AWS_REGIONS
 from models.rule import RuleIndex
 
 _LOG = get_logger(__name__)
 
+# validate() of these classes only checks the definition
+_PURE_VALIDATE = frozenset(
+    (Filter.validate, ValueFilter.validate, Action.validate)
+)
+
 
 class PoliciesLoader:
     __slots__ = (
@@ -36,6 +45,7 @@ class PoliciesLoader:
         '_cache',
         '_cache_period',
         '_load_global',
+        '_validation_cache',
     )
 
     def __init__(
@@ -45,6 +55,7 @@ class PoliciesLoader:
         regions: set[str] | None = None,
         cache: str | None = 'memory',
         cache_period: int = 30,
+        validation_cache: PoliciesValidationCache | None = None,
     ):
         """
         :param cloud:
@@ -52,6 +63,8 @@ class PoliciesLoader:
         :param regions:
         :param cache:
         :param cache_period:
+        :param validation_cache: validation verdicts shared between jobs.
+        Built from envs if not given
         """
         self._cloud = cloud
         self._output_dir = output_dir
@@ -64,6 +77,9 @@ class PoliciesLoader:
         self._cache = cache
         self._cache_period = cache_period
         self._load_global = not self._regions or GLOBAL_REGION in self._regions
+        self._validation_cache = (
+            validation_cache or PoliciesValidationCache.from_env(cloud)
+        )
 
     @staticmethod
     def cc_provider_name(cloud: Cloud) -> str:
@@ -140,7 +156,9 @@ class PoliciesLoader:
             skip_validation=False,
             vars=None,
             log_group='null',
-            tracer='default',
+            tracer=TRACER_NAME
+            if Env.EXECUTOR_PROFILE_POLICIES.as_bool()
+            else 'default',
         )
 
     @staticmethod
@@ -212,6 +230,32 @@ class PoliciesLoader:
         _LOG.debug(f'Global policies: {n_global}')
         _LOG.debug(f'Not global policies: {n_not_global}')
 
+    @classmethod
+    def _prepare_elements(cls, elements) -> None:
+        """
+        Calls validate() of filters and actions that can build their
+        state in it (e.g. "missing" builds its embedded policy). Boolean
+        groups are walked through
+        """
+        for element in elements:
+            validate = type(element).validate
+            if validate is BooleanGroupFilter.validate:
+                cls._prepare_elements(element.filters)
+            elif validate not in _PURE_VALIDATE:
+                element.validate()
+
+    @classmethod
+    def prepare_validated(cls, policy: Policy) -> None:
+        """
+        Replaces Policy.validate() for definitions that passed it before.
+        Checks of the mode, the schedule and value filters are skipped,
+        only the parts that initialise state are called
+        """
+        policy.conditions.validate()
+        policy.resource_manager.validate()
+        cls._prepare_elements(policy.resource_manager.filters)
+        cls._prepare_elements(policy.resource_manager.actions)
+
     @staticmethod
     def _load_provider_aws(
         policies: list['Policy'], options: Config
@@ -251,28 +295,58 @@ class PoliciesLoader:
 
         if not options:
             options = self._base_config()
+            if self._cloud == Cloud.AWS and self._regions:
+                # policies are expanded and validated only for the regions
+                # of this loader instead of all enabled ones
+                options.regions = sorted(
+                    (self._regions - {GLOBAL_REGION}) | {AWS_DEFAULT_REGION}
+                )
         options.region = ''
         load_resources(self._get_resource_types(policies))
         provider_policies = defaultdict(list)
         session_factory = self._session_factory()
+        cache = self._validation_cache
+        keys = {}  # policy name -> cache key
+        validated = set()  # names of policies that passed validation
         for policy in policies:
+            if cache:
+                key = keys[policy['name']] = cache.key(policy)
+                if (reason := cache.rejection(key)) is not None:
+                    _LOG.warning(
+                        f'Policy {policy["name"]} is known to be invalid: '
+                        f'{reason}. Skipping'
+                    )
+                    continue
+                if cache.is_valid(key):
+                    validated.add(policy['name'])
             try:
                 pol = Policy(
                     data=policy,
                     options=options,
                     session_factory=session_factory,
                 )
-            except PolicyValidationError:
+            except PolicyValidationError as e:
                 _LOG.warning(
                     f'Cannot load policy {policy["name"]} '
                     f'dict to object. Skipping',
                     exc_info=True,
                 )
+                if cache:
+                    cache.reject(keys[policy['name']], policy['name'], str(e))
                 continue
-            except AssertionError:
+            except AssertionError as e:
                 _LOG.warning(
                     f'Cannot load {policy["name"]}. Skipping'
                 )
+                if cache:
+                    # may depend on the state of the process, not only on
+                    # the definition
+                    cache.reject(
+                        keys[policy['name']],
+                        policy['name'],
+                        repr(e),
+                        persist=False,
+                    )
                 continue
             provider_policies[pol.provider_name].append(pol)
 
@@ -304,14 +378,23 @@ class PoliciesLoader:
             collection = self._load_provider(p_name, p_policies, options)
 
         result = []
+        rejected = set()  # the same definition fails in all regions
         for p in collection:
+            if p.name in rejected:
+                continue
             p.expand_variables(p.get_variables())
             try:
-                p.validate()
-            except PolicyValidationError:
+                if p.name in validated:
+                    self.prepare_validated(p)
+                else:
+                    p.validate()
+            except PolicyValidationError as e:
                 _LOG.warning(
                     f'Policy {p.name} validation failed', exc_info=True
                 )
+                if cache and (key := keys.get(p.name)):
+                    rejected.add(p.name)
+                    cache.reject(key, p.name, str(e))
                 continue
             except (ValueError, Exception):
                 _LOG.warning(
@@ -319,6 +402,10 @@ class PoliciesLoader:
                     exc_info=True,
                 )
                 continue
+            if cache and p.name not in validated and (key := keys.get(p.name)):
+                # the rest of regional copies and the next jobs reuse it
+                validated.add(p.name)
+                cache.accept(key, p.name)
             result.append(p)
         return result
 
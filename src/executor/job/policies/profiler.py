@@ -0,0 +1,43 @@
+"""
+Cloud Custodian tracer that profiles one policy execution.
+
+Cloud Custodian wraps the phases of a policy run into tracer subsegments:
+``resource-fetch`` and ``resource-augment`` (describe), ``filter`` with
+nested ``filter:<type>``, ``action:<type>`` and ``output``. The default
+tracer ignores them. This one sums their wall time and writes the result to
+``profile.json`` next to ``metadata.json`` of the policy.
+"""
+
+import contextlib
+import time
+from collections import defaultdict
+
+import msgspec
+from c7n.output import NullTracer, tracer_outputs
+
+from executor.helpers.constants import POLICY_PROFILE_FILENAME
+
+TRACER_NAME = 'sre-profile'
+
+
+@tracer_outputs.register(TRACER_NAME)
+class ProfilingTracer(NullTracer):
+    def __init__(self, ctx, config=None):
+        super().__init__(ctx, config)
+        self.segments: dict[str, float] = defaultdict(float)
+
+    @contextlib.contextmanager
+    def subsegment(self, name):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.segments[name] += time.perf_counter() - start
+
+    def __exit__(self, exc_type=None, exc_value=None, exc_traceback=None):
+        output = getattr(self.ctx, 'output', None)
+        if output is None or not self.segments:
+            return
+        output.write_file(
+            POLICY_PROFILE_FILENAME, msgspec.json.encode(self.segments).decode()
+        )
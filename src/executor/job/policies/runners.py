@@ -1,13 +1,21 @@
-"""Cloud-specific policy runners. Execute Cloud Custodian policies per cloud."""
+"""
+Cloud-specific policy runners. Execute Cloud Custodian policies per cloud.
 
+Policies can be executed one by one or on a bounded thread pool
+(``workers > 1``). Most of the time a policy just waits for cloud APIs, so
+threads are enough. Cloud Custodian caches boto3 sessions per thread, so
+api-stats of each policy stay correct when policies run concurrently.
+"""
+
+import threading
 import traceback
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from collections.abc import Sequence
 from pathlib import Path
 from typing import Any
 from typing_extensions import Self
 
-import msgspec.json
 from azure.core.exceptions import ClientAuthenticationError
 from botocore.exceptions import ClientError
 from c7n.exceptions import PolicyValidationError
@@ -20,11 +28,13 @@ from executor.helpers.constants import (
     ACCESS_DENIED_ERROR_CODE,
     INVALID_CREDENTIALS_ERROR_CODES,
 )
+from executor.helpers.resources_io import ResourcesWriter, iter_resources
 from executor.job.policies.loader import PoliciesLoader
 from executor.job.policies.modes import (
     filter_events_for_policy_mode,
     is_resource_scoped_policy,
 )
+from executor.job.scan.journal import PoliciesJournal
 from services.job_policy_filters import apply_scan_entry
 from helpers.constants import Cloud, PolicyErrorType
 from helpers.log_helper import get_logger
@@ -43,6 +53,8 @@ class Runner(ABC):
         *,
         policy_bundle: BundleFilters | None = None,
         rule_events: dict[str, list[dict[str, Any]]] | None = None,
+        workers: int = 1,
+        journal: PoliciesJournal | None = None,
     ) -> None:
         self._policies = policies
 
@@ -50,6 +62,13 @@ class Runner(ABC):
         self.n_successful = 0
         self._policy_bundle = policy_bundle
         self._rule_events = rule_events
+        self._workers = max(workers, 1)
+        self._journal = journal
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._n_started = 0
+        # policies that were not started because the runner was stopped
+        self.skipped: list[str] = []
 
         self._err = None
         self._err_msg = None
@@ -64,6 +83,8 @@ class Runner(ABC):
         *,
         policy_bundle: BundleFilters | None = None,
         rule_events: dict[str, list[dict[str, Any]]] | None = None,
+        workers: int = 1,
+        journal: PoliciesJournal | None = None,
     ) -> Self:
         _class = next(
             filter(lambda sub: sub.cloud == cloud, cls.__subclasses__())
@@ -73,13 +94,73 @@ class Runner(ABC):
             failed,
             policy_bundle=policy_bundle,
             rule_events=rule_events,
+            workers=workers,
+            journal=journal,
         )
 
     def start(self) -> None:
+        # policies are popped from the end, but must start in given order
+        self._policies.reverse()
+        if self._workers > 1 and len(self._policies) > 1:
+            self._start_concurrent()
+            return
         while self._policies:
             self._call_policy(policy=self._policies.pop())
 
+    def stop(self) -> None:
+        """
+        Policies that are running will be finished, others will be skipped
+        and added to ``skipped``. At least one policy is always executed,
+        so the caller that retries skipped policies makes progress.
+        Thread-safe
+        """
+        self._stopped.set()
+
+    def _should_skip(self, policy: Policy) -> bool:
+        with self._lock:
+            if self._stopped.is_set() and self._n_started:
+                self.skipped.append(policy.name)
+                return True
+            self._n_started += 1
+            return False
+
+    def _start_concurrent(self) -> None:
+        """
+        Executes policies on a thread pool. The order of submission is the
+        same as the order of sequential execution. If credentials turn out
+        to be invalid, policies that have not started yet are skipped the
+        same way they are skipped sequentially
+        """
+        _LOG.info(
+            f'Executing {len(self._policies)} policies using '
+            f'{self._workers} threads'
+        )
+        with ThreadPoolExecutor(
+            max_workers=self._workers, thread_name_prefix='policy'
+        ) as executor:
+            futures = []
+            while self._policies:
+                futures.append(
+                    executor.submit(self._call_policy, self._policies.pop())
+                )
+            for future in as_completed(futures):
+                future.result()
+
+    def _add_successful(self) -> None:
+        with self._lock:
+            self.n_successful += 1
+
     def _call_policy(self, policy: Policy) -> None:
+        if self._should_skip(policy):
+            return
+        self._execute_policy(policy)
+        if self._journal is not None:
+            region = PoliciesLoader.get_policy_region(policy)
+            with self._lock:
+                failure = self.failed.get((region, policy.name))
+            self._journal.record(policy.name, failure)
+
+    def _execute_policy(self, policy: Policy) -> None:
         if self._err is not None:
             _LOG.debug(
                 'Some previous policy failed with error that will recur. '
@@ -110,7 +191,7 @@ class Runner(ABC):
         if not success:
             return
 
-        self.n_successful += 1
+        self._add_successful()
 
     def _run_with_pushed_events(self, policy: Policy) -> bool:
         """Run sre-aws-event-driven mode when job events are available."""
@@ -147,7 +228,7 @@ class Runner(ABC):
                 exception=error,
             )
             return True
-        self.n_successful += 1
+        self._add_successful()
         return True
 
     @staticmethod
@@ -177,16 +258,38 @@ class Runner(ABC):
         exception: Exception | None = None,
         message: str | None = None,
     ) -> None:
-        self.add_failed(
-            self.failed, region, policy, error_type, exception, message
-        )
+        with self._lock:
+            self.add_failed(
+                self.failed, region, policy, error_type, exception, message
+            )
 
     def _run_with_bundle_entries(
         self, policy: Policy, entries: Sequence[PolicyScanEntry]
     ) -> None:
         region = PoliciesLoader.get_policy_region(policy)
-        merged_resources: list[dict] = []
-
+        # every entry writes to the same output directory as the policy,
+        # so resources are streamed into a separate file and moved at the end
+        final_dir = Path(policy.options.output_dir) / policy.name
+        final_dir.mkdir(parents=True, exist_ok=True)
+        merged = final_dir / 'resources.json.merge'
+        try:
+            with ResourcesWriter(merged) as writer:
+                if not self._merge_bundle_entries(
+                    policy, entries, region, writer
+                ):
+                    return
+            merged.replace(final_dir / 'resources.json')
+        finally:
+            merged.unlink(missing_ok=True)
+        self._add_successful()
+
+    def _merge_bundle_entries(
+        self,
+        policy: Policy,
+        entries: Sequence[PolicyScanEntry],
+        region: str,
+        writer: ResourcesWriter,
+    ) -> bool:
         for entry in entries:
             try:
                 data = apply_scan_entry(policy.data, entry)
@@ -208,7 +311,7 @@ class Runner(ABC):
                     policy=policy.name,
                     error_type=PolicyErrorType.INTERNAL,
                 )
-                return
+                return False
             except Exception as error:
                 _LOG.exception(
                     'Policy %s bundle scan could not be prepared',
@@ -220,31 +323,19 @@ class Runner(ABC):
                     error_type=PolicyErrorType.INTERNAL,
                     exception=error,
                 )
-                return
+                return False
 
             success = self._handle_errors(run_pol)
             if not success:
-                return
+                return False
 
             out_base = Path(run_pol.options.output_dir) / run_pol.name
             res_file = out_base / 'resources.json'
             if res_file.is_file():
-                raw = res_file.read_bytes()
-                if raw.strip():
-                    chunk = msgspec.json.decode(raw)
-                    if isinstance(chunk, list):
-                        merged_resources.extend(chunk)
-                    elif isinstance(chunk, dict):
-                        merged_resources.append(chunk)
-
-        # TODO: may be make sense add deduplication here,
-        #  but duplicates are not allowed at this time
-        final_dir = Path(policy.options.output_dir) / policy.name
-        final_dir.mkdir(parents=True, exist_ok=True)
-        with open(final_dir / 'resources.json', 'wb') as fp:
-            fp.write(msgspec.json.encode(merged_resources))
-
-        self.n_successful += 1
+                # TODO: may be make sense add deduplication here,
+                #  but duplicates are not allowed at this time
+                writer.write_many(iter_resources(res_file))
+        return True
 
     @abstractmethod
     def _handle_errors(self, policy: Policy) -> bool: ...
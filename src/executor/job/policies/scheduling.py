@@ -0,0 +1,155 @@
+"""
+Cost-based order of policies inside a region.
+
+Policies of a region are executed by a pool of ``N`` threads. If the
+longest rule starts last, the region waits for it alone while other
+threads are idle. Starting the longest rules first (LPT scheduling) keeps
+all the threads busy and shortens the region's critical path. Durations
+come from previous jobs, see :class:`RuleDurationsService`.
+"""
+
+import statistics
+from enum import Enum
+from typing import Iterable
+
+from executor.job.types import PolicyDict
+from helpers.constants import Cloud, Env
+from helpers.log_helper import get_logger
+from services.clients.s3 import S3Client
+from services.reports_bucket import StatisticsBucketKeysBuilder
+
+_LOG = get_logger(__name__)
+
+
+class PolicyOrder(str, Enum):
+    AUTO = 'auto'  # longest first if policies are executed in parallel
+    LONGEST = 'longest'
+    # the most rules finish early, for getting partial results as soon
+    # as possible
+    CHEAPEST = 'cheapest'
+    NONE = 'none'
+
+    def resolve(self, workers: int) -> 'PolicyOrder':
+        if self is not PolicyOrder.AUTO:
+            return self
+        return PolicyOrder.LONGEST if workers > 1 else PolicyOrder.NONE
+
+
+def order_policies(
+    policies: list[PolicyDict],
+    durations: dict[str, float],
+    order: PolicyOrder,
+) -> list[PolicyDict]:
+    """
+    Returns policies in execution order. Rules without history are
+    considered to take the median time. The sort is stable
+    """
+    if order in (PolicyOrder.NONE, PolicyOrder.AUTO) or not durations:
+        return policies
+    default = statistics.median(durations.values())
+    return sorted(
+        policies,
+        key=lambda p: durations.get(p['name'], default),
+        reverse=order is PolicyOrder.LONGEST,
+    )
+
+
+class RuleDurationsService:
+    """
+    Keeps one small object per cloud with exponentially smoothed execution
+    time of each rule in a region: ``{"v": 1, "d": {rule: seconds}}``.
+    Updated after each job, so ordering never reads raw statistics. Jobs
+    can overwrite each other's update, it only makes the history a bit
+    older
+    """
+
+    alpha = 0.3  # weight of the latest job
+    version = 1
+
+    def __init__(self, s3_client: S3Client, bucket: str):
+        self._s3 = s3_client
+        self._bucket = bucket
+
+    def get(self, cloud: Cloud) -> dict[str, float]:
+        try:
+            data = self._s3.gz_get_json(
+                self._bucket, StatisticsBucketKeysBuilder.rules_durations(cloud)
+            )
+        except Exception:
+            _LOG.warning('Could not load rules durations', exc_info=True)
+            return {}
+        if not isinstance(data, dict) or data.get('v') != self.version:
+            return {}
+        return data.get('d') or {}
+
+    @staticmethod
+    def job_durations(stats: Iterable[dict]) -> dict[str, float]:
+        """
+        Mean execution time of each successful rule over regions of one
+        job. Takes items of job statistics. Items without a known duration
+        (zero) are skipped, they must not pull the history down
+        """
+        per_rule: dict[str, list[float]] = {}
+        for item in stats:
+            if item.get('error_type') or not item.get('end_time'):
+                continue
+            duration = item['end_time'] - item['start_time']
+            if duration > 0:
+                per_rule.setdefault(item['policy'], []).append(duration)
+        return {
+            rule: statistics.fmean(values)
+            for rule, values in per_rule.items()
+        }
+
+    @classmethod
+    def merge(
+        cls, history: dict[str, float], latest: dict[str, float]
+    ) -> dict[str, float]:
+        merged = dict(history)
+        for rule, value in latest.items():
+            if (old := merged.get(rule)) is not None:
+                value = cls.alpha * value + (1 - cls.alpha) * old
+            merged[rule] = round(value, 3)
+        return merged
+
+    def update(self, cloud: Cloud, stats: Iterable[dict]) -> None:
+        latest = self.job_durations(stats)
+        if not latest:
+            return
+        self._s3.gz_put_json(
+            bucket=self._bucket,
+            key=StatisticsBucketKeysBuilder.rules_durations(cloud),
+            obj={
+                'v': self.version,
+                'd': self.merge(self.get(cloud), latest),
+            },
+        )
+
+
+def policies_order(workers: int) -> PolicyOrder:
+    try:
+        order = PolicyOrder(Env.EXECUTOR_POLICIES_ORDER.get())
+    except ValueError:
+        _LOG.warning('Invalid policies order, using "auto"')
+        order = PolicyOrder.AUTO
+    return order.resolve(workers)
+
+
+def schedule_policies(
+    policies: list[PolicyDict],
+    cloud: Cloud,
+    durations_service: RuleDurationsService,
+) -> list[PolicyDict]:
+    """
+    Orders policies according to SRE_EXECUTOR_POLICIES_ORDER using
+    durations of previous jobs
+    """
+    order = policies_order(Env.EXECUTOR_POLICIES_CONCURRENCY.as_int())
+    if order is PolicyOrder.NONE:
+        return policies
+    durations = durations_service.get(cloud)
+    _LOG.info(
+        f'Ordering {len(policies)} policies ({order.value} first) using '
+        f'history of {len(durations)} rules'
+    )
+    return order_policies(policies, durations, order)
@@ -0,0 +1,134 @@
+"""
+Worker-local cache of rulesets content.
+
+Every job downloads and decompresses its rulesets from S3, although they
+are immutable per version and shared by many tenants. Here the content is
+kept on local disk keyed by its S3 location (which contains ruleset id and
+version) together with the object ETag. Each read is a conditional GET, so
+a cached ruleset costs one "304 Not Modified" round trip instead of a
+multi-MB download, and a re-uploaded ruleset is noticed immediately. The
+total size is bounded, least recently used entries are evicted.
+"""
+
+import hashlib
+import os
+import tempfile
+from functools import cache
+from pathlib import Path
+
+import msgspec
+
+from helpers.constants import Env
+from helpers.log_helper import get_logger
+from services.clients.s3 import S3Client
+
+_LOG = get_logger(__name__)
+
+
+class RulesetsCache:
+    """
+    Each entry is one file: the ETag line followed by decompressed JSON
+    content. Entries are replaced atomically, so region processes and
+    concurrent jobs can share the directory
+    """
+
+    version = 1
+
+    __slots__ = ('_root', '_max_size')
+
+    def __init__(self, root: Path, max_size: int):
+        self._root = root / str(self.version)
+        self._max_size = max_size
+
+    @classmethod
+    def from_env(cls) -> 'RulesetsCache | None':
+        size = Env.EXECUTOR_RULESETS_CACHE_SIZE.as_int()
+        if size <= 0:
+            return None
+        root = Path(
+            Env.EXECUTOR_RULESETS_CACHE_DIR.get()
+            or Path(tempfile.gettempdir()) / 'sre-rulesets-cache'
+        )
+        return cls(root, size * 1024 * 1024)
+
+    def _path(self, bucket: str, key: str) -> Path:
+        digest = hashlib.sha256(f'{bucket}/{key}'.encode()).hexdigest()
+        return self._root / digest
+
+    @staticmethod
+    def _read(path: Path) -> tuple[str | None, bytes]:
+        try:
+            with open(path, 'rb') as fp:
+                etag = fp.readline().rstrip(b'\n').decode()
+                return etag, fp.read()
+        except FileNotFoundError:
+            return None, b''
+        except OSError:
+            _LOG.warning(f'Cannot read cached ruleset {path}', exc_info=True)
+            return None, b''
+
+    def _write(self, path: Path, etag: str, data: bytes) -> None:
+        if len(data) > self._max_size:
+            return
+        try:
+            self._root.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self._root, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(etag.encode() + b'\n')
+                fp.write(data)
+            os.replace(tmp, path)
+            self._evict(keep=path)
+        except OSError:
+            _LOG.warning('Cannot cache ruleset content', exc_info=True)
+
+    def _evict(self, keep: Path) -> None:
+        """
+        Removes least recently used entries until the cache fits its size
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self._root):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self._max_size:
+                break
+            if path == str(keep):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def get_json(self, s3: S3Client, bucket: str, key: str) -> dict:
+        """
+        Equivalent of ``S3Client.gz_get_json`` that downloads the content
+        only if it differs from the cached copy
+        """
+        path = self._path(bucket, key)
+        etag, cached = self._read(path)
+        data, new_etag = s3.gz_get_object_if_none_match(bucket, key, etag)
+        if new_etag is None:  # no such object
+            path.unlink(missing_ok=True)
+            return {}
+        if data is None:
+            _LOG.debug(f'Using cached ruleset s3://{bucket}/{key}')
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            data = cached
+        else:
+            self._write(path, new_etag, data)
+        return msgspec.json.decode(data)
+
+
+@cache
+def rulesets_cache() -> RulesetsCache | None:
+    return RulesetsCache.from_env()
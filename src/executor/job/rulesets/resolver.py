@@ -2,6 +2,7 @@
 
 from typing import Generator, Iterable
 
+from executor.job.rulesets.cache import rulesets_cache
 from helpers.log_helper import get_logger
 from services import SP
 from services.reports_bucket import RulesetsBucketKeys
@@ -10,6 +11,14 @@ from services.ruleset_service import RulesetName
 _LOG = get_logger(__name__)
 
 
+def _get_content(bucket: str | None, key: str | None) -> dict:
+    if not (bucket and key):
+        return {}
+    if cache := rulesets_cache():
+        return cache.get_json(SP.s3, bucket, key)
+    return SP.s3.gz_get_json(bucket, key)
+
+
 def resolve_standard_ruleset(
     customer_name: str, ruleset: RulesetName
 ) -> tuple[RulesetName, list[dict]] | None:
@@ -23,7 +32,7 @@ def resolve_standard_ruleset(
     if not item:
         _LOG.warning(f'Somehow ruleset does not exist: {ruleset}')
         return
-    content = rs.fetch_content(item)
+    content = _get_content(item.s3_path.bucket_name, item.s3_path.path)
     if not content:
         _LOG.warning(f'Somehow ruleset does not have content: {ruleset}')
         return
@@ -35,9 +44,8 @@ def resolve_standard_ruleset(
 def resolve_licensed_ruleset(
     customer_name: str, ruleset: RulesetName
 ) -> tuple[RulesetName, list[dict]] | None:
-    s3 = SP.s3
     if v := ruleset.version:
-        content = s3.gz_get_json(
+        content = _get_content(
             bucket=SP.environment_service.get_rulesets_bucket_name(),
             key=RulesetsBucketKeys.licensed_ruleset_key(
                 ruleset.name, v.to_str()
@@ -51,7 +59,7 @@ def resolve_licensed_ruleset(
     if not item:
         _LOG.warning(f'Ruleset {ruleset} does not exist')
         return
-    content = s3.gz_get_json(
+    content = _get_content(
         bucket=SP.environment_service.get_rulesets_bucket_name(),
         key=RulesetsBucketKeys.licensed_ruleset_key(
             ruleset.name, item.latest_version
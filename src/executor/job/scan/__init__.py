@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 from executor.job.scan.codec import (
+    RegionDelta,
     decode_failed_policies,
+    decode_region_delta,
     encode_failed_policies,
+    encode_region_delta,
 )
 from executor.job.scan.partial_store import ScanPartialStore
 from executor.job.scan.progress import (
@@ -18,12 +21,15 @@ from validators.swagger_response_models import ScanProgress
 
 __all__ = (
     "FailedPoliciesMap",
+    "RegionDelta",
     "ScanCheckpoint",
     "ScanProgress",
     "ScanPartialStore",
     "all_scan_regions",
     "decode_failed_policies",
+    "decode_region_delta",
     "encode_failed_policies",
+    "encode_region_delta",
     "new_empty_scan_checkpoint",
     "pending_scan_regions",
     "scan_checkpoint_from_job",
@@ -1,9 +1,17 @@
 from __future__ import annotations
 
+from typing import Iterable
+
 import msgspec
 
 from helpers.constants import PolicyErrorType
 from executor.job.scan.types import FailedPoliciesMap
+from services.sharding import (
+    RuleMeta,
+    ShardPart,
+    pack_aliases,
+    unpack_aliases,
+)
 
 
 class FailedPolicyRowWire(msgspec.Struct):
@@ -18,8 +26,57 @@ class FailedPoliciesSidecar(msgspec.Struct):
     rows: list[FailedPolicyRowWire]
 
 
-def encode_failed_policies(failed: FailedPoliciesMap) -> bytes:
-    rows = [
+class RegionDeltaFailed(msgspec.Struct):
+    """
+    Only failed rows of a region delta. Decoding into this struct skips
+    shard parts, so failed policies can be restored cheaply on resume
+    """
+
+    region: str
+    rows: list[FailedPolicyRowWire] = msgspec.field(
+        default_factory=list, name='failed'
+    )
+
+
+class RegionDeltaPolicies(msgspec.Struct):
+    """
+    Only names of checkpointed policies of a policies delta
+    """
+
+    region: str
+    policies: list[str] = msgspec.field(default_factory=list)
+
+
+class RegionDelta(msgspec.Struct, omit_defaults=True):
+    """
+    Everything one finished region contributes to the scan partial:
+    shard parts, rules meta and failed policies. A policies delta
+    (checkpoint of some finished policies of a running region) has the
+    same layout and lists the executed policies
+    """
+
+    region: str
+    parts: list[ShardPart] = msgspec.field(default_factory=list)
+    meta: dict[str, dict] = msgspec.field(default_factory=dict)
+    rows: list[FailedPolicyRowWire] = msgspec.field(
+        default_factory=list, name='failed'
+    )
+    policies: list[str] = msgspec.field(default_factory=list)
+    # policy -> execution seconds, shard parts keep only the end time
+    durations: dict[str, float] = msgspec.field(default_factory=dict)
+
+    def failed(self) -> FailedPoliciesMap:
+        return _rows_to_failed(self.rows)
+
+    def region_durations(self) -> dict[tuple[str, str], float]:
+        return {
+            (self.region, policy): duration
+            for policy, duration in self.durations.items()
+        }
+
+
+def _failed_to_rows(failed: FailedPoliciesMap) -> list[FailedPolicyRowWire]:
+    return [
         FailedPolicyRowWire(
             region=region,
             policy=policy,
@@ -29,18 +86,82 @@ def encode_failed_policies(failed: FailedPoliciesMap) -> bytes:
         )
         for (region, policy), (et, msg, tb) in failed.items()
     ]
-    return msgspec.json.encode(FailedPoliciesSidecar(rows=rows))
 
 
-def decode_failed_policies(raw: bytes) -> FailedPoliciesMap:
-    if not raw:
-        return {}
-    sidecar = msgspec.json.decode(raw, type=FailedPoliciesSidecar)
+def _rows_to_failed(rows: Iterable[FailedPolicyRowWire]) -> FailedPoliciesMap:
     return {
         (r.region, r.policy): (
             PolicyErrorType(r.error_type),
             r.message,
             list(r.traceback),
         )
-        for r in sidecar.rows
+        for r in rows
     }
+
+
+def encode_failed_policies(failed: FailedPoliciesMap) -> bytes:
+    rows = _failed_to_rows(failed)
+    return msgspec.json.encode(FailedPoliciesSidecar(rows=rows))
+
+
+def decode_failed_policies(raw: bytes) -> FailedPoliciesMap:
+    if not raw:
+        return {}
+    sidecar = msgspec.json.decode(raw, type=FailedPoliciesSidecar)
+    return _rows_to_failed(sidecar.rows)
+
+
+def encode_region_delta(
+    region: str,
+    parts: Iterable[ShardPart],
+    meta: dict[str, RuleMeta],
+    failed: FailedPoliciesMap,
+    policies: Iterable[str] = (),
+    durations: dict[tuple[str, str], float] | None = None,
+) -> bytes:
+    """
+    Failed rows and durations are filtered by region so that the delta
+    never carries policies of other regions
+    """
+    return msgspec.json.encode(
+        RegionDelta(
+            region=region,
+            parts=pack_aliases(parts),
+            meta=meta,
+            rows=_failed_to_rows(
+                {k: v for k, v in failed.items() if k[0] == region}
+            ),
+            policies=sorted(policies),
+            durations={
+                policy: round(duration, 3)
+                for (reg, policy), duration in (durations or {}).items()
+                if reg == region
+            },
+        )
+    )
+
+
+def decode_region_delta(raw: bytes) -> RegionDelta:
+    delta = msgspec.json.decode(raw, type=RegionDelta)
+    unpack_aliases(delta.parts)
+    return delta
+
+
+def encode_region_delta_policies(
+    region: str, policies: Iterable[str]
+) -> bytes:
+    return msgspec.json.encode(
+        RegionDeltaPolicies(region=region, policies=sorted(policies))
+    )
+
+
+def decode_region_delta_policies(raw: bytes) -> RegionDeltaPolicies:
+    return msgspec.json.decode(raw, type=RegionDeltaPolicies)
+
+
+def decode_region_delta_failed(raw: bytes) -> FailedPoliciesMap:
+    if not raw:
+        return {}
+    return _rows_to_failed(
+        msgspec.json.decode(raw, type=RegionDeltaFailed).rows
+    )
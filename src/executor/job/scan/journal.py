@@ -0,0 +1,88 @@
+"""
+Local journal of finished policies of a region.
+
+A region process appends one line per finished policy to
+``<work_dir>/<region>/.finished.jsonl``. The job process reads new lines
+while the region is still running and checkpoints output of those policies
+to S3 (see :class:`PolicyCheckpoints`), so a resumed job does not execute
+them again.
+"""
+
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+
+import msgspec
+
+from executor.helpers.constants import POLICIES_JOURNAL_FILENAME
+from executor.job.scan.types import FailedPoliciesMap
+from helpers.constants import PolicyErrorType
+
+
+class JournalEntry(msgspec.Struct, array_like=True):
+    policy: str
+    # error type, message and traceback lines if the policy failed
+    failure: tuple[str, str | None, list[str]] | None = None
+
+
+_encoder = msgspec.json.Encoder()
+_decoder = msgspec.json.Decoder(type=JournalEntry)
+
+
+def journal_path(work_dir: Path, region: str) -> Path:
+    return work_dir / region / POLICIES_JOURNAL_FILENAME
+
+
+class PoliciesJournal:
+    """
+    Appends are serialized by a lock because policies of a region can be
+    executed by several threads
+    """
+
+    __slots__ = ('_path', '_lock')
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def record(self, policy: str, failure: tuple | None = None) -> None:
+        if failure is not None:
+            error_type, message, tb = failure
+            failure = (PolicyErrorType(error_type).value, message, list(tb))
+        line = _encoder.encode(JournalEntry(policy, failure)) + b'\n'
+        with self._lock:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._path, 'ab') as fp:
+                fp.write(line)
+
+    @staticmethod
+    def read(path: Path, offset: int = 0) -> tuple[list[JournalEntry], int]:
+        """
+        Reads complete lines starting from the given offset. Returns them
+        and the offset to continue from. A line that is being written
+        right now is left for the next read
+        """
+        try:
+            with open(path, 'rb') as fp:
+                fp.seek(offset)
+                data = fp.read()
+        except FileNotFoundError:
+            return [], offset
+        end = data.rfind(b'\n') + 1
+        entries = [_decoder.decode(line) for line in data[:end].splitlines()]
+        return entries, offset + end
+
+
+def entries_failed(
+    region: str, entries: list[JournalEntry]
+) -> FailedPoliciesMap:
+    return {
+        (region, e.policy): (
+            PolicyErrorType(e.failure[0]),
+            e.failure[1],
+            e.failure[2],
+        )
+        for e in entries
+        if e.failure is not None
+    }
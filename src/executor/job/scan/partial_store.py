@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import time
 from pathlib import PurePosixPath
 from typing import Iterable
 
 from helpers import batches
 from helpers.constants import Cloud
 from helpers.log_helper import get_logger
-from executor.job.scan.codec import decode_failed_policies, encode_failed_policies
+from executor.job.scan.codec import (
+    decode_failed_policies,
+    decode_region_delta,
+    decode_region_delta_failed,
+    decode_region_delta_policies,
+    encode_region_delta,
+    encode_region_delta_policies,
+)
 from executor.job.scan.types import FailedPoliciesMap
 from services.clients.s3 import S3Client
 from services.sharding import (
@@ -21,7 +29,28 @@ _LOG = get_logger(__name__)
 
 
 class ScanPartialStore:
-    """S3 persistence for in-progress scan shards + ``failed.json.gz`` sidecar."""
+    """
+    S3 persistence for in-progress scans.
+
+    The layout is append-only: each finished region writes exactly one
+    object ``regions/<region>.json.gz`` that contains its shard parts,
+    rules meta and failed policies. Nothing is re-read or rewritten while
+    the scan is running, so the traffic grows linearly with the number of
+    regions. Writing a region twice (e.g. the worker died before the
+    checkpoint was updated) just replaces its delta. Deltas are merged
+    once, on finalization.
+
+    While a region is running, outputs of its finished policies are
+    checkpointed to ``policies/<region>/<time>.json.gz`` (same layout plus
+    the names of the policies). The names alone are duplicated to
+    ``names/<region>/<time>.json.gz`` so that resuming does not download
+    the checkpointed outputs. A resumed job does not execute them again
+    and the final delta of the region contains only the other policies.
+
+    Partials written by older versions (shards + ``meta.json`` +
+    ``failed.json`` under the same prefix) are still read so that
+    interrupted jobs can be resumed after an upgrade.
+    """
 
     __slots__ = ("_s3",)
 
@@ -32,53 +61,194 @@ class ScanPartialStore:
     def _failed_sidecar_key(partial_key: str) -> str:
         return str(PurePosixPath(partial_key) / "failed.json")
 
-    def load_partial_collection(
+    @staticmethod
+    def _regions_prefix(partial_key: str) -> str:
+        return str(PurePosixPath(partial_key) / "regions") + "/"
+
+    @classmethod
+    def _region_delta_key(cls, partial_key: str, region: str) -> str:
+        return cls._regions_prefix(partial_key) + f"{region}.json"
+
+    @staticmethod
+    def _policies_prefix(partial_key: str) -> str:
+        return str(PurePosixPath(partial_key) / "policies") + "/"
+
+    @staticmethod
+    def _names_prefix(partial_key: str) -> str:
+        return str(PurePosixPath(partial_key) / "names") + "/"
+
+    def _iter_delta_keys(self, bucket: str, partial_key: str) -> list[str]:
+        return sorted(
+            self._s3.list_dir(
+                bucket_name=bucket, key=self._regions_prefix(partial_key)
+            )
+        )
+
+    def _iter_policies_delta_keys(
+        self, bucket: str, partial_key: str
+    ) -> list[str]:
+        return sorted(
+            self._s3.list_dir(
+                bucket_name=bucket, key=self._policies_prefix(partial_key)
+            )
+        )
+
+    def _get_raw(self, bucket: str, key: str) -> bytes | None:
+        buf = self._s3.gz_get_object(bucket=bucket, key=key)
+        if not buf:
+            return None
+        return buf.getvalue()
+
+    def write_region_delta(
         self,
-        cloud: Cloud,
         bucket: str,
         partial_key: str,
-    ) -> ShardsCollection:
-        coll = ShardsCollectionFactory.from_cloud(cloud)
-        coll.io = ShardsS3IO(bucket=bucket, key=partial_key, client=self._s3)
-        coll.fetch_all()
-        coll.fetch_meta()
-        return coll
-
-    @staticmethod
-    def merge_delta_into_partial(
-        partial: ShardsCollection,
+        region: str,
         parts: Iterable[ShardPart],
         meta: dict[str, RuleMeta],
+        failed: FailedPoliciesMap,
+        durations: dict[tuple[str, str], float] | None = None,
     ) -> None:
-        partial.put_parts(parts)
-        partial.update_meta(meta)
+        """
+        Persists results of one finished region. Only failed policies and
+        durations of this region are stored
+        """
+        self._s3.gz_put_object(
+            bucket=bucket,
+            key=self._region_delta_key(partial_key, region),
+            body=encode_region_delta(
+                region, parts, meta, failed, durations=durations
+            ),
+        )
 
-    def write_failed_policies_sidecar(
+    def write_policies_delta(
         self,
         bucket: str,
         partial_key: str,
+        region: str,
+        policies: Iterable[str],
+        parts: Iterable[ShardPart],
+        meta: dict[str, RuleMeta],
         failed: FailedPoliciesMap,
+        durations: dict[tuple[str, str], float] | None = None,
     ) -> None:
+        """
+        Persists results of some finished policies of a running region.
+        Each call writes a new object and its names sidecar, so nothing
+        is re-read
+        """
+        policies = list(policies)
+        name = f"{region}/{time.time_ns()}.json"
+        self._s3.gz_put_object(
+            bucket=bucket,
+            key=self._policies_prefix(partial_key) + name,
+            body=encode_region_delta(
+                region, parts, meta, failed, policies, durations
+            ),
+        )
+        # written after the delta, a sidecar never lists missing outputs
         self._s3.gz_put_object(
             bucket=bucket,
-            key=self._failed_sidecar_key(partial_key),
-            body=encode_failed_policies(failed),
+            key=self._names_prefix(partial_key) + name,
+            body=encode_region_delta_policies(region, policies),
         )
 
-    def load_failed_policies_sidecar(
+    def completed_policies(
+        self, bucket: str, partial_key: str
+    ) -> dict[str, set[str]]:
+        """
+        Region -> policies checkpointed before their region was finished.
+        Names are read from sidecars, whole deltas only for checkpoints
+        written without them
+        """
+        result: dict[str, set[str]] = {}
+        prefix = self._names_prefix(partial_key)
+        sidecars = {
+            key[len(prefix):]: key
+            for key in self._s3.list_dir(bucket_name=bucket, key=prefix)
+        }
+        prefix = self._policies_prefix(partial_key)
+        for key in self._iter_policies_delta_keys(bucket, partial_key):
+            key = sidecars.get(key[len(prefix):], key)
+            if raw := self._get_raw(bucket, key):
+                delta = decode_region_delta_policies(raw)
+                result.setdefault(delta.region, set()).update(delta.policies)
+        return result
+
+    def completed_regions(self, bucket: str, partial_key: str) -> set[str]:
+        """
+        Regions that have their delta persisted
+        """
+        prefix = self._regions_prefix(partial_key)
+        return {
+            key[len(prefix):].split(".", 1)[0]
+            for key in self._iter_delta_keys(bucket, partial_key)
+        }
+
+    def load_partial_collection(
+        self,
+        cloud: Cloud,
+        bucket: str,
+        partial_key: str,
+    ) -> ShardsCollection:
+        """
+        Merges all region deltas (and a legacy partial, if any) into one
+        in-memory collection
+        """
+        return self.load_partial(cloud, bucket, partial_key)[0]
+
+    def load_partial(
+        self,
+        cloud: Cloud,
+        bucket: str,
+        partial_key: str,
+    ) -> tuple[ShardsCollection, dict[tuple[str, str], float]]:
+        """
+        Same as load_partial_collection but also returns (region, policy)
+        -> execution seconds collected from the same deltas. Legacy
+        partials have no durations
+        """
+        durations: dict[tuple[str, str], float] = {}
+        coll = ShardsCollectionFactory.from_cloud(cloud)
+        coll.io = ShardsS3IO(bucket=bucket, key=partial_key, client=self._s3)
+        coll.fetch_all()
+        coll.fetch_meta()
+        # policy checkpoints and region deltas have no common policies
+        for key in (
+            *self._iter_policies_delta_keys(bucket, partial_key),
+            *self._iter_delta_keys(bucket, partial_key),
+        ):
+            raw = self._get_raw(bucket, key)
+            if not raw:
+                continue
+            delta = decode_region_delta(raw)
+            _LOG.debug("Merging scan delta of region %s", delta.region)
+            coll.put_parts(delta.parts)
+            coll.update_meta(delta.meta)
+            durations.update(delta.region_durations())
+        return coll, durations
+
+    def load_failed_policies(
         self,
         bucket: str,
         partial_key: str,
     ) -> FailedPoliciesMap:
-        buf = self._s3.gz_get_object(
-            bucket=bucket, key=self._failed_sidecar_key(partial_key)
-        )
-        if not buf:
-            return {}
-        return decode_failed_policies(buf.getvalue())
+        """
+        Restores failed policies of all persisted regions
+        """
+        failed: FailedPoliciesMap = {}
+        if raw := self._get_raw(bucket, self._failed_sidecar_key(partial_key)):
+            failed.update(decode_failed_policies(raw))
+        for key in (
+            *self._iter_policies_delta_keys(bucket, partial_key),
+            *self._iter_delta_keys(bucket, partial_key),
+        ):
+            if raw := self._get_raw(bucket, key):
+                failed.update(decode_region_delta_failed(raw))
+        return failed
 
     def delete_partial(self, bucket: str, partial_key: str) -> None:
-        """Remove all objects under the scan partial prefix (shards, meta, failed sidecar)."""
+        """Remove all objects under the scan partial prefix (deltas and legacy shards)."""
         prefix = partial_key if partial_key.endswith('/') else partial_key + '/'
         keys = list(self._s3.list_dir(bucket_name=bucket, key=prefix))
         if not keys:
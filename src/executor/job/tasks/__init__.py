@@ -1,10 +1,12 @@
 from executor.job.tasks.metadata import update_metadata
 from executor.job.tasks.reactive import task_reactive_job
+from executor.job.tasks.shards_parts import sweep_unreferenced_shard_parts
 from executor.job.tasks.standard import task_scheduled_job, task_standard_job
 
 __all__ = (
     "task_reactive_job",
     "task_scheduled_job",
+    "sweep_unreferenced_shard_parts",
     "task_standard_job",
     "update_metadata",
 )
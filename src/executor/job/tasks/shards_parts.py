@@ -0,0 +1,83 @@
+"""Sweep of unreferenced objects of the shards parts store."""
+
+import re
+from collections.abc import Iterator
+from pathlib import PurePosixPath
+
+from modular_sdk.services.customer_service import CustomerService
+from modular_sdk.services.tenant_service import TenantService
+
+from helpers.exceptions import CloudNotSupportedError
+from helpers.log_helper import get_logger
+from services import SP
+from services.platform_service import PlatformService
+from services.reports_bucket import (
+    PlatformReportsBucketKeysBuilder,
+    ReportsBucketKeysBuilder,
+    TenantReportsBucketKeysBuilder,
+)
+from services.sharding import PartsStore
+
+_LOG = get_logger(__name__)
+
+
+def _iter_collection_shards(
+    keys_builder: ReportsBucketKeysBuilder,
+) -> Iterator[str]:
+    """
+    Keys of shards of all the collections of a tenant or platform that can
+    refer to its parts store: latest, snapshots and job results. Scan
+    partials never refer to it
+    """
+    parts = keys_builder.parts_folder()
+    shard = re.compile(r'/\d+\.json\.gz$')
+    for key in SP.s3.list_dir(
+        bucket_name=SP.environment_service.default_reports_bucket_name(),
+        key=str(PurePosixPath(parts).parent) + '/',
+    ):
+        if key.startswith(parts) or f'/{keys_builder.partial}' in key:
+            continue
+        if shard.search(key):
+            yield key
+
+
+def sweep_unreferenced_shard_parts() -> None:
+    """Remove objects of the shards parts store of every tenant and its
+    platforms that no shard refers to anymore.
+
+    Large shard parts are shared by latest, snapshots and job results
+    through a content-addressed store. Snapshots expire, so the objects
+    only they referred to would stay forever. Tenants that have nothing
+    in the store are skipped without reading their shards.
+    """
+    customer_service: CustomerService = SP.modular_client.customer_service()
+    tenant_service: TenantService = SP.modular_client.tenant_service()
+    platform_service: PlatformService = SP.platform_service
+    bucket = SP.environment_service.default_reports_bucket_name()
+
+    for customer in customer_service.i_get_customer():
+        for tenant in tenant_service.i_get_tenant_by_customer(customer.name):
+            try:
+                builders: list[ReportsBucketKeysBuilder] = [
+                    PlatformReportsBucketKeysBuilder(platform)
+                    for platform in platform_service.query_by_tenant(tenant)
+                ]
+                builders.append(TenantReportsBucketKeysBuilder(tenant))
+                for keys_builder in builders:
+                    store = PartsStore(
+                        SP.s3, bucket, keys_builder.parts_folder()
+                    )
+                    removed = store.sweep(
+                        _iter_collection_shards(keys_builder)
+                    )
+                    if removed:
+                        _LOG.info(
+                            f"Removed {removed} unreferenced shards parts "
+                            f"of tenant {tenant.name}: "
+                            f"{keys_builder.parts_folder()}"
+                        )
+            except CloudNotSupportedError:
+                _LOG.warning(
+                    f"Skipping shards parts sweep for tenant {tenant.name}: "
+                    f"cloud type {tenant.cloud} is not supported"
+                )
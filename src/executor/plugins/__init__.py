@@ -8,8 +8,18 @@ from helpers.log_helper import get_logger
 
 _LOG = get_logger(__name__)
 
+_REGISTERED = False
+
 
 def register_all() -> None:
+    """
+    Idempotent within a process. Forked processes inherit the flag, so
+    plugins registered in a parent are not registered again in children
+    """
+    global _REGISTERED
+    if _REGISTERED:
+        _LOG.debug('Plugins are already registered')
+        return
     from c7n.resources import load_available
     _LOG.info('Going to load all available resources')
     load_available(True)
@@ -24,3 +34,4 @@ def register_all() -> None:
         mod.register()
 
     load_available(True)
+    _REGISTERED = True
@@ -7,21 +7,32 @@ Architecture:
 
 This separation avoids PyMongo fork issues since MongoDB connections
 are only used in the main process.
+
+Tenants are collected concurrently: regions of several tenants share one
+pool of one-shot processes, so the total number of processes is bounded
+regardless of tenants count. Tenants are admitted in round-robin order of
+their customers, so one big customer does not delay all others. Resources
+of a region are saved as soon as its process finishes, one resource type at
+a time, so only a few batches are kept in memory and database writes
+overlap with scans of other regions.
 """
 
 from __future__ import annotations
 
 import os
+import queue
+import shutil
 import tempfile
 import time
+from collections import deque
+from itertools import chain, zip_longest
 from pathlib import Path
-from typing import TYPE_CHECKING, Generator
+from typing import TYPE_CHECKING, Generator, Iterable
 from typing_extensions import Self
 from dataclasses import dataclass
 
-from billiard.pool import ApplyResult, Pool
+from billiard.pool import Pool
 import msgspec
-from c7n import utils
 from modular_sdk.models.tenant import Tenant
 from modular_sdk.modular import ModularServiceProvider
 
@@ -57,6 +68,40 @@ class ScanRegionResult:
     failed_types: list[str]
 
 
+@dataclass
+class _TenantRun:
+    """
+    State of a tenant whose regions are being scanned
+    """
+
+    tenant: Tenant
+    cloud: Cloud
+    work_dir: Path
+    pending: set[str]
+    failed_regions: list[str]
+    saved: int = 0
+
+
+def fair_tenants_order(tenants: Iterable[Tenant]) -> list[Tenant]:
+    """
+    Interleaves tenants of different customers: the first tenant of each
+    customer, then the second one of each customer and so on. Duplicates
+    are dropped
+    """
+    by_customer: dict[str, list[Tenant]] = {}
+    seen = set()
+    for tenant in tenants:
+        if tenant.name in seen:
+            continue
+        seen.add(tenant.name)
+        by_customer.setdefault(tenant.customer_name, []).append(tenant)
+    return [
+        t
+        for t in chain.from_iterable(zip_longest(*by_customer.values()))
+        if t is not None
+    ]
+
+
 def _subprocess_initializer(creds: dict) -> None:
     """Initialize subprocess environment with credentials."""
     from executor.helpers.constants import AWS_DEFAULT_REGION
@@ -68,6 +113,24 @@ def _subprocess_initializer(creds: dict) -> None:
     _LOG.debug(f"Initialized subprocess: pid={pid}")
 
 
+def _scan_tenant_region(
+    credentials: dict,
+    cloud: Cloud,
+    region: str,
+    resource_types_tuple: tuple[str, ...] | None,
+    work_dir: str,
+) -> ScanRegionResult:
+    """
+    Pool workers are shared by different tenants, so credentials come with
+    each task. A worker executes only one task (maxtasksperchild=1), so
+    they do not leak to another tenant
+    """
+    _subprocess_initializer(credentials)
+    return _scan_region_in_subprocess(
+        cloud, region, resource_types_tuple, work_dir
+    )
+
+
 def _scan_region_in_subprocess(
     cloud: Cloud,
     region: str,
@@ -180,30 +243,42 @@ class ScanResult:
             return
 
         for region_dir in filter(Path.is_dir, self._work_dir.iterdir()):
-            region = region_dir.name
-            for policy_dir in filter(Path.is_dir, region_dir.iterdir()):
-                resources_file = policy_dir / "resources.json"
-                if not resources_file.exists():
-                    continue
+            yield from self.iter_region_resources(region_dir.name)
 
-                try:
-                    with open(resources_file, "rb") as f:
-                        resources = self._res_decoder.decode(f.read())
-                except Exception:
-                    _LOG.exception(f"Failed to read {resources_file}")
-                    continue
+    def iter_region_resources(
+        self, region: str
+    ) -> Generator[tuple[str, str, list[dict]], None, None]:
+        """
+        The same as iter_resources but only for one region. Resources of
+        one type are read at a time
+        """
+        region_dir = self._work_dir / region
+        if not region_dir.is_dir():
+            return
 
-                if not resources:
-                    continue
+        for policy_dir in filter(Path.is_dir, region_dir.iterdir()):
+            resources_file = policy_dir / "resources.json"
+            if not resources_file.exists():
+                continue
 
-                # Extract resource type from policy name (collect-{resource_type})
-                policy_name = policy_dir.name
-                if policy_name.startswith("collect-"):
-                    resource_type = policy_name[8:]
-                else:
-                    resource_type = policy_name
+            try:
+                with open(resources_file, "rb") as f:
+                    resources = self._res_decoder.decode(f.read())
+            except Exception:
+                _LOG.exception(f"Failed to read {resources_file}")
+                continue
+
+            if not resources:
+                continue
+
+            # Extract resource type from policy name (collect-{resource_type})
+            policy_name = policy_dir.name
+            if policy_name.startswith("collect-"):
+                resource_type = policy_name[8:]
+            else:
+                resource_type = policy_name
 
-                yield region, resource_type, resources
+            yield region, resource_type, resources
 
 
 class CustodianResourceCollector(BaseResourceCollector):
@@ -234,101 +309,15 @@ class CustodianResourceCollector(BaseResourceCollector):
             tenant_settings_service=SP.modular_client.tenant_settings_service(),
         )
 
-    def _scan_all_regions(
-        self,
-        cloud: Cloud,
-        regions: set[str],
-        resource_types: tuple[str, ...] | None,
-        credentials: dict,
-        work_dir: Path,
-    ) -> list[str]:
-        """
-        Run CC scans for all regions in parallel subprocesses.
-
-        Uses configurable number of workers (SCAN_RESOURCES_PROCESSORS env var).
-        Each worker processes one region and exits (maxtasksperchild=1) to free
-        Cloud Custodian memory leaks.
-
-        Returns list of failed regions.
-        """
-        failed_regions: list[str] = []
-        sorted_regions = sorted(regions)
-
-        if not sorted_regions:
-            return []
-
-        # Prepare tasks for parallel processing
-        tasks = [
-            (cloud, region, resource_types, str(work_dir)) for region in sorted_regions
-        ]
-
-        max_processes = Env.SCAN_RESOURCES_PROCESSORS.as_int()
-        available_cpus = os.cpu_count() or 1
-        
-        # Limit by env value (for memory control), tasks count, and available CPUs
-        processes_count = min(max_processes, len(tasks), available_cpus)
-        
-        if max_processes > available_cpus:
-            _LOG.warning(
-                f"SCAN_RESOURCES_PROCESSORS ({max_processes}) exceeds available CPUs "
-                f"({available_cpus}), reducing to {available_cpus} to avoid CPU contention"
-            )
-
-        _LOG.info(
-            f"Scanning {len(tasks)} regions with {processes_count} parallel processes "
-            f"(configured: {max_processes}, available CPUs: {available_cpus})"
-        )
-
-        try:
-            with Pool(  # type: ignore[attr-defined]
-                processes=processes_count,
-                initializer=_subprocess_initializer,
-                initargs=(credentials,),
-                maxtasksperchild=1,  # Worker exits after each region to free memory
-            ) as pool:
-                async_results: list[ApplyResult | None] = [
-                    pool.apply_async(
-                        _scan_region_in_subprocess,
-                        args=task,
-                    )
-                    for task in tasks
-                ]
-
-                for region, ar in zip(regions, async_results):
-                    try:
-                        if ar:
-                            pair: ScanRegionResult = ar.get()
-
-                            if pair.successful == 0:
-                                failed_regions.append(region)
-                            else:
-                                _LOG.info(
-                                    f"Region {region}: {pair.successful} policies successful"
-                                )
-                            if pair.failed_types:
-                                _LOG.warning(
-                                    f"Failed types in {region}: {pair.failed_types}"
-                                )
-                                failed_regions.append(region)
-                    except Exception:
-                        _LOG.exception(f"Error in async result for region {region}")
-                        failed_regions.append(region)
-
-        except Exception as e:
-            _LOG.error(f"Error in parallel region scanning: {e}")
-            # Mark all regions as failed
-            failed_regions = sorted_regions
-
-        return failed_regions
-
     def _save_resources_to_db(
         self,
         tenant: Tenant,
         cloud: Cloud,
         work_dir: Path,
+        region: str,
     ) -> int:
         """
-        Read scan results from files and save to MongoDB.
+        Read scan results of one region from files and save to MongoDB.
         Runs in MAIN process - safe MongoDB operations.
         Returns count of saved resources.
         """
@@ -342,15 +331,10 @@ class CustodianResourceCollector(BaseResourceCollector):
             _LOG.warning(f"No resource iterator for cloud {cloud}")
             return 0
 
-        for region, resource_type, resources in scan_result.iter_resources():
+        for region, resource_type, resources in scan_result.iter_region_resources(
+            region
+        ):
             try:
-                # Remove old resources
-                self._rs.remove_policy_resources(
-                    account_id=account_id,
-                    location=region,
-                    resource_type=resource_type,
-                )
-
                 # Create ShardPart for the iterator
                 timestamp = time.time()
                 part = ShardPart(
@@ -372,98 +356,198 @@ class CustodianResourceCollector(BaseResourceCollector):
                     collector_type=ResourcesCollectorType.CUSTODIAN,
                 )
 
-                for chunk in utils.chunks(it, BATCH_SAVE_CHUNK_SIZE):
-                    self._rs.batch_save(chunk)
-                    saved_total += len(chunk)
+                # Only new, changed and vanished resources are written
+                stats = self._rs.sync_policy_resources(
+                    account_id=account_id,
+                    location=region,
+                    resource_type=resource_type,
+                    resources=it,
+                    sync_date=timestamp,
+                    chunk_size=BATCH_SAVE_CHUNK_SIZE,
+                )
+                saved_total += stats.total
 
             except Exception:
                 _LOG.exception(f"Failed to save {resource_type} in {region}")
 
         return saved_total
 
-    def _collect_tenant(
+    def _processes_count(self) -> int:
+        max_processes = Env.SCAN_RESOURCES_PROCESSORS.as_int()
+        available_cpus = os.cpu_count() or 1
+        if max_processes > available_cpus:
+            _LOG.warning(
+                f"SCAN_RESOURCES_PROCESSORS ({max_processes}) exceeds available CPUs "
+                f"({available_cpus}), reducing to {available_cpus} to avoid CPU contention"
+            )
+        return max(min(max_processes, available_cpus), 1)
+
+    def _admit_tenant(
         self,
+        pool: Pool,
+        results: queue.SimpleQueue,
         tenant: Tenant,
-        regions: set[str],
-        resource_types: set[str] | None,
-        credentials: dict,
-    ) -> tuple[int, list[str]]:
+        regions: set[str] | None,
+        resource_types: tuple[str, ...] | None,
+        root: Path,
+    ) -> _TenantRun:
         """
-        Collect resources for one tenant:
-        1. Scan all regions (subprocesses)
-        2. Save to DB (main process)
+        Submits all regions of the tenant to the pool. Scanned regions are
+        put to the results queue as (tenant name, region, result, error)
         """
-        cloud = modular_helpers.tenant_cloud(tenant)
-        resource_types_tuple = tuple(resource_types) if resource_types else None
-
-        with tempfile.TemporaryDirectory() as work_dir:
-            work_path = Path(work_dir)
+        from executor.job import get_tenant_credentials
 
-            _LOG.info(f"Phase 1: Scanning {len(regions)} regions")
-            failed_regions = self._scan_all_regions(
-                cloud=cloud,
-                regions=regions,
-                resource_types=resource_types_tuple,
-                credentials=credentials,
-                work_dir=work_path,
+        if regions is None:
+            regions = modular_helpers.get_tenant_regions(
+                tenant, self._tss
+            ) | {GLOBAL_REGION}
+        # credentials are resolved only now because they may expire while
+        # previous tenants are collected
+        credentials = get_tenant_credentials(tenant)
+        if credentials is None:
+            raise ValueError(f"No credentials for tenant {tenant.name}")
+        _LOG.info(f"Processing tenant {tenant.name} ({len(regions)} regions)")
+
+        run = _TenantRun(
+            tenant=tenant,
+            cloud=modular_helpers.tenant_cloud(tenant),
+            work_dir=Path(tempfile.mkdtemp(dir=root)),
+            pending=set(regions),
+            failed_regions=[],
+        )
+        for region in sorted(regions):
+            pool.apply_async(
+                _scan_tenant_region,
+                args=(
+                    credentials,
+                    run.cloud,
+                    region,
+                    resource_types,
+                    str(run.work_dir),
+                ),
+                callback=lambda r, n=tenant.name, reg=region: results.put(
+                    (n, reg, r, None)
+                ),
+                error_callback=lambda e, n=tenant.name, reg=region: results.put(
+                    (n, reg, None, e)
+                ),
             )
+        return run
 
-            _LOG.info("Phase 2: Saving resources to database")
-            saved = self._save_resources_to_db(
-                tenant=tenant,
-                cloud=cloud,
-                work_dir=work_path,
+    def _region_scanned(
+        self,
+        run: _TenantRun,
+        region: str,
+        result: ScanRegionResult | None,
+        error: BaseException | None,
+    ) -> None:
+        """
+        Saves resources of the scanned region and removes its files. Types
+        that were collected are saved even if the others failed
+        """
+        run.pending.discard(region)
+        try:
+            run.saved += self._save_resources_to_db(
+                tenant=run.tenant,
+                cloud=run.cloud,
+                work_dir=run.work_dir,
+                region=region,
             )
-
-        return saved, failed_regions
+        except Exception:
+            _LOG.exception(f"Failed to save resources of region {region}")
+            run.failed_regions.append(region)
+        finally:
+            shutil.rmtree(run.work_dir / region, ignore_errors=True)
+        if error is not None:
+            _LOG.error(f"Error scanning region {region}: {error}")
+            run.failed_regions.append(region)
+            return
+        assert result is not None
+        if result.successful == 0:
+            run.failed_regions.append(region)
+        else:
+            _LOG.info(
+                f"Region {region}: {result.successful} policies successful"
+            )
+        if result.failed_types:
+            _LOG.warning(f"Failed types in {region}: {result.failed_types}")
+            run.failed_regions.append(region)
 
     def collect_all_resources(
         self,
         regions: set[str] | None = None,
         resource_types: set[str] | None = None,
     ) -> None:
-        """Collect resources for all activated tenants."""
-        from executor.job import get_tenant_credentials
+        """
+        Collect resources for all activated tenants.
 
+        Up to SCAN_RESOURCES_TENANTS tenants are scanned at once by one
+        pool of SCAN_RESOURCES_PROCESSORS processes. Resources of a region
+        are saved as soon as it is scanned, while the pool keeps scanning
+        other regions
+        """
         _LOG.info("Starting resource collection for all tenants")
 
         it = ActivatedTenantsIterator(mc=self._ms, ls=self._ls)
+        waiting = deque(fair_tenants_order(tenant for _, tenant, _ in it))
+        resource_types_tuple = tuple(resource_types) if resource_types else None
+        max_tenants = max(Env.SCAN_RESOURCES_TENANTS.as_int(), 1)
+        processes_count = self._processes_count()
+        _LOG.info(
+            f"Collecting {len(waiting)} tenants, up to {max_tenants} at once "
+            f"with {processes_count} parallel processes"
+        )
+
+        from executor.job.execution.warmup import preloaded
+
+        clouds = {modular_helpers.tenant_cloud(t, True) for t in waiting}
+        clouds.discard(None)
+
         processed_tenants = 0
         failed_tenants: list[str] = []
         total_resources = 0
+        results: queue.SimpleQueue = queue.SimpleQueue()
+        running: dict[str, _TenantRun] = {}
 
-        for _, tenant, _ in it:
-            tenant_regions = regions
-            if tenant_regions is None:
-                tenant_regions = modular_helpers.get_tenant_regions(
-                    tenant, self._tss
-                ) | {GLOBAL_REGION}
-
-            try:
-                credentials = get_tenant_credentials(tenant)
-                if credentials is None:
-                    raise ValueError(f"No credentials for tenant {tenant.name}")
-                _LOG.info(
-                    f"Processing tenant {tenant.name} ({len(tenant_regions)} regions)"
-                )
+        with (
+            tempfile.TemporaryDirectory() as root,
+            preloaded(clouds),
+            Pool(  # type: ignore[attr-defined]
+                processes=processes_count,
+                maxtasksperchild=1,  # Worker exits after each region to free memory
+            ) as pool,
+        ):
+            while waiting or running:
+                while waiting and len(running) < max_tenants:
+                    tenant = waiting.popleft()
+                    try:
+                        running[tenant.name] = self._admit_tenant(
+                            pool=pool,
+                            results=results,
+                            tenant=tenant,
+                            regions=regions,
+                            resource_types=resource_types_tuple,
+                            root=Path(root),
+                        )
+                    except Exception as e:
+                        _LOG.error(f"Error processing tenant {tenant.name}: {e}")
+                        failed_tenants.append(tenant.name)
+                if not running:
+                    continue
 
-                saved, failed_regions = self._collect_tenant(
-                    tenant=tenant,
-                    regions=tenant_regions,
-                    resource_types=resource_types,
-                    credentials=credentials,
-                )
+                name, region, result, error = results.get()
+                run = running[name]
+                self._region_scanned(run, region, result, error)
+                if run.pending:
+                    continue
 
-                total_resources += saved
+                del running[name]
+                shutil.rmtree(run.work_dir, ignore_errors=True)
+                total_resources += run.saved
                 processed_tenants += 1
-
-                _LOG.info(f"Completed tenant {tenant.name}: {saved} resources")
-                if failed_regions:
-                    _LOG.warning(f"Failed regions: {failed_regions}")
-
-            except Exception as e:
-                _LOG.error(f"Error processing tenant {tenant.name}: {e}")
-                failed_tenants.append(tenant.name)
+                _LOG.info(f"Completed tenant {name}: {run.saved} resources")
+                if run.failed_regions:
+                    _LOG.warning(f"Failed regions: {run.failed_regions}")
 
         _LOG.info(
             f"Collection complete: {processed_tenants} tenants, "
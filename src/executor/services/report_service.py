@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import TYPE_CHECKING, Generator, TypedDict
+from typing import TYPE_CHECKING, Collection, Generator, TypedDict
 
 import msgspec
 from modular_sdk.models.tenant import Tenant
 
+from executor.helpers.constants import POLICY_PROFILE_FILENAME
+from executor.helpers.resources_io import load_resources
 from helpers.constants import Cloud, PolicyErrorType
 from helpers.log_helper import get_logger
 from services.sharding import RuleMeta, ShardPart, ShardsCollection
@@ -37,6 +39,22 @@ class StatisticsItemSuccess(StatisticsItem):
     failed_resources: int
 
 
+class PolicyProfile(TypedDict):
+    policy: str
+    region: str
+    resource_type: str
+    wall_time: float
+    describe_time: float
+    filter_time: float
+    action_time: float
+    output_time: float
+    filters: dict[str, float]  # filter type to seconds
+    api_calls: dict[str, int]  # service to number of calls
+    api_calls_total: int
+    resources: int | None  # matched by the policy
+    bytes_written: int | None  # size of resources.json
+
+
 class RuleRawMetadata:
     """
     Simple wrapper over metadata.json that is returned by Cloud Custodian.
@@ -102,13 +120,19 @@ def statistics_from_shards_collection(
     tenant: Tenant,
     failed: FailedPoliciesMap | dict,
     collection: ShardsCollection,
+    durations: dict[tuple[str, str], float] | None = None,
 ) -> list[dict]:
     """
     Build per-rule statistics from an in-memory shard collection (e.g. S3
     scan partial after all regions completed). Used when the local work_dir
     does not contain every region (job resume).
+
+    :param durations: (region, policy) -> execution seconds persisted with
+    the scan deltas. Shard parts keep only the end time, so the start time
+    of policies without a duration equals their end time
     """
     failed = failed or {}
+    durations = durations or {}
     by_key: dict[tuple[str, str], dict] = {}
 
     for part in collection.iter_all_parts():
@@ -118,7 +142,7 @@ def statistics_from_shards_collection(
             'region': part.location,
             'tenant_name': tenant.name,
             'customer_name': tenant.customer_name,
-            'start_time': part.timestamp,
+            'start_time': part.timestamp - durations.get(key, 0.0),
             'end_time': part.timestamp,
             'api_calls': {},
         }
@@ -158,15 +182,83 @@ def statistics_from_shards_collection(
     return list(by_key.values())
 
 
+def job_profile(policies: list[PolicyProfile]) -> dict:
+    """
+    Job performance report: policies sorted by wall time, the slowest go
+    first, and totals over all of them
+    """
+    policies = sorted(policies, key=lambda p: p['wall_time'], reverse=True)
+    total = {
+        'policies': len(policies),
+        'wall_time': 0.0,
+        'describe_time': 0.0,
+        'filter_time': 0.0,
+        'action_time': 0.0,
+        'api_calls': 0,
+        'resources': 0,
+        'bytes_written': 0,
+    }
+    for item in policies:
+        total['wall_time'] += item['wall_time']
+        total['describe_time'] += item['describe_time']
+        total['filter_time'] += item['filter_time']
+        total['action_time'] += item['action_time']
+        total['api_calls'] += item['api_calls_total']
+        total['resources'] += item['resources'] or 0
+        total['bytes_written'] += item['bytes_written'] or 0
+    return {'total': total, 'policies': policies}
+
+
+class _MetadataWire(msgspec.Struct):
+    """
+    Parts of Cloud Custodian's metadata.json we actually use. Other keys
+    (config, sys-stats, ...) are skipped by the decoder
+    """
+
+    policy: dict
+    execution: dict = msgspec.field(default_factory=dict)
+    api_stats: dict = msgspec.field(default_factory=dict, name='api-stats')
+    metrics: list = msgspec.field(default_factory=list)
+
+
 class JobResult:
+    """
+    Reads Cloud Custodian output from a job work dir:
+    ``<work_dir>/<region>/<policy>/{metadata,resources}.json``.
+
+    Keeps an index of region -> policy -> directory and a cache of decoded
+    metadata so that every region is listed and each metadata.json is
+    decoded only once regardless of how many readers (shard parts, meta,
+    statistics) go through it.
+    """
+
     RegionRuleOutput = tuple[str, str, RuleRawMetadata, list[dict] | None]
 
-    def __init__(self, work_dir: Path, cloud: Cloud):
+    def __init__(
+        self,
+        work_dir: Path,
+        cloud: Cloud,
+        fingerprint_aliases: dict[str, list[str]] | None = None,
+    ):
+        """
+        :param fingerprint_aliases: fingerprint to policy names, the first
+        one was executed, others are its aliases. Output of the executed
+        policy is read once and reported for every alias as well
+        """
         self._work_dir = work_dir
         self._cloud = cloud
+        self._aliases: dict[str, list[str]] = {}
+        self._primaries: dict[str, str] = {}
+        for primary, *aliases in (fingerprint_aliases or {}).values():
+            self._aliases.setdefault(primary, []).extend(aliases)
+            self._primaries.update(dict.fromkeys(aliases, primary))
 
-        self._metadata_decoder = msgspec.json.Decoder(type=dict)
-        self._res_decoded = msgspec.json.Decoder(type=list[dict])
+        self._metadata_decoder = msgspec.json.Decoder(type=_MetadataWire)
+        self._profile_decoder = msgspec.json.Decoder(type=dict[str, float])
+
+        self._index: dict[str, dict[str, Path]] = {}
+        self._indexed = False  # whether all regions are in the index
+        self._metadata: dict[Path, RuleRawMetadata] = {}
 
     @staticmethod
     def cloud_to_resource_type_prefix() -> dict[Cloud, str]:
@@ -191,25 +283,127 @@ class JobResult:
         resources = root / 'resources.json'
         if not resources.exists():
             return
-        with open(resources, 'rb') as fp:
-            return self._res_decoded.decode(fp.read())
-
-    def _load_metadata(self, root: Path) -> RuleRawMetadata:
+        # decoded incrementally, raw file is never kept in memory
+        return load_resources(resources)
+
+    def _load_metadata(
+        self, root: Path, cache: bool = True
+    ) -> RuleRawMetadata:
+        if (cached := self._metadata.get(root)) is not None:
+            return cached
         with open(root / 'metadata.json', 'rb') as fp:
-            return RuleRawMetadata(self._metadata_decoder.decode(fp.read()))
+            wire = self._metadata_decoder.decode(fp.read())
+        wire.policy.pop('filters', None)  # can be huge and never used
+        item = RuleRawMetadata(
+            {
+                'policy': wire.policy,
+                'execution': wire.execution,
+                'api-stats': wire.api_stats,
+                'metrics': wire.metrics,
+            }
+        )
+        if cache:
+            self._metadata[root] = item
+        return item
+
+    @staticmethod
+    def _list_rules(region_dir: Path) -> dict[str, Path]:
+        return {
+            rule.name: rule for rule in filter(Path.is_dir, region_dir.iterdir())
+        }
+
+    def index_region(self, region: str) -> None:
+        """
+        (Re)builds index for one region. Must be called when the region
+        is finished, because its directory is not stable before that
+        """
+        self.forget_region(region)
+        root = self._work_dir / region
+        if root.is_dir():
+            self._index[region] = self._list_rules(root)
+
+    def forget_region(self, region: str) -> None:
+        """
+        Drops the region from the index and its decoded metadata from cache
+        """
+        for path in self._index.pop(region, {}).values():
+            self._metadata.pop(path, None)
+        self._indexed = False
+
+    def _region_rules(self, region: str) -> dict[str, Path]:
+        if region not in self._index:
+            self.index_region(region)
+        return self._index.get(region, {})
+
+    def _all_rules(self) -> dict[str, dict[str, Path]]:
+        if not self._indexed:
+            for region_dir in filter(Path.is_dir, self._work_dir.iterdir()):
+                if region_dir.name not in self._index:
+                    self._index[region_dir.name] = self._list_rules(
+                        region_dir
+                    )
+            self._indexed = True
+        return self._index
+
+    def _finished_rules(
+        self, region: str, rules: Collection[str]
+    ) -> dict[str, Path]:
+        root = self._work_dir / region
+        return {
+            name: path
+            for name in rules
+            if (path := root / name).is_dir()
+        }
 
     def iter_raw(
-        self, with_resources: bool = False
+        self,
+        with_resources: bool = False,
+        region: str | None = None,
+        rules: Collection[str] | None = None,
+        exclude: Collection[str] = (),
     ) -> Generator[RegionRuleOutput, None, None]:
-        dirs = filter(Path.is_dir, self._work_dir.iterdir())
-        for region in dirs:
-            for rule in filter(Path.is_dir, region.iterdir()):
-                metadata = self._load_metadata(rule)
+        """
+        :param with_resources:
+        :param region: read only this region using the index. Other regions
+        can be still running and have incomplete output
+        :param rules: read only these finished policies of the region while
+        the region is still running. Nothing is indexed or cached
+        :param exclude: skip these policies and their aliases
+        """
+        cache = rules is None
+        if rules is not None:
+            assert region is not None, 'rules can be read only for a region'
+            index = {region: self._finished_rules(region, rules)}
+        elif region is not None:
+            index = {region: self._region_rules(region)}
+        else:
+            index = self._all_rules()
+        for reg, rules_ in index.items():
+            for name, rule in rules_.items():
+                if name in exclude:
+                    continue
+                metadata = self._load_metadata(rule, cache)
                 if with_resources:
                     resources = self._load_resources(rule)
                 else:
                     resources = [] if self._resources_exist(rule) else None
-                yield region.name, rule.name, metadata, resources
+                yield reg, name, metadata, resources
+                # aliases share the very same objects, nothing is copied
+                for alias in self._aliases.get(name, ()):
+                    if alias not in rules_:
+                        yield reg, alias, metadata, resources
+
+    def _failed(
+        self, failed: FailedPoliciesMap | dict, region: str, rule: str
+    ) -> tuple | None:
+        """
+        Failure of the rule, aliases fail together with their primary
+        """
+        if item := failed.get((region, rule)):
+            return item
+        if primary := self._primaries.get(rule):
+            return failed.get((region, primary))
+        return None
 
     def statistics(self, tenant: Tenant, failed: FailedPoliciesMap | dict) -> list[dict]:
         """
@@ -235,7 +429,7 @@ class JobResult:
             if resources is not None:
                 item['scanned_resources'] = metadata.all_resources_count
                 item['failed_resources'] = metadata.failed_resources_count
-            elif _failed := failed.get((region, rule)):
+            elif _failed := self._failed(failed, region, rule):
                 item['error_type'] = _failed[0]
                 item['reason'] = _failed[1]
                 item['traceback'] = _failed[2]
@@ -248,41 +442,99 @@ class JobResult:
             res.append(item)
         return res
 
-    def iter_shard_parts(
-        self, failed: FailedPoliciesMap | dict
-    ) -> Generator[ShardPart, None, None]:
-        for region, rule, metadata, resources in self.iter_raw(with_resources=True):
+    def durations(
+        self,
+        region: str | None = None,
+        rules: Collection[str] | None = None,
+        exclude: Collection[str] = (),
+    ) -> dict[tuple[str, str], float]:
+        """
+        (region, policy) -> execution seconds of successful policies. They
+        are persisted with scan deltas because shard parts keep only the
+        end time. See iter_raw for the parameters
+        """
+        result = {}
+        for reg, rule, metadata, resources in self.iter_raw(
+            with_resources=False, region=region, rules=rules, exclude=exclude
+        ):
             if resources is None:
-                # policy error occurred
-                if er := failed.get((region, rule)):
-                    error = er[0], er[1]
-                else:
-                    error = PolicyErrorType.INTERNAL, 'Unknown policy error'
+                continue
+            duration = metadata.end_time - metadata.start_time
+            if duration > 0:
+                result[(reg, rule)] = duration
+        return result
 
-                yield ShardPart(
-                    policy=rule,
-                    location=region,
-                    timestamp=metadata.end_time,
-                    error=':'.join(error),
-                )
-            else:
-                yield ShardPart(
-                    policy=rule,
-                    location=region,
-                    timestamp=metadata.end_time,
-                    resources=resources,
+    def _load_profile(self, root: Path) -> dict[str, float]:
+        path = root / POLICY_PROFILE_FILENAME
+        if not path.exists():
+            return {}
+        with open(path, 'rb') as fp:
+            return self._profile_decoder.decode(fp.read())
+
+    def profile(self) -> list[PolicyProfile]:
+        """
+        Per-policy execution profile built from Cloud Custodian metadata
+        and tracer segments. Policies that have not been executed at all
+        have no metadata and are not included
+        """
+        res = []
+        for region, rules in self._all_rules().items():
+            for name, rule in rules.items():
+                metadata = self._load_metadata(rule)
+                segments = self._load_profile(rule)
+                api_calls: dict[str, int] = {}
+                for call, count in metadata.api_calls.items():
+                    service = call.split('.', maxsplit=1)[0]
+                    api_calls[service] = api_calls.get(service, 0) + count
+                resources = rule / 'resources.json'
+                exists = resources.exists()
+                res.append(
+                    PolicyProfile(
+                        policy=name,
+                        region=region,
+                        resource_type=self.adjust_resource_type(
+                            metadata.resource_type
+                        ),
+                        wall_time=metadata.end_time - metadata.start_time,
+                        describe_time=segments.get('resource-fetch', 0.0)
+                        + segments.get('resource-augment', 0.0),
+                        filter_time=segments.get('filter', 0.0),
+                        action_time=sum(
+                            v
+                            for k, v in segments.items()
+                            if k.startswith('action:')
+                        ),
+                        output_time=segments.get('output', 0.0),
+                        filters={
+                            k.split(':', maxsplit=1)[1]: v
+                            for k, v in segments.items()
+                            if k.startswith('filter:')
+                        },
+                        api_calls=api_calls,
+                        api_calls_total=sum(api_calls.values()),
+                        resources=metadata.failed_resources_count
+                        if exists
+                        else None,
+                        bytes_written=resources.stat().st_size
+                        if exists
+                        else None,
+                    )
                 )
+        return res
 
-    def iter_shard_parts_for_region(
+    def iter_shard_parts(
         self,
-        region: str,
         failed: FailedPoliciesMap | dict,
+        region: str | None = None,
+        rules: Collection[str] | None = None,
+        exclude: Collection[str] = (),
     ) -> Generator[ShardPart, None, None]:
-        for reg, rule, metadata, resources in self.iter_raw(with_resources=True):
-            if reg != region:
-                continue
+        for reg, rule, metadata, resources in self.iter_raw(
+            with_resources=True, region=region, rules=rules, exclude=exclude
+        ):
             if resources is None:
-                if er := failed.get((reg, rule)):
+                # policy error occurred
+                if er := self._failed(failed, reg, rule):
                     error = er[0], er[1]
                 else:
                     error = PolicyErrorType.INTERNAL, 'Unknown policy error'
@@ -301,29 +553,43 @@ class JobResult:
                     resources=resources,
                 )
 
-    def rules_meta_for_region(self, region: str) -> dict[str, RuleMeta]:
-        result: dict[str, RuleMeta] = {}
-        for reg, rule, metadata, _ in self.iter_raw(with_resources=False):
-            if reg != region:
-                continue
-            meta = {
-                k: v
-                for k, v in metadata.policy.items()
-                if k not in ('filters', 'name')
-            }
-            if 'resource' in meta:
-                meta['resource'] = self.adjust_resource_type(meta['resource'])
-            result.setdefault(rule, {}).update(meta)
-        return result
+    def iter_shard_parts_for_region(
+        self,
+        region: str,
+        failed: FailedPoliciesMap | dict,
+        rules: Collection[str] | None = None,
+        exclude: Collection[str] = (),
+    ) -> Generator[ShardPart, None, None]:
+        return self.iter_shard_parts(
+            failed, region=region, rules=rules, exclude=exclude
+        )
+
+    def rules_meta_for_region(
+        self,
+        region: str,
+        rules: Collection[str] | None = None,
+        exclude: Collection[str] = (),
+    ) -> dict[str, RuleMeta]:
+        return self.rules_meta(region=region, rules=rules, exclude=exclude)
 
-    def rules_meta(self) -> dict[str, RuleMeta]:
+    def rules_meta(
+        self,
+        region: str | None = None,
+        rules: Collection[str] | None = None,
+        exclude: Collection[str] = (),
+    ) -> dict[str, RuleMeta]:
         """
         Collect some meta for each policy, currently it's everything that
         policy has except filters
+        :param region: collect meta only for policies from this region
+        :param rules: see iter_raw
+        :param exclude: see iter_raw
         :return:
         """
         result = {}
-        for _, rule, metadata, _ in self.iter_raw(with_resources=False):
+        for _, rule, metadata, _ in self.iter_raw(
+            with_resources=False, region=region, rules=rules, exclude=exclude
+        ):
             meta = {
                 k: v
                 for k, v in metadata.policy.items()
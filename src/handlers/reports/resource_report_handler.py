@@ -44,6 +44,7 @@ from services.resources import (
     K8SResource,
     ResourceVisitor,
     iter_rule_resource,
+    prepare_resource_type,
 )
 from services.sharding import ShardsCollection
 from services.xlsx_writer import CellContent, Table, XlsxRowsWriter
@@ -62,6 +63,36 @@ _LOG = get_logger(__name__)
 Payload = tuple[str, CloudResource, dict]
 
 
+def fetch_resources(
+    collection: ShardsCollection,
+    cloud: Cloud,
+    resource_type: str | None = None,
+    region: str | None = None,
+) -> None:
+    """
+    Fetches only what the report can contain. If the resource type is
+    given, only parts of its policies are read, large shards are not
+    downloaded entirely. Meta of the collection must be set before
+    """
+    if resource_type:
+        rt = prepare_resource_type(resource_type, cloud)
+        policies = {
+            policy
+            for policy, data in collection.meta.items()
+            if 'resource' in data
+            and prepare_resource_type(data['resource'], cloud) == rt
+        }
+        _LOG.debug(f'Fetching parts of {len(policies)} {rt} policies')
+        if policies:
+            collection.fetch_parts(policies)
+    elif region:
+        _LOG.debug('Region is provided. Fetching only shard with this region')
+        collection.fetch(region=region)
+    else:
+        _LOG.debug('Region is not provided. Fetching all shards')
+        collection.fetch_all()
+
+
 class ResourceMatcher(ResourceVisitor[dict]):
     def __init__(
         self, search_by: dict, exact_match: bool, search_by_all: bool
@@ -519,10 +550,9 @@ class ResourceReportHandler(AbstractHandler):
             )
         metadata = self._ls.get_customer_metadata(event.customer_id)
         collection = self._report_service.platform_latest_collection(platform)
-        _LOG.debug('Fetching collection')
-        collection.fetch_all()
         _LOG.debug('Fetching meta')
         collection.fetch_meta()
+        fetch_resources(collection, Cloud.KUBERNETES, event.resource_type)
 
         dictionary_url = None
         dictionary = {}  # todo maybe refactor somehow
@@ -591,16 +621,14 @@ class ResourceReportHandler(AbstractHandler):
         )
 
         collection = self._report_service.tenant_latest_collection(tenant_item)
-        if event.region:
-            _LOG.debug(
-                'Region is provided. Fetching only shard with this region'
-            )
-            collection.fetch(region=event.region)
-        else:
-            _LOG.debug('Region is not provided. Fetching all shards')
-            collection.fetch_all()
         _LOG.debug('Fetching meta')
         collection.fetch_meta()
+        fetch_resources(
+            collection,
+            tenant_cloud(tenant_item),
+            event.resource_type,
+            event.region,
+        )
         metadata = self._ls.get_customer_metadata(event.customer_id)
 
         dictionary_url = None
@@ -688,15 +716,13 @@ class ResourceReportHandler(AbstractHandler):
                 tenant=tenant_item,
                 job=job,
             )
-            if event.region:
-                _LOG.debug(
-                    'Region is provided. Fetching only shard with this region'
-                )
-                collection.fetch(region=event.region)
-            else:
-                _LOG.debug('Region is not provided. Fetching all shards')
-                collection.fetch_all()
             collection.meta = self._report_service.fetch_meta(tenant_item)
+            fetch_resources(
+                collection,
+                tenant_cloud(tenant_item),
+                event.resource_type,
+                event.region,
+            )
             matched = MatchedResourcesIterator(
                 collection=collection,
                 cloud=tenant_cloud(tenant_item),
@@ -761,8 +787,6 @@ class ResourceReportHandler(AbstractHandler):
                 platform=platform,
                 job=job,
             )
-            _LOG.debug('Fetching collection')
-            collection.fetch_all()
 
         else:
 
@@ -774,16 +798,9 @@ class ResourceReportHandler(AbstractHandler):
 
             collection = self._report_service.job_collection(tenant, job)
             region = event.region
-            if region:
-                _LOG.debug(
-                    'Region is provided. Fetching only shard with this region'
-                )
-                collection.fetch(region=region)
-            else:
-                _LOG.debug('Region is not provided. Fetching all shards')
-                collection.fetch_all()
 
         collection.meta = self._report_service.fetch_meta(entity)
+        fetch_resources(collection, cloud, event.resource_type, region)
         matched = MatchedResourcesIterator(
             collection=collection,
             cloud=cloud,
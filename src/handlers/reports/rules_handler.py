@@ -24,6 +24,7 @@ from services.report_service import (
 )
 from services.xlsx_writer import CellContent, Table, XlsxRowsWriter
 from validators.swagger_request_models import (
+    JobRuleProfileReportGetModel,
     JobRuleReportGetModel,
     TenantRuleReportGetModel,
 )
@@ -142,6 +143,9 @@ class JobsRulesHandler(AbstractHandler):
             Endpoint.REPORTS_RULES_JOBS_JOB_ID: {
                 HTTPMethod.GET: self.get_by_job
             },
+            Endpoint.REPORTS_RULES_JOBS_JOB_ID_PROFILE: {
+                HTTPMethod.GET: self.get_profile_by_job
+            },
             Endpoint.REPORTS_RULES_TENANTS_TENANT_NAME: {
                 HTTPMethod.GET: self.get_by_tenant_accumulated
             },
@@ -203,6 +207,30 @@ class JobsRulesHandler(AbstractHandler):
                 ).dict()
         return build_response(content=content)
 
+    @validate_kwargs
+    def get_profile_by_job(
+        self, event: JobRuleProfileReportGetModel, job_id: str
+    ):
+        job = next(
+            self._job_service.get_by_job_types(
+                job_id=job_id,
+                job_types=event.job_types,
+                customer_name=event.customer,
+            ),
+            None,
+        )
+        if not job:
+            return build_response(
+                content='The request job not found', code=HTTPStatus.NOT_FOUND
+            )
+        profile = self._report_service.job_profile(job)
+        if not profile:
+            return build_response(
+                content='Profile of the job is not available',
+                code=HTTPStatus.NOT_FOUND,
+            )
+        return build_response(content=profile)
+
     @validate_kwargs
     def get_by_tenant_accumulated(
         self, event: TenantRuleReportGetModel, tenant_name: str
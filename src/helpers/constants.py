@@ -119,6 +119,7 @@ class Endpoint(str, Enum):
     SETTINGS_LICENSE_MANAGER_CONFIG = '/settings/license-manager/config'
     LICENSE_LICENSE_KEY_ACTIVATION = '/licenses/{license_key}/activation'
     REPORTS_RULES_TENANTS_TENANT_NAME = '/reports/rules/tenants/{tenant_name}'
+    REPORTS_RULES_JOBS_JOB_ID_PROFILE = '/reports/rules/jobs/{job_id}/profile'
     TENANTS_TENANT_NAME_EXCLUDED_RULES = (
         '/tenants/{tenant_name}/excluded-rules'
     )
@@ -573,6 +574,29 @@ class Env(EnvEnum):
         (),
         '65',
     )
+    # shards of one collection read or written in parallel threads
+    SHARDS_IO_CONCURRENCY = 'SRE_SHARDS_IO_CONCURRENCY', (), '8'
+    # "json" or "msgpack". JSON shards can be read by previous versions,
+    # switch to msgpack once all the components are updated
+    SHARDS_FORMAT = 'SRE_SHARDS_FORMAT', (), 'json'
+    # parts with that many resources are kept in the content-addressed
+    # parts store instead of shards, only for msgpack shards. 0 disables
+    # the store. Enable once all the components are updated
+    SHARDS_PARTS_STORE_MIN_RESOURCES = (
+        'SRE_SHARDS_PARTS_STORE_MIN_RESOURCES',
+        (),
+        '0',
+    )
+    # parts store objects nothing refers to are removed after that time
+    SHARDS_PARTS_STORE_GRACE_DAYS = (
+        'SRE_SHARDS_PARTS_STORE_GRACE_DAYS',
+        (),
+        '7',
+    )
+    # resources per shard a large collection is re-sharded for
+    SHARDS_TARGET_RESOURCES = 'SRE_SHARDS_TARGET_RESOURCES', (), '20000'
+    # HTTP connections of the S3 client shared by all threads
+    S3_MAX_POOL_CONNECTIONS = 'SRE_S3_MAX_POOL_CONNECTIONS', (), '32'
 
     # Cognito either one will work, but ID faster and safer
     USER_POOL_NAME = 'SRE_USER_POOL_NAME', ('CAAS_USER_POOL_NAME',)
@@ -781,12 +805,95 @@ class Env(EnvEnum):
         (),
         180
     )
+    CELERY_SWEEP_SHARDS_PARTS_SCHEDULE = (
+        'SRE_CELERY_SWEEP_SHARDS_PARTS_SCHEDULE',
+        (),
+        # celery's order: minute, hour, day_of_week, day_of_month, month
+        '0 10 sun * *',  # every Sunday at 10:00 UTC
+    )
 
     SCAN_RESOURCES_PROCESSORS = (
         'SRE_SCAN_RESOURCES_PROCESSORS',
         (),
         '2',  # 2 processors used ~1GB of RAM in the total sum
     )
+    # how many tenants are collected at once. They share the processors
+    SCAN_RESOURCES_TENANTS = ('SRE_SCAN_RESOURCES_TENANTS', (), '4')
+
+    # Executor
+    EXECUTOR_REGIONS_CONCURRENCY = (
+        'SRE_EXECUTOR_REGIONS_CONCURRENCY',
+        (),
+        '1',  # regions of one job scanned in parallel processes
+    )
+    EXECUTOR_WORKER_REGIONS_CONCURRENCY = (
+        'SRE_EXECUTOR_WORKER_REGIONS_CONCURRENCY',
+        (),
+    )  # region processes for all jobs on one worker host, unset - no limit
+    EXECUTOR_POLICIES_CONCURRENCY = (
+        'SRE_EXECUTOR_POLICIES_CONCURRENCY',
+        (),
+        '1',  # threads executing policies inside one region, 1 - serially
+    )
+    # RSS budget of one region process in MiB. When exceeded, the process
+    # finishes running policies and the rest go to a fresh process.
+    # Unset - no limit, peak memory is still measured
+    EXECUTOR_REGION_MEMORY_LIMIT = 'SRE_EXECUTOR_REGION_MEMORY_LIMIT', ()
+    EXECUTOR_MEMORY_WATCHDOG_INTERVAL = (
+        'SRE_EXECUTOR_MEMORY_WATCHDOG_INTERVAL',
+        (),
+        '1',  # seconds between RSS samples
+    )
+    # seconds between checkpoints of finished policies of running regions,
+    # a resumed job does not execute them again. 0 - only whole regions
+    EXECUTOR_POLICY_CHECKPOINT_INTERVAL = (
+        'SRE_EXECUTOR_POLICY_CHECKPOINT_INTERVAL',
+        (),
+        '60',
+    )
+    # order of policies inside a region based on their previous durations:
+    # auto, longest, cheapest, none. Auto - longest first when policies are
+    # executed in parallel
+    EXECUTOR_POLICIES_ORDER = 'SRE_EXECUTOR_POLICIES_ORDER', (), 'auto'
+    # time describe, filters and actions of each policy for job profiles
+    EXECUTOR_PROFILE_POLICIES = 'SRE_EXECUTOR_PROFILE_POLICIES', (), 'true'
+    # rulesets content kept on the worker and revalidated by ETag, MiB.
+    # 0 - disabled
+    EXECUTOR_RULESETS_CACHE_SIZE = (
+        'SRE_EXECUTOR_RULESETS_CACHE_SIZE',
+        (),
+        '256',
+    )
+    EXECUTOR_RULESETS_CACHE_DIR = 'SRE_EXECUTOR_RULESETS_CACHE_DIR', ()
+    # keep validation verdicts of policy definitions on the worker, so that
+    # rules of shared rulesets are not validated again by every job
+    EXECUTOR_POLICIES_CACHE = 'SRE_EXECUTOR_POLICIES_CACHE', (), 'true'
+    EXECUTOR_POLICIES_CACHE_DIR = 'SRE_EXECUTOR_POLICIES_CACHE_DIR', ()
+    # MiB, least recently used verdicts are evicted
+    EXECUTOR_POLICIES_CACHE_SIZE = (
+        'SRE_EXECUTOR_POLICIES_CACHE_SIZE',
+        (),
+        '64',
+    )
+    # preload Cloud Custodian resources once before forking region processes
+    EXECUTOR_PRELOAD_CC = 'SRE_EXECUTOR_PRELOAD_CC', (), 'true'
+    # Cloud Custodian describe cache: "memory" - per region process,
+    # "tenant" - sqlite files on the worker shared by all region processes
+    # and subsequent jobs of the same tenant within the cache period
+    EXECUTOR_RESOURCES_CACHE = 'SRE_EXECUTOR_RESOURCES_CACHE', (), 'memory'
+    EXECUTOR_RESOURCES_CACHE_DIR = 'SRE_EXECUTOR_RESOURCES_CACHE_DIR', ()
+    EXECUTOR_RESOURCES_CACHE_PERIOD = (
+        'SRE_EXECUTOR_RESOURCES_CACHE_PERIOD',
+        (),
+        '120',  # minutes
+    )
+    # total size of tenant directories, MiB. Expired and then least
+    # recently used ones are removed when a job starts
+    EXECUTOR_RESOURCES_CACHE_SIZE = (
+        'SRE_EXECUTOR_RESOURCES_CACHE_SIZE',
+        (),
+        '2048',
+    )
 
     # Cloud Custodian
     CC_LOG_LEVEL = 'SRE_CC_LOG_LEVEL', (), 'INFO'
@@ -895,6 +1002,11 @@ class Permission(str, Enum):
     )
     REPORT_ERRORS_DESCRIBE = 'report:get_job_errors', False, True
     REPORT_RULES_DESCRIBE_JOB = 'report:get_job_rules', False, True
+    REPORT_RULES_DESCRIBE_JOB_PROFILE = (
+        'report:get_job_rules_profile',
+        False,
+        True,
+    )
     REPORT_RULES_DESCRIBE_TENANT = 'report:get_tenant_rules', False, True
     REPORT_RESOURCES_GET_TENANT_LATEST = (
         'report:get_tenant_latest_resources',
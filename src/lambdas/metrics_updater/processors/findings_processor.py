@@ -52,17 +52,19 @@ class FindingsUpdater(BaseProcessor):
                 bucket=bucket, prefix=prefix
             )
             for obj in objects:
-                # prefix: /bla/bla/latest
+                # prefix: /bla/bla/latest/
                 # key: /bla/bla/latest/1.json.gz
                 # destination: /bla/bla/snapshots/2023/10/10/10/1.json.gz
+                # shards of a layout keep their folder:
+                # /bla/bla/latest/hash-8-v1/1.json.gz ->
+                # /bla/bla/snapshots/2023/10/10/10/hash-8-v1/1.json.gz
                 key = obj.key
-                path = PurePosixPath(key)
                 destination = ReportsBucketKeysBuilder.urljoin(
-                    str(path.parent.parent),
+                    str(PurePosixPath(prefix).parent),
                     ReportsBucketKeysBuilder.snapshots,
                     ReportsBucketKeysBuilder.datetime(),
                 )
-                destination += path.name
+                destination += key[len(prefix):]
                 _LOG.debug(f'Copying {key} to {destination}')
                 self._s3_client.copy(
                     bucket=bucket,
@@ -13,6 +13,7 @@ from executor.job import (
     update_metadata,
     upload_to_dojo,
     remove_old_shard_parts,
+    sweep_unreferenced_shard_parts,
 )
 from helpers import RequestContext
 from helpers.constants import ACTION_PARAM, Env
@@ -206,3 +207,12 @@ def remove_old_shards(days) -> None:
     Remove shard parts that were last updated N days ago
     """
     remove_old_shard_parts(days)
+
+
+@app.task
+@safe_call
+def sweep_shards_parts() -> None:
+    """
+    Remove objects of the shards parts store that nothing refers to
+    """
+    sweep_unreferenced_shard_parts()
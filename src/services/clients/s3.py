@@ -3,6 +3,7 @@ import io
 import mimetypes
 import re
 import shutil
+import zlib
 from datetime import datetime, timedelta
 from typing import BinaryIO, Generator, Iterable, Optional, TypedDict, cast
 from urllib.parse import urlencode
@@ -22,6 +23,41 @@ _LOG = get_logger(__name__)
 
 Json = dict | list | str | int | float | tuple
 
+# chunk of uncompressed data that is kept in memory while streaming
+_GZ_CHUNK_SIZE = 1 << 20
+
+
+class GzipStream(io.RawIOBase):
+    """
+    Compresses the wrapped stream while it is read, so the compressed
+    payload is never spooled to disk or memory. It is not seekable, so
+    upload_fileobj reads it sequentially and uploads large payloads in
+    parts
+    """
+
+    def __init__(self, raw: BinaryIO, chunk_size: int = _GZ_CHUNK_SIZE):
+        self._raw = raw
+        self._chunk_size = chunk_size
+        self._compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+        self._pending = bytearray()
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._pending and not self._eof:
+            data = self._raw.read(self._chunk_size)
+            if data:
+                self._pending += self._compressor.compress(data)
+            else:
+                self._pending += self._compressor.flush()
+                self._eof = True
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        del self._pending[:n]
+        return n
+
 
 class S3Url:
     __slots__ = ('_parsed',)
@@ -69,7 +105,12 @@ class S3Client(Boto3ClientWrapper):
 
     @classmethod
     def _base_config(cls) -> Config:
-        return Config(retries={'max_attempts': 10, 'mode': 'standard'})
+        # the client is thread-safe and its connection pool is shared by
+        # threads that read or write shards concurrently
+        return Config(
+            retries={'max_attempts': 10, 'mode': 'standard'},
+            max_pool_connections=Env.S3_MAX_POOL_CONNECTIONS.as_int(),
+        )
 
     @classmethod
     def _minio_config(cls) -> Config:
@@ -212,18 +253,16 @@ class S3Client(Boto3ClientWrapper):
         bucket: str,
         key: str,
         body: bytes | BinaryIO | bytearray,
-        gz_buffer: BinaryIO | None = None,
         content_type: str | None = None,
         content_encoding: str | None = None,
     ):
         """
         Uploads the file adding .gz to the file extension and compressing the
-        body if it's not already compressed.
+        body if it's not already compressed. Bytes are compressed in memory,
+        streams are compressed while they are uploaded
         :param bucket:
         :param key:
         :param body:
-        :param gz_buffer: optional buffer to use for compression.
-        Otherwise - in memory. Argument can be used for large files
         :param content_type:
         :param content_encoding:
         :return:
@@ -246,18 +285,14 @@ class S3Client(Boto3ClientWrapper):
                 content_encoding=content_encoding,
             )
 
-        if not gz_buffer:
-            gz_buffer = io.BytesIO()
-        with gzip.GzipFile(fileobj=gz_buffer, mode='wb') as gz:
-            if isinstance(body, (bytes, bytearray)):
-                gz.write(body)
-            else:
-                shutil.copyfileobj(body, gz)
-        gz_buffer.seek(0)
+        if isinstance(body, (bytes, bytearray)):
+            stream = gzip.compress(body)
+        else:
+            stream = io.BufferedReader(GzipStream(body), _GZ_CHUNK_SIZE)
         return self.put_object(
             bucket=bucket,
             key=self._gz_key(key),
-            body=gz_buffer,
+            body=stream,
             content_type=content_type,
             content_encoding=content_encoding,
         )
@@ -290,34 +325,106 @@ class S3Client(Boto3ClientWrapper):
         return buffer
 
     def gz_get_object(
-        self,
-        bucket: str,
-        key: str,
-        buffer: io.BytesIO | None = None,
-        gz_buffer: io.BytesIO | None = None,
-    ) -> io.BytesIO | None:
+        self, bucket: str, key: str, buffer: BinaryIO | None = None
+    ) -> BinaryIO | None:
         """
+        Decompresses the response stream while it is downloaded, only the
+        decompressed content is written to the buffer. In case the key does
+        not exist, None is returned
         :param bucket:
         :param key:
-        :param buffer:
-        :param gz_buffer: can be optionally provided to use as a buffer for
-        compression. You can provide some temp file in case the size of body
-        is expected to be large
+        :param buffer: in memory by default
         :return:
         """
-        if not gz_buffer:
-            gz_buffer = io.BytesIO()
-        stream = self.get_object(bucket, self._gz_key(key), gz_buffer)
-        if not stream:
-            return
-        gz_buffer.seek(0)
+        try:
+            response = self.client.get_object(
+                Bucket=bucket, Key=self._gz_key(key)
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return
+            raise e
         if not buffer:
             buffer = io.BytesIO()
-        with gzip.GzipFile(fileobj=gz_buffer, mode='rb') as gz:
-            shutil.copyfileobj(gz, buffer)
+        with (
+            response['Body'] as body,
+            gzip.GzipFile(fileobj=body, mode='rb') as gz,
+        ):
+            shutil.copyfileobj(gz, buffer, _GZ_CHUNK_SIZE)
         buffer.seek(0)
         return buffer
 
+    def get_object_if_none_match(
+        self, bucket: str, key: str, etag: str | None = None
+    ) -> tuple[bytes | None, str | None]:
+        """
+        Conditional download. Returns the body and its ETag. If the object
+        still has the given ETag, the body is None and the ETag is returned
+        back. If the object does not exist, both are None
+        :param bucket:
+        :param key:
+        :param etag: ETag of a locally cached copy
+        :return: (body, etag)
+        """
+        params = {'Bucket': bucket, 'Key': key}
+        if etag:
+            params['IfNoneMatch'] = etag
+        try:
+            response = self.client.get_object(**params)
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code in ('304', 'NotModified'):
+                return None, etag
+            if code in ('NoSuchKey', '404'):
+                return None, None
+            raise e
+        with response['Body'] as body:
+            return body.read(), response.get('ETag')
+
+    def gz_get_object_if_none_match(
+        self, bucket: str, key: str, etag: str | None = None
+    ) -> tuple[bytes | None, str | None]:
+        """
+        The same as get_object_if_none_match but decompresses the body
+        """
+        data, etag = self.get_object_if_none_match(
+            bucket, self._gz_key(key), etag
+        )
+        if data is not None:
+            data = gzip.decompress(data)
+        return data, etag
+
+    def gz_get_object_range(
+        self,
+        bucket: str,
+        key: str,
+        start: int,
+        end: int,
+        etag: str | None = None,
+    ) -> tuple[bytes, str] | None:
+        """
+        Downloads bytes [start; end] of the compressed object as they are.
+        If the ETag is given, the object must still have it, otherwise
+        ClientError with PreconditionFailed code is raised. In case the key
+        does not exist, None is returned
+        :return: (bytes, etag)
+        """
+        params = {
+            'Bucket': bucket,
+            'Key': self._gz_key(key),
+            'Range': f'bytes={start}-{end}',
+        }
+        if etag:
+            params['IfMatch'] = etag
+        try:
+            response = self.client.get_object(**params)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return
+            raise e
+        with response['Body'] as body:
+            return body.read(), response.get('ETag')
+
     def put_json(self, bucket: str, key: str, obj: Json):
         return self.put_object(
             bucket=bucket,
@@ -619,6 +726,9 @@ class ModularAssumeRoleS3Service(S3Client):
         ct, ce = self._resolve_content_type(
             key, content_type, content_encoding
         )
+        if not isinstance(body, (bytes, bytearray)) and not body.seekable():
+            # put_object needs the length of the body in advance
+            body = body.read()
         params = dict(Bucket=bucket, Key=key, Body=body)
         if ct:
             params.update(ContentType=ct)
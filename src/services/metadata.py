@@ -1,6 +1,5 @@
 import gzip
 import io
-import tempfile
 import datetime
 from enum import Enum
 from typing import TYPE_CHECKING, Generator, Protocol, TypedDict, cast
@@ -355,7 +354,6 @@ class MetadataProvider:
         buf = self._s3.gz_get_object(
             bucket=self._env.default_reports_bucket_name(),
             key=ReportMetaBucketsKeys.meta_key(license_key, version),
-            gz_buffer=tempfile.TemporaryFile(),
         )
         if buf is None:
             return
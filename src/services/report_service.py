@@ -49,6 +49,8 @@ class StatisticsItem(msgspec.Struct, kw_only=True, eq=False):
     reason: str | None = None
     traceback: list[str] = msgspec.field(default_factory=list)
     error_type: PolicyErrorType | None = None
+    # peak RSS in bytes of the processes that scanned the region
+    region_peak_memory: int | msgspec.UnsetType = msgspec.UNSET
 
     def is_successful(self) -> bool:
         return self.error_type is None
@@ -226,6 +228,17 @@ class ReportService:
             return []
         return self._job_statistics_decoder.decode(data.getvalue())
 
+    def job_profile(self, job: Job) -> dict | None:
+        """
+        Execution profile of the job's policies. None for jobs executed
+        before profiles were collected
+        """
+        data = self.s3_client.gz_get_json(
+            bucket=self.environment_service.get_statistics_bucket_name(),
+            key=StatisticsBucketKeysBuilder.job_profile(job),
+        )
+        return data or None
+
     @staticmethod
     def average_statistics(
         *iterables: Iterable[StatisticsItem],
@@ -287,6 +300,7 @@ class ReportService:
         item.scanned_resources = msgspec.UNSET
         item.failed_resources = msgspec.UNSET
         item.traceback = msgspec.UNSET
+        item.region_peak_memory = msgspec.UNSET
         return item
 
     @staticmethod
@@ -48,6 +48,7 @@ class ReportsBucketKeysBuilder(ABC):
     result = 'result/'
     partial = 'partial/'
     difference = 'difference/'
+    parts = 'parts/'
 
     @staticmethod
     def urljoin(*args) -> str:
@@ -112,6 +113,13 @@ class ReportsBucketKeysBuilder(ABC):
         Returns a path to a folder with snapshots
         """
 
+    @abstractmethod
+    def parts_folder(self) -> str:
+        """
+        Returns a path to the content-addressed parts store shared by
+        job results, latest and snapshots
+        """
+
     def snapshot_key(self, date: datetime) -> str:
         """
         Returns a path to snapshot for the given date. You can definitely
@@ -206,6 +214,15 @@ class TenantReportsBucketKeysBuilder(ReportsBucketKeysBuilder):
             self.snapshots,
         )
 
+    def parts_folder(self) -> str:
+        return self.urljoin(
+            self.prefix,
+            self._tenant.customer_name,
+            self.cloud.value,
+            self._tenant.project,
+            self.parts,
+        )
+
     def base_job(self, job: Job) -> str:
         if job.tenant_name != self._tenant.name:
             raise ValueError(
@@ -278,12 +295,23 @@ class PlatformReportsBucketKeysBuilder(ReportsBucketKeysBuilder):
             self.snapshots,
         )
 
+    def parts_folder(self) -> str:
+        return self.urljoin(
+            self.prefix,
+            self._platform.customer,
+            self.cloud.value,
+            self._platform.id,
+            self.parts,
+        )
+
 
 class StatisticsBucketKeysBuilder:
     _statistics = 'job-statistics/'
     _standard = 'standard/'
     _reactive = 'reactive/'
     _statistics_file = 'statistics.json'
+    _profile_file = 'profile.json'
+    _rules_durations = 'rules-durations/'
     _diagnostic_report_file = 'diagnostic_report.json'
     _report_statistics = 'report-statistics/'
     _tenant_statistics = 'tenant-statistics/'
@@ -291,20 +319,29 @@ class StatisticsBucketKeysBuilder:
     _diagnostic = 'diagnostic/'
 
     @classmethod
-    def job_statistics(cls, job: Job) -> str:
+    def _job_file(cls, job: Job, name: str) -> str:
         if job.job_type == JobType.REACTIVE:
-            return urljoin(
-                cls._statistics,
-                cls._reactive,
-                job.id,
-                cls._statistics_file,
-            )
-        return urljoin(
-            cls._statistics,
-            cls._standard,
-            job.id,
-            cls._statistics_file,
-        )
+            return urljoin(cls._statistics, cls._reactive, job.id, name)
+        return urljoin(cls._statistics, cls._standard, job.id, name)
+
+    @classmethod
+    def job_statistics(cls, job: Job) -> str:
+        return cls._job_file(job, cls._statistics_file)
+
+    @classmethod
+    def job_profile(cls, job: Job) -> str:
+        """
+        Per-policy execution profile, kept next to the job statistics
+        """
+        return cls._job_file(job, cls._profile_file)
+
+    @classmethod
+    def rules_durations(cls, cloud: Cloud) -> str:
+        """
+        Smoothed execution time of each rule of a cloud, used to order
+        policies before a scan
+        """
+        return urljoin(cls._rules_durations, f'{cloud.value}.json')
 
     @classmethod
     def report_statistics(cls, now: datetime, customer: str) -> str:
@@ -1,7 +1,11 @@
 from datetime import date, datetime
-from typing import Any
+from typing import Any, Iterable, NamedTuple
 
+from pymongo import ReplaceOne
 from pynamodb.pagination import ResultIterator
+from modular_sdk.models.pynamongo.convertors import (
+    PynamoDBModelToMongoDictSerializer,
+)
 from modular_sdk.models.tenant import Tenant
 
 from helpers.constants import (
@@ -51,7 +55,114 @@ except ImportError:
     K8sResourceMap = None
 
 
+class ResourcesSyncStats(NamedTuple):
+    upserted: int
+    deleted: int
+    unchanged: int
+
+    @property
+    def total(self) -> int:
+        """
+        Number of resources that are stored after the sync
+        """
+        return self.upserted + self.unchanged
+
+
 class ResourcesService(BaseDataService[Resource]):
+    _ser = PynamoDBModelToMongoDictSerializer()
+
+    def _policy_filter(
+        self, account_id: str, location: str, resource_type: str
+    ) -> dict:
+        return {
+            Resource.account_id.attr_name: account_id,
+            Resource.location.attr_name: location,
+            Resource.resource_type.attr_name: resource_type,
+        }
+
+    def get_policy_resources_hashes(
+        self, account_id: str, location: str, resource_type: str
+    ) -> dict[str, str | None]:
+        """
+        Returns resource id to sha256 of its data. Only these two fields
+        are fetched
+        """
+        assert self.model_class.is_mongo_model(), 'only MongoDB is supported'
+        col = self.model_class.mongo_adapter().get_collection(self.model_class)
+        id_attr = Resource.id.attr_name
+        sha_attr = Resource.sha256.attr_name
+        cursor = col.find(
+            self._policy_filter(account_id, location, resource_type),
+            projection={id_attr: True, sha_attr: True, '_id': False},
+        )
+        return {item[id_attr]: item.get(sha_attr) for item in cursor}
+
+    def sync_policy_resources(
+        self,
+        account_id: str,
+        location: str,
+        resource_type: str,
+        resources: Iterable[Resource],
+        sync_date: float,
+        chunk_size: int = 500,
+    ) -> ResourcesSyncStats:
+        """
+        Makes the stored resources of the given type equal to the given ones
+        writing only the difference. Resources are compared by sha256 of
+        their data: new and changed ones are upserted, vanished ones are
+        deleted and unchanged ones only get the new sync date with one
+        update. All the given resources must have the same account,
+        location, type and sync date
+        """
+        assert self.model_class.is_mongo_model(), 'only MongoDB is supported'
+        col = self.model_class.mongo_adapter().get_collection(self.model_class)
+        flt = self._policy_filter(account_id, location, resource_type)
+        existing = self.get_policy_resources_hashes(
+            account_id, location, resource_type
+        )
+
+        seen = set()
+        upserted = unchanged = 0
+        batch = []
+        for resource in resources:
+            seen.add(resource.id)
+            if existing.get(resource.id) == resource.sha256:
+                unchanged += 1
+                continue
+            batch.append(
+                ReplaceOne(
+                    filter=self._ser.instance_serialized_keys(resource),
+                    replacement=self._ser.serialize(resource),
+                    upsert=True,
+                )
+            )
+            if len(batch) == chunk_size:
+                col.bulk_write(batch, ordered=False)
+                upserted += len(batch)
+                batch.clear()
+        if batch:
+            col.bulk_write(batch, ordered=False)
+            upserted += len(batch)
+
+        vanished = [i for i in existing if i not in seen]
+        for i in range(0, len(vanished), chunk_size):
+            chunk = vanished[i : i + chunk_size]
+            col.delete_many({**flt, Resource.id.attr_name: {'$in': chunk}})
+        if unchanged:
+            # upserted ones already have this date, so they are not touched
+            col.update_many(
+                {**flt, Resource.sync_date.attr_name: {'$ne': sync_date}},
+                {'$set': {Resource.sync_date.attr_name: sync_date}},
+            )
+        _LOG.info(
+            f'Synced resources {account_id=}:{location=}:{resource_type=}: '
+            f'{upserted} upserted, {len(vanished)} deleted, '
+            f'{unchanged} unchanged'
+        )
+        return ResourcesSyncStats(
+            upserted=upserted, deleted=len(vanished), unchanged=unchanged
+        )
+
     def remove_policy_resources(
         self, account_id: str, location: str, resource_type: str
     ):
@@ -61,11 +172,7 @@ class ResourcesService(BaseDataService[Resource]):
         assert self.model_class.is_mongo_model(), 'only MongoDB is supported'
         col = self.model_class.mongo_adapter().get_collection(self.model_class)
         res = col.delete_many(
-            {
-                Resource.account_id.attr_name: account_id,
-                Resource.location.attr_name: location,
-                Resource.resource_type.attr_name: resource_type,
-            }
+            self._policy_filter(account_id, location, resource_type)
         )
         _LOG.info(
             f'Removed {res.deleted_count} resources {account_id=}:{location=}:{resource_type=}'
@@ -1,27 +1,40 @@
+import gzip
+import hashlib
 import io
-import tempfile
 import time
+import zlib
 from abc import ABC, abstractmethod
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import PurePosixPath
 from typing import (
     TYPE_CHECKING,
+    Callable,
     Generator,
     Iterable,
     Iterator,
+    NamedTuple,
     TypedDict,
+    TypeVar,
     cast,
 )
 
 import msgspec
+from botocore.exceptions import ClientError
 
-from helpers import hashable
-from helpers.constants import GLOBAL_REGION, Cloud, PolicyErrorType
+from helpers import batches
+from helpers.constants import GLOBAL_REGION, Cloud, Env, PolicyErrorType
+from helpers.log_helper import get_logger
 from services.clients.s3 import S3Client
 
 if TYPE_CHECKING:
     from modular_sdk.models.tenant import Tenant
 
+_LOG = get_logger(__name__)
+
+T = TypeVar('T')
+R = TypeVar('R')
+
 # do not change the order, just append new regions. This collection is only
 # for shards distributor
 AWS_REGIONS = (
@@ -57,6 +70,30 @@ AWS_REGIONS = (
     'us-gov-west-1',
 )
 
+# reserved keys of meta.json that keep the layout of a collection, the
+# number of its resources and the format its shards were written in
+LAYOUT_META_KEY = '__layout__'
+RESOURCES_META_KEY = '__resources__'
+FORMAT_META_KEY = '__format__'
+RESERVED_META_KEYS = (LAYOUT_META_KEY, RESOURCES_META_KEY, FORMAT_META_KEY)
+SHARDS_LAYOUT_VERSION = 1
+MAX_SHARDS = 256
+
+# binary shards start with the magic and one byte of format version. JSON
+# shards have no header, they always start with "["
+SHARD_FORMAT_MAGIC = b'\x00SHD'
+# 1: msgpack list of parts, compressed as a whole
+# 2: manifest and parts, each one is a separate gzip member
+SHARD_FORMAT_VERSION = 2
+# the first range request of a partial read. Usually it contains the whole
+# manifest and some parts
+SHARD_MANIFEST_READ_SIZE = 1 << 16
+# blocks closer than that are downloaded by one range request
+SHARD_RANGE_GAP = 1 << 14
+# shards are written often and read many times, so compression speed
+# matters more than the last percents of size
+SHARD_COMPRESS_LEVEL = 1
+
 
 class RuleMeta(TypedDict):
     description: str
@@ -91,6 +128,12 @@ class ShardPart(
     error: str | None = msgspec.field(default=None, name='e')
     # resources timestamp should be always be None if error is None
     previous_timestamp: float | None = msgspec.field(default=None, name='T')
+    # persisted only: resources are the same as of this policy's part in
+    # the same location, see pack_aliases
+    alias_of: str | None = msgspec.field(default=None, name='a')
+    # persisted only: resources are in the parts store under this key,
+    # see PartsStore
+    ref: str | None = msgspec.field(default=None, name='h')
 
     def has_error(self) -> bool:
         return self.error is not None
@@ -129,18 +172,232 @@ class ShardPart(
         return f'<{self.__class__.__name__} {self.policy}:{self.location}>'
 
 
+def pack_aliases(parts: Iterable[ShardPart]) -> list[ShardPart]:
+    """
+    Fingerprint aliases of a policy share one resources list in memory.
+    Such parts are written by reference: the first part of a location keeps
+    resources and others refer to its policy. Sharing is detected by
+    identity, so equal lists that are not the same object are kept as is
+    """
+    owners: dict[tuple[str, int], str] = {}
+    result = []
+    for part in parts:
+        if part.resources and part.alias_of is None:
+            owner = owners.setdefault(
+                (part.location, id(part.resources)), part.policy
+            )
+            if owner != part.policy:
+                part = msgspec.structs.replace(
+                    part, resources=[], alias_of=owner
+                )
+        result.append(part)
+    return result
+
+
+def unpack_aliases(parts: list[ShardPart]) -> list[ShardPart]:
+    """
+    Resolves references written by pack_aliases. Resolved parts share the
+    resources list of the referenced part
+    """
+    if not any(part.alias_of for part in parts):
+        return parts
+    owners = {
+        (part.policy, part.location): part
+        for part in parts
+        if part.alias_of is None
+    }
+    for i, part in enumerate(parts):
+        if part.alias_of is None:
+            continue
+        owner = owners.get((part.alias_of, part.location))
+        parts[i] = msgspec.structs.replace(
+            part,
+            resources=owner.resources if owner else [],
+            alias_of=None,
+        )
+    return parts
+
+
+_fingerprint_encoder = msgspec.json.Encoder(order='sorted')
+
+
+def resource_fingerprint(resource: dict) -> bytes:
+    """
+    Stable digest of a resource. Keys order does not matter, order of
+    list items does
+    """
+    return hashlib.blake2b(
+        _fingerprint_encoder.encode(resource), digest_size=16
+    ).digest()
+
+
+class ResourcesDiff(NamedTuple):
+    added: list[dict]
+    removed: list[dict]
+    unchanged: list[dict]
+
+
+def diff_resources(new: list[dict], old: list[dict]) -> ResourcesDiff:
+    """
+    Compares two lists of resources by their fingerprints. Resources are
+    returned as they are in the given lists, each one only once
+    """
+    old_index = {resource_fingerprint(r): r for r in old}
+    added, unchanged = [], []
+    seen = set()
+    for resource in new:
+        fp = resource_fingerprint(resource)
+        if fp in seen:
+            continue
+        seen.add(fp)
+        if fp in old_index:
+            unchanged.append(resource)
+        else:
+            added.append(resource)
+    removed = [r for fp, r in old_index.items() if fp not in seen]
+    return ResourcesDiff(added, removed, unchanged)
+
+
+class ManifestEntry(msgspec.Struct, array_like=True, frozen=True):
+    policy: str
+    location: str
+    # compressed block of the part, offset is relative to the first block
+    offset: int
+    length: int
+    # length of the decompressed block
+    size: int
+    alias_of: str | None = None
+
+
+class ShardManifest(msgspec.Struct, array_like=True):
+    parts: list[ManifestEntry]
+
+
+_json_encoder = msgspec.json.Encoder()
+_json_decoder = msgspec.json.Decoder(type=list[ShardPart])
+_msgpack_encoder = msgspec.msgpack.Encoder()
+_msgpack_decoder = msgspec.msgpack.Decoder(type=list[ShardPart])
+_part_decoder = msgspec.msgpack.Decoder(type=ShardPart)
+_manifest_decoder = msgspec.msgpack.Decoder(type=ShardManifest)
+_HEADER_SIZE = len(SHARD_FORMAT_MAGIC) + 1
+
+
+def _gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=SHARD_COMPRESS_LEVEL, mtime=0)
+
+
+def encode_shard(
+    parts: Iterable[ShardPart],
+    binary: bool = True,
+    store: 'PartsStore | None' = None,
+) -> bytes:
+    """
+    Returns compressed content of a shard. A binary shard is a sequence
+    of gzip members: the first one holds the format header and the
+    manifest, each next one holds one part. Together they are still one
+    valid gzip stream, but a reader that has the manifest can download and
+    decompress only the parts it needs. JSON is kept for collections that
+    must stay readable by previous versions, so aliases are not packed and
+    large parts are not moved to the store for JSON shards
+    """
+    if not binary:
+        return _gzip(_json_encoder.encode(list(parts)))
+    parts = pack_aliases(parts)
+    if store is not None:
+        parts = [store.externalize(part) for part in parts]
+    entries, blocks, offset = [], [], 0
+    for part in parts:
+        raw = _msgpack_encoder.encode(part)
+        block = _gzip(raw)
+        entries.append(
+            ManifestEntry(
+                policy=part.policy,
+                location=part.location,
+                offset=offset,
+                length=len(block),
+                size=len(raw),
+                alias_of=part.alias_of,
+            )
+        )
+        blocks.append(block)
+        offset += len(block)
+    manifest = _msgpack_encoder.encode(ShardManifest(entries))
+    head = (
+        SHARD_FORMAT_MAGIC
+        + bytes((SHARD_FORMAT_VERSION,))
+        + len(manifest).to_bytes(4, 'big')
+        + manifest
+    )
+    return _gzip(head) + b''.join(blocks)
+
+
+def decode_shard(
+    data: bytes, store: 'PartsStore | None' = None
+) -> list[ShardPart]:
+    """
+    Decodes decompressed content of binary and JSON shards of all
+    versions. Parts that refer to the store are resolved by it
+    """
+    if not data.startswith(SHARD_FORMAT_MAGIC):
+        return unpack_aliases(_json_decoder.decode(data))
+    version = data[_HEADER_SIZE - 1]
+    view = memoryview(data)[_HEADER_SIZE:]
+    if version == 1:
+        return unpack_aliases(_msgpack_decoder.decode(view))
+    if version != 2:
+        raise ValueError(f'Unsupported shard format version: {version}')
+    length = int.from_bytes(view[:4], 'big')
+    manifest = _manifest_decoder.decode(view[4 : 4 + length])
+    parts, start = [], 4 + length
+    for entry in manifest.parts:
+        parts.append(_part_decoder.decode(view[start : start + entry.size]))
+        start += entry.size
+    if store is not None:
+        parts = store.resolve(parts)
+    return unpack_aliases(parts)
+
+
+def read_manifest(head: bytes) -> tuple[ShardManifest, int] | None:
+    """
+    Reads the manifest from the beginning of a compressed shard. Returns
+    the manifest and the offset of the first block in the shard or None if
+    the shard has no manifest. Raises EOFError if the given bytes do not
+    contain the whole manifest
+    """
+    decompressor = zlib.decompressobj(31)
+    data = decompressor.decompress(head)
+    if len(data) < _HEADER_SIZE and not decompressor.eof:
+        raise EOFError
+    if not data.startswith(SHARD_FORMAT_MAGIC) or data[_HEADER_SIZE - 1] != 2:
+        return
+    if not decompressor.eof:
+        raise EOFError
+    view = memoryview(data)[_HEADER_SIZE:]
+    length = int.from_bytes(view[:4], 'big')
+    manifest = _manifest_decoder.decode(view[4 : 4 + length])
+    return manifest, len(head) - len(decompressor.unused_data)
+
+
+def decode_block(block: bytes) -> ShardPart:
+    return _part_decoder.decode(gzip.decompress(block))
+
+
 class Shard(Iterable[ShardPart]):
     """
     Shard store shard parts. This shard implementation uses policy and
     location as a key to a shard part. This means that we can update
     resources within policy & region. Maybe we will need some other
     implementations in the future
+
+    ``dirty`` tells whether the shard was changed since it was fetched or
+    written, so a collection can write only changed shards
     """
 
-    __slots__ = ('_data',)
+    __slots__ = ('_data', 'dirty')
 
     def __init__(self, data: dict | None = None):
         self._data: dict[tuple[str, str], ShardPart] = data or dict()
+        self.dirty = bool(self._data)
 
     def __iter__(self) -> Iterator[ShardPart]:
         return self._data.values().__iter__()
@@ -167,9 +424,10 @@ class Shard(Iterable[ShardPart]):
         key = (part.policy, part.location)
         if key not in self._data:
             self._data[key] = part
+            self.dirty = True
             return
         existing = self._data[key]
-        if existing.timestamp > part.timestamp:
+        if existing is part or existing.timestamp > part.timestamp:
             # existing part is newer so ignoring that one
             return
         # here existing is older, so need to replace with a new one properly
@@ -188,12 +446,16 @@ class Shard(Iterable[ShardPart]):
                 previous_timestamp=ts,
             )
         self._data[key] = part
+        self.dirty = True
 
     def pop(self, policy: str, location: str) -> ShardPart | None:
         """
         Removes part from this shard
         """
-        return self._data.pop((policy, location), None)
+        part = self._data.pop((policy, location), None)
+        if part is not None:
+            self.dirty = True
+        return part
 
     def get(self, policy: str, location: str) -> ShardPart | None:
         return self._data.get((policy, location), None)
@@ -208,6 +470,25 @@ class Shard(Iterable[ShardPart]):
             self.put(part)
 
 
+class ShardsLayout(msgspec.Struct, frozen=True):
+    """
+    Layout of a collection that is not distributed by the legacy
+    distributor of its cloud. It is kept in meta.json of the collection
+    under LAYOUT_META_KEY. Shards of such a layout are kept in a sub-folder
+    named after the layout, so a collection is migrated while it is read:
+    new shards are written first and then meta.json switches readers to
+    them
+    """
+
+    kind: str
+    n: int
+    v: int = SHARDS_LAYOUT_VERSION
+
+    @property
+    def id(self) -> str:
+        return f'{self.kind}-{self.n}-v{self.v}'
+
+
 class ShardDataDistributor(ABC):
     """
     Defines logic how we must distribute parts between shards. We always have
@@ -251,6 +532,20 @@ class ShardDataDistributor(ABC):
         """
         return self.distribute(**self.key(part))
 
+    def shards(self, **kwargs) -> list[int]:
+        """
+        Returns all the shards that can contain parts with the given
+        attributes
+        """
+        return [self.distribute(**kwargs)]
+
+    @property
+    def layout(self) -> ShardsLayout | None:
+        """
+        None for legacy distributors which are chosen by cloud
+        """
+        return
+
 
 class SingleShardDistributor(ShardDataDistributor):
     """
@@ -293,6 +588,229 @@ class AWSRegionDistributor(ShardDataDistributor):
         return index % self._n
 
 
+class PolicyHashDistributor(ShardDataDistributor):
+    """
+    Is used for large collections. Parts are spread evenly by location
+    and policy, so the size of a shard is bounded by the number of shards
+    instead of the size of the biggest region. Reading one region requires
+    all the shards, they are read in parallel
+    """
+
+    kind = 'hash'
+
+    def key(self, part: ShardPart) -> dict:
+        return dict(location=part.location, policy=part.policy)
+
+    def distribute(self, **kwargs) -> int:
+        """
+        Requires location and policy
+        """
+        key = f'{kwargs["location"]}:{kwargs["policy"]}'
+        return zlib.crc32(key.encode()) % self._n
+
+    def shards(self, **kwargs) -> list[int]:
+        if 'location' in kwargs and 'policy' in kwargs:
+            return [self.distribute(**kwargs)]
+        return list(range(self._n))
+
+    @property
+    def layout(self) -> ShardsLayout:
+        return ShardsLayout(kind=self.kind, n=self._n)
+
+
+def distributor_from_layout(layout: ShardsLayout) -> ShardDataDistributor:
+    if (
+        layout.v != SHARDS_LAYOUT_VERSION
+        or layout.kind != PolicyHashDistributor.kind
+        or not 0 < layout.n <= MAX_SHARDS
+    ):
+        raise ValueError(f'Unsupported shards layout: {layout.id}')
+    return PolicyHashDistributor(layout.n)
+
+
+def fitting_layout(
+    resources: int, distributor: ShardDataDistributor, target: int
+) -> ShardsLayout | None:
+    """
+    Returns the layout a collection with the given number of resources
+    should be migrated to or None if the current one fits. A collection
+    grows to the next power of two shards once it exceeds the target
+    number of resources per shard and shrinks only when it becomes four
+    times smaller, so it does not flip between layouts
+    """
+    n = distributor.shards_number
+    grow = resources > target * n
+    shrink = distributor.layout is not None and resources * 4 < target * n
+    if not grow and not shrink:
+        return
+    needed = max(-(-resources // target), 1)
+    layout = ShardsLayout(
+        kind=PolicyHashDistributor.kind,
+        n=min(1 << (needed - 1).bit_length(), MAX_SHARDS),
+    )
+    if layout == distributor.layout:
+        return
+    return layout
+
+
+class PartsStore:
+    """
+    Content-addressed store of large resources lists. Consecutive jobs of
+    a tenant mostly find the same resources, so the job result, latest and
+    its snapshots refer to the same immutable objects instead of
+    uploading and keeping their own copies. A part refers to its object by
+    the full key, so a reader needs no configuration.
+
+    Objects that no shard refers to anymore (their snapshots and job
+    results expired) are removed by :meth:`sweep`. It keeps objects that
+    were put recently, and a writer puts an existing object again if it's
+    older than half of that grace period, so an object is never removed
+    between the moment a writer reuses it and the moment its shard is
+    written.
+
+    Small parts are kept in shards: one more request for each of them
+    would cost more than it saves
+    """
+
+    __slots__ = (
+        '_client',
+        '_bucket',
+        '_root',
+        '_min_resources',
+        '_grace',
+        '_known',
+    )
+    _encoder = msgspec.msgpack.Encoder(order='sorted')
+    _decoder = msgspec.msgpack.Decoder(type=list[dict])
+
+    def __init__(
+        self,
+        client: S3Client,
+        bucket: str,
+        root: str | None = None,
+        min_resources: int | None = None,
+        grace: float | None = None,
+    ):
+        """
+        :param root: folder for new objects. Without it parts are only
+        resolved and nothing is put
+        :param min_resources: parts with fewer resources stay in shards,
+        SRE_SHARDS_PARTS_STORE_MIN_RESOURCES by default
+        :param grace: seconds unreferenced objects are kept for,
+        SRE_SHARDS_PARTS_STORE_GRACE_DAYS by default
+        """
+        self._client = client
+        self._bucket = bucket
+        self._root = root
+        if min_resources is None:
+            min_resources = Env.SHARDS_PARTS_STORE_MIN_RESOURCES.as_int()
+        self._min_resources = min_resources
+        if grace is None:
+            grace = Env.SHARDS_PARTS_STORE_GRACE_DAYS.as_float() * 86400
+        self._grace = grace
+        # keys that are known to exist and stay for at least half of grace
+        self._known: set[str] = set()
+
+    def _key(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        return str(PurePosixPath(self._root, digest[:2], digest))
+
+    def externalize(self, part: ShardPart) -> ShardPart:
+        """
+        Puts resources of a large part to the store unless they are
+        already there and returns the part that refers to them
+        """
+        if (
+            self._root is None
+            or self._min_resources <= 0
+            or len(part.resources) < self._min_resources
+        ):
+            return part
+        data = self._encoder.encode(part.resources)
+        key = self._key(data)
+        if key not in self._known:
+            if not self._fresh(key):
+                self._client.gz_put_object(
+                    bucket=self._bucket, key=key, body=_gzip(data)
+                )
+            self._known.add(key)
+        return msgspec.structs.replace(part, resources=[], ref=key)
+
+    def _fresh(self, key: str) -> bool:
+        """
+        Whether the object exists and is not going to be swept soon even
+        if nothing refers to it yet
+        """
+        obj = self._client.object_meta(self._bucket, key + '.gz')
+        if obj is None:
+            return False
+        return time.time() - obj.last_modified.timestamp() < self._grace / 2
+
+    def sweep(self, shards: Iterable[str]) -> int:
+        """
+        Removes objects that none of the given shards refers to and that
+        are older than the grace period. Shards are keys of all the
+        collections that can use this store: latest, snapshots and job
+        results. Nothing is removed if some shard cannot be read. Returns
+        the number of removed objects
+        """
+        assert self._root is not None, 'root is required to sweep'
+        now = time.time()
+        candidates = {
+            obj.key[: -len('.gz')]
+            for obj in self._client.list_objects(self._bucket, self._root)
+            if obj.key.endswith('.gz')
+            and now - obj.last_modified.timestamp() >= self._grace
+        }
+        if not candidates:
+            return 0
+        for key in shards:
+            obj = self._client.gz_get_object(self._bucket, key)
+            if obj is None:  # removed meanwhile, e.g. by a layout migration
+                continue
+            try:
+                parts = decode_shard(cast(io.BytesIO, obj).getvalue())
+            except (msgspec.DecodeError, ValueError):
+                _LOG.exception(f'Cannot read shard {key}, parts are kept')
+                return 0
+            candidates.difference_update(p.ref for p in parts if p.ref)
+            if not candidates:
+                return 0
+        for chunk in batches(sorted(candidates), 1000):
+            self._client.client.delete_objects(
+                Bucket=self._bucket,
+                Delete={
+                    'Objects': [{'Key': f'{key}.gz'} for key in chunk],
+                    'Quiet': True,
+                },
+            )
+        self._known.difference_update(candidates)
+        return len(candidates)
+
+    def get(self, key: str) -> list[dict]:
+        obj = self._client.gz_get_object(self._bucket, key)
+        if obj is None:
+            raise ValueError(f'Shard part {key} does not exist')
+        self._known.add(key)
+        return self._decoder.decode(cast(io.BytesIO, obj).getvalue())
+
+    def resolve(self, parts: list[ShardPart]) -> list[ShardPart]:
+        """
+        Replaces references with resources. Parts that refer to the same
+        object share its resources list
+        """
+        loaded: dict[str, list[dict]] = {}
+        for i, part in enumerate(parts):
+            if part.ref is None:
+                continue
+            if part.ref not in loaded:
+                loaded[part.ref] = self.get(part.ref)
+            parts[i] = msgspec.structs.replace(
+                part, resources=loaded[part.ref], ref=None
+            )
+        return parts
+
+
 class ShardsIO(ABC):
     """
     Defines an interface for shards writer
@@ -315,8 +833,11 @@ class ShardsIO(ABC):
 
     def read_raw_many(
         self, numbers: Iterable[int]
-    ) -> Iterator[list[ShardPart]]:
-        return filter(lambda x: x is not None, map(self.read_raw, numbers))
+    ) -> Iterator[list[ShardPart] | None]:
+        """
+        Reads shards in the given order, None for shards that do not exist
+        """
+        return map(self.read_raw, numbers)
 
     @abstractmethod
     def read_raw(self, n: int) -> list[ShardPart] | None:
@@ -326,29 +847,110 @@ class ShardsIO(ABC):
         :return:
         """
 
+    def read_parts(
+        self, n: int, match: Callable[[str, str], bool]
+    ) -> list[ShardPart] | None:
+        """
+        Reads parts of a shard whose policy and location match
+        """
+        parts = self.read_raw(n)
+        if parts is None:
+            return
+        return [p for p in parts if match(p.policy, p.location)]
+
+    def read_parts_many(
+        self, numbers: Iterable[int], match: Callable[[str, str], bool]
+    ) -> Iterator[list[ShardPart] | None]:
+        return (self.read_parts(n, match) for n in numbers)
+
     @abstractmethod
     def write_meta(self, meta: dict): ...
 
     @abstractmethod
     def read_meta(self) -> dict: ...
 
+    def use_layout(self, layout: ShardsLayout | None):
+        """
+        Shards are read and written in the given layout after this call
+        """
+
+    @property
+    def format(self) -> str | None:
+        """
+        Format shards are written in. It is kept in meta.json and given to
+        readers by use_format. None if readers do not need it
+        """
+        return None
+
+    def use_format(self, fmt: str):
+        """
+        Stored shards are expected to be in the given format after this
+        call. Shards of another format must still be read
+        """
+
+    def delete_shards(self, layout: ShardsLayout | None, n: int):
+        """
+        Removes shards [0; n) of the given layout
+        """
+
+
+class _ShardChanged(Exception):
+    """
+    The shard was replaced or removed while its parts were read
+    """
+
 
 class ShardsS3IO(ShardsIO):
     """
-    Writer V1
+    Writer V1. Multiple shards are read and written by a bounded pool of
+    threads that share the connection pool of the S3 client. Results are
+    delivered in the order of the given shards. Shards are written in the
+    format set by SRE_SHARDS_FORMAT, both formats are read
     """
 
-    __slots__ = '_bucket', '_root', '_client'
-    _encoder = msgspec.json.Encoder()
+    __slots__ = (
+        '_bucket',
+        '_root',
+        '_client',
+        '_workers',
+        '_layout',
+        '_binary',
+        '_parts',
+        '_manifests',
+    )
 
-    def __init__(self, bucket: str, key: str, client: S3Client):
+    def __init__(
+        self,
+        bucket: str,
+        key: str,
+        client: S3Client,
+        workers: int | None = None,
+        binary: bool | None = None,
+        parts: PartsStore | None = None,
+    ):
         """
         :param bucket:
         :param key: root folder where to put shards
+        :param workers: max parallel requests, SRE_SHARDS_IO_CONCURRENCY
+        by default
+        :param binary: whether to write binary shards, SRE_SHARDS_FORMAT
+        by default
+        :param parts: store to put large parts to. They are kept in shards
+        if it is not given
         """
         self._bucket = bucket
         self._root = key
         self._client = client
+        if workers is None:
+            workers = Env.SHARDS_IO_CONCURRENCY.as_int()
+        self._workers = max(workers, 1)
+        if binary is None:
+            binary = Env.SHARDS_FORMAT.get() != 'json'
+        self._binary = binary
+        self._parts = parts or PartsStore(client, bucket)
+        self._layout: ShardsLayout | None = None
+        # JSON shards have no manifest, parts of them are not probed
+        self._manifests = binary
 
     @property
     def key(self) -> str:
@@ -358,28 +960,156 @@ class ShardsS3IO(ShardsIO):
     def key(self, value: str):
         self._root = value
 
+    def _shard_key(self, layout: ShardsLayout | None, n: int) -> str:
+        root = PurePosixPath(self._root)
+        if layout is not None:
+            root = root / layout.id
+        return str((root / str(n)).with_suffix('.json'))
+
     def _key(self, n: int) -> str:
-        return str((PurePosixPath(self._root) / str(n)).with_suffix('.json'))
+        return self._shard_key(self._layout, n)
+
+    def use_layout(self, layout: ShardsLayout | None):
+        self._layout = layout
+
+    @property
+    def format(self) -> str:
+        return 'binary' if self._binary else 'json'
+
+    def use_format(self, fmt: str):
+        self._manifests = fmt != 'json'
+
+    def delete_shards(self, layout: ShardsLayout | None, n: int):
+        keys = [self._shard_key(layout, i) for i in range(n)]
+        for _ in self._map(
+            lambda key: self._client.gz_delete_object(self._bucket, key), keys
+        ):
+            pass
 
     def write(self, n: int, shard: Shard):
         self._client.gz_put_object(
             bucket=self._bucket,
             key=self._key(n),
-            body=self._encoder.encode(tuple(shard)),
-            gz_buffer=tempfile.TemporaryFile(),
+            body=encode_shard(shard, self._binary, self._parts),
         )
 
+    def _map(
+        self, func: Callable[[T], R], items: Iterable[T]
+    ) -> Iterator[R]:
+        items = list(items)
+        if self._workers == 1 or len(items) <= 1:
+            yield from map(func, items)
+            return
+        _ = self._client.client  # initialized once, not by each thread
+        with ThreadPoolExecutor(
+            max_workers=min(self._workers, len(items)),
+            thread_name_prefix='shards-io',
+        ) as executor:
+            yield from executor.map(func, items)
+
+    def write_many(self, pairs: Iterable[tuple[int, Shard]]):
+        for _ in self._map(lambda pair: self.write(*pair), pairs):
+            pass
+
+    def read_raw_many(
+        self, numbers: Iterable[int]
+    ) -> Iterator[list[ShardPart] | None]:
+        return self._map(self.read_raw, numbers)
+
     def read_raw(self, n: int) -> list[ShardPart] | None:
         obj = self._client.gz_get_object(
             bucket=self._bucket,
             key=self._key(n),
-            gz_buffer=tempfile.TemporaryFile(),
         )
         if not obj:
             return
-        return msgspec.json.decode(
-            cast(io.BytesIO, obj).getvalue(), type=list[ShardPart]
+        return decode_shard(cast(io.BytesIO, obj).getvalue(), self._parts)
+
+    def read_parts_many(
+        self, numbers: Iterable[int], match: Callable[[str, str], bool]
+    ) -> Iterator[list[ShardPart] | None]:
+        return self._map(lambda n: self.read_parts(n, match), numbers)
+
+    def read_parts(
+        self, n: int, match: Callable[[str, str], bool]
+    ) -> list[ShardPart] | None:
+        """
+        Downloads the manifest of the shard and then only blocks of the
+        matching parts using range requests. Shards without a manifest and
+        shards that are replaced while they are read are read entirely.
+        Shards expected to be JSON are read entirely without probing
+        """
+        if not self._manifests:
+            return super().read_parts(n, match)
+        try:
+            parts = self._read_parts(self._key(n), match)
+        except _ShardChanged:
+            parts = None
+        if parts is not None:
+            return parts
+        return super().read_parts(n, match)
+
+    def _range(
+        self, key: str, start: int, end: int, etag: str | None
+    ) -> tuple[bytes, str]:
+        try:
+            got = self._client.gz_get_object_range(
+                self._bucket, key, start, end - 1, etag
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', '412'):
+                raise _ShardChanged from e
+            raise e
+        if got is None:
+            raise _ShardChanged
+        return got
+
+    def _read_parts(
+        self, key: str, match: Callable[[str, str], bool]
+    ) -> list[ShardPart] | None:
+        size, etag = SHARD_MANIFEST_READ_SIZE, None
+        while True:
+            head, etag = self._range(key, 0, size, etag)
+            try:
+                found = read_manifest(head)
+                break
+            except EOFError:
+                if len(head) < size:  # the whole shard is here
+                    return
+                size *= 4
+        if found is None:
+            return
+        manifest, first = found
+        wanted = [e for e in manifest.parts if match(e.policy, e.location)]
+        owners = {(e.alias_of, e.location) for e in wanted if e.alias_of}
+        wanted.extend(
+            e
+            for e in manifest.parts
+            if (e.policy, e.location) in owners
+            and not match(e.policy, e.location)
         )
+        wanted.sort(key=lambda e: e.offset)
+
+        spans: list[tuple[int, int, list[ManifestEntry]]] = []
+        for entry in wanted:
+            start = first + entry.offset
+            end = start + entry.length
+            if spans and start - spans[-1][1] <= SHARD_RANGE_GAP:
+                spans[-1] = (spans[-1][0], end, spans[-1][2] + [entry])
+            else:
+                spans.append((start, end, [entry]))
+        parts = []
+        for start, end, entries in spans:
+            if end <= len(head):
+                data, base = head, 0
+            else:
+                data, base = self._range(key, start, end, etag)[0], start
+            for entry in entries:
+                offset = first + entry.offset - base
+                block = data[offset : offset + entry.length]
+                parts.append(decode_block(block))
+        parts = unpack_aliases(self._parts.resolve(parts))
+        return [p for p in parts if match(p.policy, p.location)]
 
     def write_meta(self, meta: dict):
         self._client.gz_put_json(
@@ -421,10 +1151,28 @@ class ShardsIterator(Iterator[tuple[int, Shard]]):
 
 class ShardsCollection(Iterable[tuple[int, Shard]]):
     """
-    Light abstraction over shards, shards writer and distributor
+    Light abstraction over shards, shards writer and distributor.
+
+    The distributor given to a collection is the legacy one of its cloud.
+    If the stored collection has another layout (see ``rebalance``), it is
+    kept in meta.json. Shards are read in the legacy layout first and meta
+    is fetched only if none of them exists, then the distributor is
+    replaced and the shards are read again. Collections that were never
+    re-sharded are read without an extra request
     """
 
-    __slots__ = '_distributor', 'io', 'shards', 'meta'
+    __slots__ = (
+        '_distributor',
+        'io',
+        'shards',
+        'meta',
+        '_remote_meta',
+        '_stored',
+        '_partial',
+        '_stored_resources',
+        '_remote_reserved',
+        '_fetched',
+    )
 
     def __init__(
         self, distributor: ShardDataDistributor, io: ShardsIO | None = None
@@ -434,6 +1182,16 @@ class ShardsCollection(Iterable[tuple[int, Shard]]):
 
         self.shards: defaultdict[int, Shard] = defaultdict(Shard)
         self.meta: dict[str, RuleMeta] = {}
+        # meta as it is in the storage, to write it only if changed
+        self._remote_meta: dict[str, RuleMeta] | None = None
+        # layout and number of shards in the storage, None if unknown
+        self._stored: tuple[ShardsLayout | None, int] | None = None
+        # shards that were fetched only partially must not be written
+        self._partial: set[int] = set()
+        # resources in the storage: in total and in each fetched shard
+        self._stored_resources: int | None = None
+        self._remote_reserved: dict = {}
+        self._fetched: dict[int, int] = {}
 
     def __iter__(self) -> Iterator[tuple[int, Shard]]:
         """
@@ -481,6 +1239,18 @@ class ShardsCollection(Iterable[tuple[int, Shard]]):
         for _, shard in other:
             self.put_parts(shard)
 
+    def get_part(self, policy: str, location: str) -> ShardPart | None:
+        """
+        Looks up a part in the shard it is distributed to
+        """
+        n = self._distributor.distribute_part(
+            ShardPart(policy=policy, location=location)
+        )
+        shard = self.shards.get(n)
+        if shard is None:
+            return
+        return shard.get(policy, location)
+
     def __sub__(self, other: 'ShardsCollection') -> 'ShardsCollection':
         """
         Returns a difference between two collections. Uses
@@ -488,12 +1258,7 @@ class ShardsCollection(Iterable[tuple[int, Shard]]):
         """
         new = ShardsCollectionFactory.difference()
         for part in self.iter_parts():
-            existing = None
-            for _, shard in other:
-                p = shard.get(part.policy, part.location)
-                if p:
-                    existing = p
-                    break
+            existing = other.get_part(part.policy, part.location)
             if not existing:  # keeping the current one without changes
                 new.put_part(part)
                 continue
@@ -509,18 +1274,14 @@ class ShardsCollection(Iterable[tuple[int, Shard]]):
                 continue
             # current without error and existing has some resources
             # here need to get difference between two resources lists
-            # TODO: maybe add resource type to shard parts,
-            #  find difference based on ids instead of hashable
-
-            _new = {hashable(item) for item in part.resources}
-            _old = {hashable(item) for item in existing.resources}
-
             new.put_part(
                 ShardPart(
                     policy=part.policy,
                     location=part.location,
                     timestamp=part.timestamp,
-                    resources=list(_new - _old),
+                    resources=diff_resources(
+                        part.resources, existing.resources
+                    ).added,
                     error=None,
                     previous_timestamp=None,
                 )
@@ -563,59 +1324,331 @@ class ShardsCollection(Iterable[tuple[int, Shard]]):
         for part in parts:
             self.put_part(part)
 
+    def shards_of(self, parts: Iterable[ShardPart]) -> set[int]:
+        """
+        Numbers of shards the given parts belong to
+        """
+        return {self._distributor.distribute_part(part) for part in parts}
+
+    def resources_count(self) -> int:
+        return sum(len(part.resources) for part in self.iter_all_parts())
+
+    def total_resources(self) -> int | None:
+        """
+        Number of resources the stored collection has after the local
+        changes are written. Shards that are changed locally must be
+        fetched before. None if the collection was stored before it was
+        counted and was not fetched entirely since then
+        """
+        if self._stored_resources is None:
+            return None
+        return (
+            self._stored_resources
+            - sum(self._fetched.values())
+            + self.resources_count()
+        )
+
+    def fits(self, resources: int, target: int | None = None) -> bool:
+        """
+        Tells whether the given number of resources fits the current
+        layout without growing it
+        """
+        if target is None:
+            target = Env.SHARDS_TARGET_RESOURCES.as_int()
+        return resources <= target * self._distributor.shards_number
+
+    def _redistribute(self, distributor: ShardDataDistributor) -> None:
+        if self._partial:
+            raise ValueError('Partially fetched collection cannot be moved')
+        parts = list(self.iter_all_parts())
+        self._distributor = distributor
+        self.shards = defaultdict(Shard)
+        self.put_parts(parts)
+
+    def rebalance(self, target: int | None = None) -> bool:
+        """
+        Redistributes parts to the layout that fits the number of resources
+        in this collection. It must be complete: built locally or fetched
+        entirely. The new layout is written by the next write, the previous
+        one is removed after that. Returns True if the layout was changed
+        :param target: resources per shard, SRE_SHARDS_TARGET_RESOURCES
+        by default
+        """
+        if target is None:
+            target = Env.SHARDS_TARGET_RESOURCES.as_int()
+        # shards of the stored layout are removed after the switch
+        self.fetch_meta()
+        layout = fitting_layout(
+            self.resources_count(), self._distributor, target
+        )
+        if layout is None:
+            return False
+        self._redistribute(distributor_from_layout(layout))
+        return True
+
+    def _write_shards(self, numbers: list[int]) -> None:
+        if self._partial.intersection(numbers):
+            raise ValueError('Partially fetched shards cannot be written')
+        self.io.use_layout(self._distributor.layout)
+        self.io.write_many((n, self.shards[n]) for n in numbers)
+        for n in numbers:
+            self.shards[n].dirty = False
+
+    def _layout_changed(self) -> bool:
+        current = (self._distributor.layout, self._distributor.shards_number)
+        if self._stored is None:
+            return current[0] is not None
+        return self._stored != current
+
+    def _switch_layout(self) -> None:
+        """
+        Points readers to shards of the current layout and removes shards
+        of the stored one. Must be called after the shards are written
+        """
+        previous = self._stored
+        reserved = self._reserved_meta()
+        self.io.write_meta({**self.meta, **reserved})
+        self._remote_meta = self._copy_meta(self.meta)
+        self._remote_reserved = reserved
+        self._stored = (
+            self._distributor.layout,
+            self._distributor.shards_number,
+        )
+        if previous is not None:
+            self.io.delete_shards(*previous)
+
     def write_all(self):
         """
         Writes all the shards that are currently in memory
         :return:
         """
-        self.io.write_many(iter(self))
+        self._write_shards([n for n, _ in self])
+        for shard in self.shards.values():
+            shard.dirty = False
+        if self._layout_changed():
+            self._switch_layout()
+
+    def dirty_shards(self) -> list[int]:
+        """
+        Numbers of shards changed since they were fetched or written.
+        Shards that became empty are included
+        """
+        return sorted(n for n, shard in self.shards.items() if shard.dirty)
+
+    def write_dirty(self):
+        """
+        Writes only shards that were changed since they were fetched or
+        written and meta if it differs from the fetched one. I/O is
+        proportional to the change instead of the collection size
+        """
+        self._write_shards(self.dirty_shards())
+        if self._layout_changed():
+            self._switch_layout()
+        elif (
+            (self.meta and self.meta != self._remote_meta)
+            or self._reserved_meta() != self._remote_reserved
+        ):
+            self.write_meta()
+
+    def _put_fetched(self, n: int, parts: list[ShardPart]) -> None:
+        """
+        Shard that holds exactly what is stored stays clean
+        """
+        clean = n not in self.shards or not self.shards[n].dirty
+        for part in parts:
+            m = self._distributor.distribute_part(part)
+            self.shards[m].put(part)
+            clean &= m == n
+        if clean:
+            self.shards[n].dirty = False
+
+    def _fetch_in_layout(self, fetch: Callable[[], bool]) -> None:
+        """
+        Calls fetch that reads shards in the current layout and returns
+        whether any of them exists. If none does and the layout is not
+        known yet, the collection is either empty or stored in another
+        layout, so the layout is fetched from meta and shards are read
+        again
+        """
+        if fetch() or self._stored is not None:
+            return
+        layout = self._distributor.layout
+        self.fetch_meta()
+        if self._distributor.layout != layout:
+            fetch()
+
+    def _fetch_indexes(self, it: Iterable[int]) -> bool:
+        numbers = sorted(set(it))
+        self.io.use_layout(self._distributor.layout)
+        found = False
+        for n, parts in zip(numbers, self.io.read_raw_many(numbers)):
+            self._partial.discard(n)
+            self._fetched[n] = 0
+            if parts is not None:
+                found = True
+                self._fetched[n] = sum(len(p.resources) for p in parts)
+                self._put_fetched(n, parts)
+        return found
+
+    def _count_fetched(self) -> None:
+        """
+        The stored collection is counted exactly once all its shards are
+        fetched
+        """
+        numbers = range(self._distributor.shards_number)
+        if all(n in self._fetched for n in numbers):
+            self._stored_resources = sum(self._fetched.values())
 
     def fetch_by_indexes(self, it: Iterable[int]):
         """
-        Fetches shards by specified indexes
+        Fetches shards by specified indexes. The indexes must be
+        calculated in the stored layout, so call fetch_meta before if the
+        collection can be re-sharded
         """
-        for parts in self.io.read_raw_many(set(it)):
-            self.put_parts(parts)
+        self._fetch_indexes(it)
 
     def fetch_all(self):
         """
         Fetches all the shards
         :return:
         """
-        it = range(self._distributor.shards_number)
-        self.fetch_by_indexes(it)
+        self._fetch_in_layout(
+            lambda: self._fetch_indexes(
+                range(self._distributor.shards_number)
+            )
+        )
+        self._count_fetched()
+
+    def fetch_rest(self):
+        """
+        Fetches the shards that were not fetched yet, so the collection
+        becomes complete and can be rebalanced. Unlike fetch_all it does
+        not override local changes of fetched shards. The layout must be
+        fetched before
+        """
+        self._fetch_indexes(
+            n
+            for n in range(self._distributor.shards_number)
+            if n not in self._fetched
+        )
+        self._count_fetched()
 
     def fetch(self, **kwargs):
         """
-        Fetch only one shard, distributes its part to the right local
-        shards according to the distributor
+        Fetches shards that can contain parts with the given attributes,
+        distributes their parts to the right local shards according to
+        the distributor
         :param kwargs: depends on the self._distributor instance
         :return:
         """
-        n = self._distributor.distribute(**kwargs)
-        self.fetch_by_indexes([n])
+        self._fetch_in_layout(
+            lambda: self._fetch_indexes(self._distributor.shards(**kwargs))
+        )
+
+    def fetch_parts(self, policies: Iterable[str], region: str | None = None):
+        """
+        Fetches only parts of the given policies, in the given region if
+        it is provided. Shards are not downloaded entirely, so they cannot
+        be written after that
+        """
+        policies = set(policies)
+
+        def match(policy: str, location: str) -> bool:
+            return policy in policies and (
+                region is None or location == region
+            )
+
+        def fetch() -> bool:
+            if region is None:
+                numbers = list(range(self._distributor.shards_number))
+            else:
+                numbers = sorted(
+                    self.shards_of(
+                        ShardPart(policy=policy, location=region)
+                        for policy in policies
+                    )
+                )
+            self.io.use_layout(self._distributor.layout)
+            it = self.io.read_parts_many(numbers, match)
+            found = False
+            for n, parts in zip(numbers, it):
+                if parts is None:
+                    continue
+                found = True
+                self._partial.update(self.shards_of(parts))
+                self._partial.add(n)
+                self._put_fetched(n, parts)
+            return found
+
+        self._fetch_in_layout(fetch)
 
     def fetch_multiple(self, params: list[dict]):
-        it = [self._distributor.distribute(**kw) for kw in params]
-        self.fetch_by_indexes(it)
+        def fetch() -> bool:
+            it = []
+            for kw in params:
+                it.extend(self._distributor.shards(**kw))
+            return self._fetch_indexes(it)
+
+        self._fetch_in_layout(fetch)
 
     def fetch_modified(self):
         """
         Fetches only those shards that were modified locally
         :return:
         """
-        self.fetch_by_indexes(self.shards.keys())
+        self._fetch_in_layout(lambda: self._fetch_indexes(self.shards.keys()))
 
     def update_meta(self, other: dict[str, RuleMeta]):
         for rule, data in other.items():
             self.meta.setdefault(rule, {}).update(data)
 
+    @staticmethod
+    def _copy_meta(meta: dict[str, RuleMeta]) -> dict[str, RuleMeta]:
+        return {rule: dict(data) for rule, data in meta.items()}
+
     def fetch_meta(self):
-        self.update_meta(self.io.read_meta())
+        """
+        Fetches meta and layout of the collection once, the next calls
+        do nothing. Parts that are already in memory are redistributed if
+        the stored layout differs from the current one
+        """
+        if self._remote_meta is not None:
+            return
+        remote = dict(self.io.read_meta())
+        self._remote_reserved = {
+            key: remote.pop(key) for key in RESERVED_META_KEYS if key in remote
+        }
+        if self._stored_resources is None:
+            self._stored_resources = self._remote_reserved.get(
+                RESOURCES_META_KEY
+            )
+        if (fmt := self._remote_reserved.get(FORMAT_META_KEY)) is not None:
+            self.io.use_format(fmt)
+        layout = self._remote_reserved.get(LAYOUT_META_KEY)
+        if layout is not None:
+            layout = msgspec.convert(layout, ShardsLayout)
+            if layout != self._distributor.layout:
+                self._redistribute(distributor_from_layout(layout))
+        self._stored = (layout, self._distributor.shards_number)
+        self._remote_meta = self._copy_meta(remote)
+        self.update_meta(remote)
+
+    def _reserved_meta(self) -> dict:
+        reserved: dict = {}
+        if (layout := self._distributor.layout) is not None:
+            reserved[LAYOUT_META_KEY] = msgspec.to_builtins(layout)
+        if (total := self.total_resources()) is not None:
+            reserved[RESOURCES_META_KEY] = total
+        if (fmt := self.io.format) is not None:
+            reserved[FORMAT_META_KEY] = fmt
+        return reserved
 
     def write_meta(self):
-        if self.meta:
-            self.io.write_meta(self.meta)
+        reserved = self._reserved_meta()
+        if self.meta or reserved:
+            self.io.write_meta({**self.meta, **reserved})
+            self._remote_meta = self._copy_meta(self.meta)
+            self._remote_reserved = reserved
 
 
 class ShardsCollectionFactory:
@@ -32,6 +32,7 @@ from validators.swagger_request_models import (
     JobGetModel,
     JobPostModel,
     JobResumePostModel,
+    JobRuleProfileReportGetModel,
     JobRuleReportGetModel,
     K8sJobPostModel,
     LicenseActivationPatchModel,
@@ -141,6 +142,7 @@ from validators.swagger_response_models import (
     MultipleTenantsModel,
     MultipleUsersModel,
     RawReportModel,
+    RulesProfileReportModel,
     RulesReportModel,
     SignInModel,
     SingleChronicleActivationModel,
@@ -1143,6 +1145,15 @@ data: tuple[EndpointInfo, ...] = (
         permission=Permission.REPORT_RULES_DESCRIBE_JOB,
         description='Allows to get information about rules executed during a job',
     ),
+    EndpointInfo(
+        path=Endpoint.REPORTS_RULES_JOBS_JOB_ID_PROFILE,
+        method=HTTPMethod.GET,
+        lambda_name=LambdaName.REPORT_GENERATOR,
+        request_model=JobRuleProfileReportGetModel,
+        responses=[(HTTPStatus.OK, RulesProfileReportModel, None)],
+        permission=Permission.REPORT_RULES_DESCRIBE_JOB_PROFILE,
+        description='Allows to get execution profile of rules executed during a job',
+    ),
     EndpointInfo(
         path=Endpoint.REPORTS_RULES_TENANTS_TENANT_NAME,
         method=HTTPMethod.GET,
@@ -1632,6 +1632,12 @@ class JobRuleReportGetModel(BaseModel, JobTypesMixin):
     format: ReportFormat = ReportFormat.JSON
 
 
+class JobRuleProfileReportGetModel(BaseModel, JobTypesMixin):
+    """
+    GET
+    """
+
+
 class TenantRuleReportGetModel(TimeRangedMixin, JobTypesMixin, BaseModel):
     start_iso: datetime | date = Field(None, alias='from')
     end_iso: datetime | date = Field(None, alias='to')
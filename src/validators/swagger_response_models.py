@@ -342,6 +342,38 @@ class RulesReportItem(TypedDict):
     succeeded: bool
 
 
+class PolicyProfileItem(TypedDict):
+    policy: str
+    region: str
+    resource_type: str
+    wall_time: float
+    describe_time: float
+    filter_time: float
+    action_time: float
+    output_time: float
+    filters: dict[str, float]
+    api_calls: dict[str, int]
+    api_calls_total: int
+    resources: int | None
+    bytes_written: int | None
+
+
+class JobProfileTotal(TypedDict):
+    policies: int
+    wall_time: float
+    describe_time: float
+    filter_time: float
+    action_time: float
+    api_calls: int
+    resources: int
+    bytes_written: int
+
+
+class JobProfile(TypedDict):
+    total: JobProfileTotal
+    policies: list[PolicyProfileItem]
+
+
 class AverageRulesReportItem(TypedDict):
     average_exec: float
     average_resources_failed: int
@@ -728,6 +760,10 @@ class RulesReportModel(BaseModel):
     data: BaseReportJob | None  # if href=true
 
 
+class RulesProfileReportModel(BaseModel):
+    data: JobProfile
+
+
 class EntityRulesReportModel(BaseModel):
     items: list[AverageRulesReportItem]
 
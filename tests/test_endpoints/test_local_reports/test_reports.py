@@ -1,6 +1,6 @@
 import pytest
 
-from executor.services.report_service import JobResult
+from executor.services.report_service import JobResult, job_profile
 from helpers.constants import JobState, Cloud, PolicyErrorType
 from helpers.time_helper import utc_datetime
 from services import SP
@@ -62,6 +62,11 @@ def aws_job(aws_tenant, aws_scan_result, create_tenant_job):
             failed
         ),
     )
+    SP.s3.gz_put_json(
+        bucket=SP.environment_service.get_statistics_bucket_name(),
+        key=StatisticsBucketKeysBuilder.job_profile(job),
+        obj=job_profile(result.profile()),
+    )
     return job
 
 
@@ -129,6 +134,41 @@ def test_errors_report_aws_job(
     assert returned == expected
 
 
+def test_rules_profile_aws_job(
+    system_user_token, sre_client, aws_job, aws_scan_result
+):
+    resp = sre_client.request(
+        f'/reports/rules/jobs/{aws_job.id}/profile',
+        auth=system_user_token,
+        data={'customer_id': aws_job.customer_name},
+    )
+    assert resp.status_int == 200
+    data = resp.json['data']
+    policies = data['policies']
+    assert data['total']['policies'] == len(policies) > 0
+    times = [p['wall_time'] for p in policies]
+    assert times == sorted(times, reverse=True)
+    assert data['total']['api_calls'] == sum(
+        p['api_calls_total'] for p in policies
+    )
+    for item in policies:
+        assert item['resource_type'].startswith('aws.')
+        assert sum(item['api_calls'].values()) == item['api_calls_total']
+
+
+def test_rules_profile_not_found(
+    system_user_token, sre_client, aws_tenant, create_tenant_job
+):
+    job = create_tenant_job(aws_tenant, utc_datetime(), JobState.SUCCEEDED)
+    job.save()
+    resp = sre_client.request(
+        f'/reports/rules/jobs/{job.id}/profile',
+        auth=system_user_token,
+        data={'customer_id': job.customer_name},
+    )
+    assert resp.status_int == 404
+
+
 def test_raw_report_aws_job(
     system_user_token, sre_client, aws_tenant, aws_job
 ):
@@ -74,3 +74,82 @@ def test_iter_shard_parts_azure(azure_scan_result):
         dct[(part.location, part.policy)] = part
     assert len(dct[('global', 'ecc-azure-096-cis_sec_defender_azure_sql')].resources) == 1
     # todo add location to azure stubs
+
+
+def test_iter_shard_parts_for_region_aws(aws_scan_result):
+    item = JobResult(aws_scan_result, Cloud.AWS)
+    parts = tuple(item.iter_shard_parts_for_region('eu-central-1', {}))
+    assert parts
+    assert all(part.location == 'eu-central-1' for part in parts)
+    assert not tuple(item.iter_shard_parts_for_region('us-west-2', {}))
+
+
+def test_metadata_is_decoded_once(aws_scan_result):
+    item = JobResult(aws_scan_result, Cloud.AWS)
+    first = {(r, p): m for r, p, m, _ in item.iter_raw()}
+    second = {(r, p): m for r, p, m, _ in item.iter_raw()}
+    assert all(first[k] is second[k] for k in first)
+    assert all('filters' not in m.policy for m in first.values())
+
+    item.forget_region('global')
+    third = {(r, p): m for r, p, m, _ in item.iter_raw()}
+    assert third.keys() == first.keys()
+    for (region, policy), m in third.items():
+        assert (m is first[(region, policy)]) is (region != 'global')
+
+
+def test_profile_aws(aws_scan_result, tmp_path):
+    import shutil
+
+    from executor.job.policies.profiler import ProfilingTracer
+
+    work_dir = tmp_path / 'aws'
+    shutil.copytree(aws_scan_result, work_dir)
+    rule = next(p for p in (work_dir / 'eu-west-1').iterdir() if p.is_dir())
+
+    class Output:
+        @staticmethod
+        def write_file(rel_path, value):
+            (rule / rel_path).write_text(value)
+
+    class Ctx:
+        output = Output()
+
+    tracer = ProfilingTracer(Ctx())
+    with tracer.subsegment('resource-fetch'):
+        pass
+    with tracer.subsegment('filter'):
+        with tracer.subsegment('filter:value'):
+            pass
+    tracer.__exit__()
+
+    profile = {
+        (p['region'], p['policy']): p
+        for p in JobResult(work_dir, Cloud.AWS).profile()
+    }
+    item = profile[('eu-west-1', rule.name)]
+    assert item['describe_time'] == tracer.segments['resource-fetch'] > 0
+    assert item['filter_time'] >= item['filters']['value'] > 0
+    assert item['action_time'] == 0
+    assert sum(item['api_calls'].values()) == item['api_calls_total']
+    if (rule / 'resources.json').exists():
+        assert item['bytes_written'] == (rule / 'resources.json').stat().st_size
+
+
+def test_fingerprint_aliases(aws_scan_result):
+    region = aws_scan_result / 'eu-west-1'
+    primary = next(
+        p.name for p in region.iterdir() if (p / 'resources.json').exists()
+    )
+    item = JobResult(
+        aws_scan_result, Cloud.AWS, {'fp': [primary, 'alias-1', 'alias-2']}
+    )
+    parts = {
+        p.policy: p for p in item.iter_shard_parts({}, region='eu-west-1')
+    }
+    assert parts['alias-1'].resources is parts[primary].resources
+    assert parts['alias-2'].resources is parts[primary].resources
+    meta = item.rules_meta(region='eu-west-1')
+    assert meta['alias-1'] == meta[primary]
+    assert not (region / 'alias-1').exists()
+
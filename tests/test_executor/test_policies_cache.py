@@ -0,0 +1,107 @@
+from executor.job.policies.cache import PoliciesValidationCache
+from executor.job.policies.loader import PoliciesLoader
+from helpers.constants import Cloud, Env
+
+POLICIES = [
+    {'name': 'valid', 'resource': 'k8s.pod'},
+    {
+        'name': 'unknown-filter',
+        'resource': 'k8s.pod',
+        'filters': [{'type': 'nonexistent'}],
+    },
+    {
+        'name': 'invalid-regex',
+        'resource': 'k8s.pod',
+        'filters': [{'type': 'value', 'key': 'a', 'op': 'regex', 'value': '('}],
+    },
+]
+
+
+def test_key(tmp_path):
+    cache = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    one = {'name': 'p', 'resource': 'k8s.pod', 'filters': [{'a': 1, 'b': 2}]}
+    two = {'filters': [{'b': 2, 'a': 1}], 'resource': 'k8s.pod', 'name': 'p'}
+    assert cache.key(one) == cache.key(two)
+    assert cache.key(one) != cache.key({**one, 'name': 'other'})
+    other_cloud = PoliciesValidationCache(tmp_path, Cloud.AWS)
+    assert cache.key(one) != other_cloud.key(one)
+
+
+def test_key_depends_on_plugins(tmp_path, monkeypatch):
+    cache = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    monkeypatch.delenv(Env.ENABLE_CUSTOM_CC_PLUGINS.value, raising=False)
+    without = cache.key(POLICIES[1])
+    monkeypatch.setenv(Env.ENABLE_CUSTOM_CC_PLUGINS.value, 'true')
+    assert cache.key(POLICIES[1]) != without
+
+
+def test_reject_shared_between_instances(tmp_path):
+    cache = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    key = cache.key(POLICIES[0])
+    assert cache.rejection(key) is None
+    cache.reject(key, 'valid', 'some reason')
+    assert cache.rejection(key) == 'some reason'
+    other = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    assert other.rejection(key) == 'some reason'
+    assert PoliciesValidationCache(tmp_path, Cloud.AWS).rejection(key) is None
+
+
+def test_reject_not_persisted(tmp_path):
+    cache = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    key = cache.key(POLICIES[0])
+    cache.reject(key, 'valid', 'assertion', persist=False)
+    assert cache.rejection(key) == 'assertion'
+    other = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    assert other.rejection(key) is None
+
+
+def test_loader_skips_rejected(tmp_path):
+    cache = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    loader = PoliciesLoader(Cloud.KUBERNETES, validation_cache=cache)
+    assert [p.name for p in loader.load_from_policies(POLICIES)] == ['valid']
+    assert cache.rejection(cache.key(POLICIES[0])) is None
+    assert 'Invalid filter type' in cache.rejection(cache.key(POLICIES[1]))
+    assert 'Invalid regex' in cache.rejection(cache.key(POLICIES[2]))
+
+    # the next job does not build rejected policies at all
+    cache = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    loader = PoliciesLoader(Cloud.KUBERNETES, validation_cache=cache)
+    assert [p.name for p in loader.load_from_policies(POLICIES)] == ['valid']
+
+
+def test_valid_policies_are_not_validated_again(tmp_path, monkeypatch):
+    from c7n.policy import Policy
+
+    cache = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    loader = PoliciesLoader(Cloud.KUBERNETES, validation_cache=cache)
+    loader.load_from_policies(POLICIES)
+    assert cache.is_valid(cache.key(POLICIES[0]))
+    assert not cache.is_valid(cache.key(POLICIES[1]))
+
+    calls = []
+    original = Policy.validate
+
+    def validate(self):
+        calls.append(self.name)
+        return original(self)
+
+    monkeypatch.setattr(Policy, 'validate', validate)
+    cache = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    loader = PoliciesLoader(Cloud.KUBERNETES, validation_cache=cache)
+    items = loader.load_from_policies(POLICIES)
+    assert [p.name for p in items] == ['valid']
+    assert not calls
+    assert items[0].conditions.initialized
+
+
+def test_verdicts_are_evicted(tmp_path):
+    cache = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES, max_size=0)
+    cache.accept(cache.key(POLICIES[0]), 'valid')
+    other = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    assert not other.is_valid(cache.key(POLICIES[0]))
+
+    # pruned at most once per interval
+    cache = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES, max_size=0)
+    cache.accept(cache.key(POLICIES[0]), 'valid')
+    other = PoliciesValidationCache(tmp_path, Cloud.KUBERNETES)
+    assert other.is_valid(cache.key(POLICIES[0]))
@@ -0,0 +1,138 @@
+from executor.job.execution.region_pool import (
+    RegionSlots,
+    regions_concurrency,
+)
+from helpers.constants import Env
+
+
+def test_region_slots_budget(tmp_path):
+    first = RegionSlots(3, root=tmp_path)
+    second = RegionSlots(3, root=tmp_path)
+    assert first.acquire(2) == 2
+    assert second.acquire(5) == 1
+    first.release()
+    assert second.held == 1
+    assert first.acquire(5) == 2
+    first.release()
+    second.release()
+
+
+def test_regions_concurrency(monkeypatch):
+    monkeypatch.delenv(Env.EXECUTOR_REGIONS_CONCURRENCY.value, raising=False)
+    assert regions_concurrency(17) == 1  # sequential unless opted in
+    monkeypatch.setenv(Env.EXECUTOR_REGIONS_CONCURRENCY.value, '4')
+    assert regions_concurrency(17) == 4
+    assert regions_concurrency(2) == 2
+    monkeypatch.setenv(Env.EXECUTOR_REGIONS_CONCURRENCY.value, '0')
+    assert regions_concurrency(17) == 1
+
+
+def test_region_cache(tmp_path):
+    from executor.job.execution.region_executor import region_cache
+
+    assert region_cache('memory', 'eu-west-1') == 'memory'
+    assert region_cache(None, 'eu-west-1') is None
+    file = str(tmp_path / 'cache.sqlite')
+    assert region_cache(file, 'eu-west-1') == file
+    directory = tmp_path / 'tenant'
+    assert region_cache(str(directory), 'eu-west-1') == str(
+        directory / 'eu-west-1.sqlite'
+    )
+    assert directory.is_dir()
+
+
+def test_prune_resources_cache(tmp_path):
+    import os
+    import time
+
+    from executor.job.execution.context import prune_resources_cache
+
+    now = time.time()
+
+    def tenant(name: str, size: int, age: int):
+        path = tmp_path / (name * 64)
+        path.mkdir()
+        (path / 'eu-west-1.sqlite').write_bytes(b'0' * size)
+        for p in (path / 'eu-west-1.sqlite', path):
+            os.utime(p, (now - age, now - age))
+        return path
+
+    expired = tenant('a', 10, age=3 * 3600)
+    old = tenant('b', 100, age=30 * 60)
+    recent = tenant('c', 100, age=60)
+    current = tenant('d', 100, age=4 * 3600)
+    other = tmp_path / 'not-a-cache'
+    other.mkdir()
+    prune_resources_cache(tmp_path, current, period=120, max_size=250)
+    assert not expired.exists()
+    assert not old.exists()  # least recently used
+    assert recent.exists()
+    assert current.exists()
+    assert other.exists()
+
+
+def test_memory_watchdog():
+    from executor.job.execution.memory import MemoryWatchdog, current_rss
+
+    calls = []
+    with MemoryWatchdog(1, on_exceeded=lambda: calls.append(1)) as watchdog:
+        watchdog.check()
+    assert watchdog.exceeded
+    assert calls == [1]  # invoked once
+    assert watchdog.peak >= current_rss() > 0
+
+    with MemoryWatchdog(None, on_exceeded=lambda: calls.append(1)) as watchdog:
+        pass
+    assert not watchdog.exceeded
+    assert watchdog.peak > 0
+
+
+def test_merge_region_scans():
+    from executor.job.execution.region_executor import RegionScanResult
+    from executor.job.execution.region_pool import (
+        follow_up_task,
+        merge_region_scans,
+    )
+
+    task = (
+        [{'name': 'a'}, {'name': 'b'}, {'name': 'c'}],
+        None, None, 'eu-west-1', None, None, 'memory', 120, 4,
+    )
+    first = RegionScanResult(
+        n_successful=1,
+        failed={('eu-west-1', 'a'): ('INTERNAL', 'msg', [])},
+        load_error_detail=None,
+        peak_memory=300,
+        remaining=('b', 'c'),
+    )
+    assert merge_region_scans('eu-west-1', None, first, task) is first
+
+    follow_up = follow_up_task(task, first.remaining)
+    assert follow_up[0] == [{'name': 'b'}, {'name': 'c'}]
+    assert follow_up[3] == 'eu-west-1'
+    assert follow_up[-1] == 2
+
+    total = merge_region_scans(
+        'eu-west-1',
+        first,
+        RegionScanResult(2, {}, None, peak_memory=200),
+        follow_up,
+    )
+    assert total.n_successful == 3
+    assert total.peak_memory == 300
+    assert total.remaining == ()
+    assert set(total.failed) == {('eu-west-1', 'a')}
+
+    total = merge_region_scans(
+        'eu-west-1',
+        first,
+        RegionScanResult(0, None, 'could not load'),
+        follow_up,
+    )
+    assert total.load_error_detail is None
+    assert set(total.failed) == {
+        ('eu-west-1', 'a'),
+        ('eu-west-1', 'b'),
+        ('eu-west-1', 'c'),
+    }
+    assert total.failed[('eu-west-1', 'b')][1] == 'could not load'
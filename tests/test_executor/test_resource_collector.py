@@ -29,3 +29,52 @@ class TestCustodianResourceCollector:
         assert collector._ms == mock_sp.modular_client
         assert collector._rs == mock_sp.resources_service
         assert collector._ls == mock_sp.license_service
+
+
+def test_fair_tenants_order():
+    """Tenants of different customers are interleaved."""
+    from executor.resource_collector.collector import fair_tenants_order
+
+    def tenant(customer, name):
+        t = MagicMock()
+        t.customer_name, t.name = customer, name
+        return t
+
+    tenants = [
+        tenant('A', 'a1'),
+        tenant('A', 'a2'),
+        tenant('A', 'a3'),
+        tenant('B', 'b1'),
+        tenant('A', 'a1'),
+        tenant('C', 'c1'),
+        tenant('C', 'c2'),
+    ]
+    assert [t.name for t in fair_tenants_order(tenants)] == [
+        'a1', 'b1', 'c1', 'a2', 'c2', 'a3'
+    ]
+
+
+def test_scan_result_region_resources(tmp_path):
+    """Resources of one region are read type by type."""
+    from executor.resource_collector.collector import ScanResult
+    from helpers.constants import Cloud
+
+    for region, rt, data in (
+        ('eu-west-1', 'aws.ec2', b'[{"id": "i-1"}]'),
+        ('eu-west-1', 'aws.s3', b'[]'),
+        ('eu-central-1', 'aws.ec2', b'[{"id": "i-2"}]'),
+    ):
+        (tmp_path / region / f'collect-{rt}').mkdir(parents=True)
+        (tmp_path / region / f'collect-{rt}' / 'resources.json').write_bytes(
+            data
+        )
+
+    result = ScanResult(tmp_path, Cloud.AWS)
+    assert list(result.iter_region_resources('eu-west-1')) == [
+        ('eu-west-1', 'aws.ec2', [{'id': 'i-1'}])
+    ]
+    assert list(result.iter_region_resources('us-east-1')) == []
+    assert sorted(result.iter_resources()) == [
+        ('eu-central-1', 'aws.ec2', [{'id': 'i-2'}]),
+        ('eu-west-1', 'aws.ec2', [{'id': 'i-1'}]),
+    ]
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from executor.helpers.resources_io import (
+    ResourcesWriter,
+    iter_resource_chunks,
+    iter_resources,
+)
+
+
+@pytest.fixture
+def resources() -> list[dict]:
+    return [
+        {'id': i, 'name': f'res-{i}', 'tags': [{'Key': 'k', 'Value': '] ,{'}]}
+        for i in range(100)
+    ]
+
+
+@pytest.mark.parametrize('buffer_size', (1, 7, 64, 1 << 20))
+def test_iter_resources_stream(tmp_path, resources, buffer_size):
+    path = tmp_path / 'resources.json'
+    path.write_text(json.dumps(resources, indent=2))
+    items = iter_resources(path, threshold=0, buffer_size=buffer_size)
+    assert list(items) == resources
+
+
+@pytest.mark.parametrize('threshold', (0, 1 << 20))
+@pytest.mark.parametrize(
+    'content,expected',
+    (
+        ('', []),
+        ('  \n', []),
+        ('[]', []),
+        ('[ ]', []),
+        ('{"id": 1}', [{'id': 1}]),
+        ('[1, 22, 333]', [1, 22, 333]),
+    ),
+)
+def test_iter_resources_edge_cases(tmp_path, threshold, content, expected):
+    path = tmp_path / 'resources.json'
+    path.write_text(content)
+    assert list(iter_resources(path, threshold=threshold, buffer_size=2)) == expected
+
+
+def test_iter_resources_truncated(tmp_path):
+    path = tmp_path / 'resources.json'
+    path.write_text('[{"id": 1}, {"id": ')
+    with pytest.raises(ValueError):
+        list(iter_resources(path, threshold=0, buffer_size=4))
+
+
+def test_iter_resource_chunks(tmp_path, resources):
+    path = tmp_path / 'resources.json'
+    path.write_text(json.dumps(resources))
+    chunks = list(iter_resource_chunks(path, 30, threshold=0))
+    assert [len(c) for c in chunks] == [30, 30, 30, 10]
+    assert [r for c in chunks for r in c] == resources
+
+
+def test_resources_writer(tmp_path, resources):
+    source = tmp_path / 'source.json'
+    source.write_text(json.dumps(resources, indent=2))
+    target = tmp_path / 'target.json'
+    with ResourcesWriter(target) as writer:
+        assert writer.write_many(iter_resources(source, threshold=0)) == 100
+        writer.write({'id': 'last'})
+    assert json.loads(target.read_text()) == [*resources, {'id': 'last'}]
+
+    with ResourcesWriter(target):
+        pass
+    assert json.loads(target.read_text()) == []
@@ -0,0 +1,59 @@
+from unittest.mock import patch
+
+import boto3
+import pytest
+from moto.backends import get_backend
+
+from executor.job.rulesets.cache import RulesetsCache
+from services import SP
+
+BUCKET = 'rulesets'
+KEY = 'standard/FULL_AWS/1.0.0.json'
+
+
+@pytest.fixture
+def s3():
+    boto3.client('s3')
+    SP.s3.create_bucket(BUCKET, 'eu-central-1')
+    yield SP.s3
+    get_backend('s3').reset()
+
+
+def test_get_json(s3, tmp_path):
+    cache = RulesetsCache(tmp_path, 1 << 20)
+    assert cache.get_json(s3, BUCKET, KEY) == {}
+
+    s3.gz_put_json(BUCKET, KEY, {'policies': [{'name': 'one'}]})
+    assert cache.get_json(s3, BUCKET, KEY) == {'policies': [{'name': 'one'}]}
+
+    results = []
+
+    def get(*args):
+        results.append(original(*args))
+        return results[-1]
+
+    original = s3.get_object_if_none_match
+    with patch.object(s3, 'get_object_if_none_match', get):
+        assert cache.get_json(s3, BUCKET, KEY) == {
+            'policies': [{'name': 'one'}]
+        }
+    body, etag = results[0]
+    assert body is None and etag  # not modified, nothing was downloaded
+
+    # re-uploaded content is noticed
+    s3.gz_put_json(BUCKET, KEY, {'policies': [{'name': 'two'}]})
+    assert cache.get_json(s3, BUCKET, KEY) == {'policies': [{'name': 'two'}]}
+
+    s3.gz_delete_object(BUCKET, KEY)
+    assert cache.get_json(s3, BUCKET, KEY) == {}
+    assert not any((tmp_path / '1').iterdir())
+
+
+def test_size_bound(s3, tmp_path):
+    cache = RulesetsCache(tmp_path, 350)
+    for i in range(5):
+        s3.gz_put_json(BUCKET, f'{i}.json', {'policies': ['x' * 100]})
+        cache.get_json(s3, BUCKET, f'{i}.json')
+    entries = list((tmp_path / '1').iterdir())
+    assert len(entries) == 2
+    assert sum(e.stat().st_size for e in entries) <= 350
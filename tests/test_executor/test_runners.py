@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from executor.job.policies.runners import Runner
+from helpers.constants import Cloud, GLOBAL_REGION, PolicyErrorType
+
+
+class FakePolicy:
+    provider_name = 'k8s'
+
+    def __init__(self, name: str, fail: bool = False):
+        self.name = name
+        self.fail = fail
+        self.thread = None
+
+    def __call__(self):
+        self.thread = threading.current_thread().name
+        time.sleep(0.01)
+        if self.fail:
+            raise ValueError(f'{self.name} failed')
+
+
+@pytest.mark.parametrize('workers', (1, 4))
+def test_runner_statistics(workers):
+    policies = [FakePolicy(f'p{i}', fail=i % 3 == 0) for i in range(10)]
+    runner = Runner.factory(Cloud.KUBERNETES, list(policies), workers=workers)
+    runner.start()
+    assert runner.n_successful == 6
+    assert set(runner.failed) == {
+        (GLOBAL_REGION, 'p0'),
+        (GLOBAL_REGION, 'p3'),
+        (GLOBAL_REGION, 'p6'),
+        (GLOBAL_REGION, 'p9'),
+    }
+    assert all(
+        v[0] is PolicyErrorType.INTERNAL for v in runner.failed.values()
+    )
+    threads = {p.thread for p in policies}
+    if workers == 1:
+        assert threads == {threading.current_thread().name}
+    else:
+        assert all(t.startswith('policy') for t in threads)
+
+
+@pytest.mark.parametrize('workers', (1, 2))
+def test_runner_stop(workers):
+    policies = [FakePolicy(f'p{i}') for i in range(6)]
+    runner = Runner.factory(Cloud.KUBERNETES, list(policies), workers=workers)
+    runner.stop()  # before start, at least one policy is still executed
+    runner.start()
+    assert runner.n_successful == 1
+    assert len(runner.skipped) == 5
+    executed = {p.name for p in policies if p.thread is not None}
+    assert executed.isdisjoint(runner.skipped)
+    assert not runner.failed
+
+
+def test_runner_keeps_order():
+    policies = [FakePolicy(f'p{i}') for i in range(5)]
+    started = []
+    runner = Runner.factory(Cloud.KUBERNETES, list(policies))
+    runner._call_policy = lambda policy: started.append(policy.name)
+    runner.start()
+    assert started == [p.name for p in policies]
+
+
+def test_runner_journal(tmp_path):
+    from executor.job.scan.journal import PoliciesJournal
+
+    path = tmp_path / 'journal.jsonl'
+    policies = [FakePolicy('p0'), FakePolicy('p1', fail=True)]
+    runner = Runner.factory(
+        Cloud.KUBERNETES, policies, journal=PoliciesJournal(path)
+    )
+    runner.start()
+    entries, offset = PoliciesJournal.read(path)
+    assert offset == path.stat().st_size
+    assert [e.policy for e in entries] == ['p0', 'p1']
+    assert entries[0].failure is None
+    assert entries[1].failure[0] == PolicyErrorType.INTERNAL.value
+
+    with open(path, 'ab') as fp:
+        fp.write(b'["p2", nu')  # being written
+    assert PoliciesJournal.read(path, offset) == ([], offset)
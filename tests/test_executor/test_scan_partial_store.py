@@ -0,0 +1,167 @@
+from unittest.mock import patch
+
+import boto3
+import pytest
+from moto.backends import get_backend
+
+from executor.job.scan import ScanPartialStore
+from executor.job.scan.codec import encode_region_delta
+from helpers.constants import Cloud, PolicyErrorType
+from services import SP
+from services.sharding import ShardPart
+
+BUCKET = 'reports'
+PARTIAL = 'jobs/partial/job-id'
+
+
+@pytest.fixture
+def store():
+    boto3.client('s3')
+    SP.s3.create_bucket(BUCKET, 'eu-central-1')
+    yield ScanPartialStore(SP.s3)
+    get_backend('s3').reset()
+
+
+def test_region_deltas_are_merged(store):
+    store.write_region_delta(
+        bucket=BUCKET,
+        partial_key=PARTIAL,
+        region='eu-west-1',
+        parts=[ShardPart(policy='p1', location='eu-west-1', resources=[{}])],
+        meta={'p1': {'resource': 'aws.ec2'}},
+        failed={
+            ('eu-west-1', 'p2'): (PolicyErrorType.ACCESS, 'denied', []),
+            ('global', 'p3'): (PolicyErrorType.CLIENT, 'other region', []),
+        },
+    )
+    store.write_region_delta(
+        bucket=BUCKET,
+        partial_key=PARTIAL,
+        region='global',
+        parts=[ShardPart(policy='p3', location='global', resources=[{}])],
+        meta={'p3': {'resource': 'aws.iam-user'}},
+        failed={},
+    )
+    keys = set(SP.s3.list_dir(BUCKET, PARTIAL))
+    assert keys == {
+        f'{PARTIAL}/regions/eu-west-1.json.gz',
+        f'{PARTIAL}/regions/global.json.gz',
+    }
+    assert store.completed_regions(BUCKET, PARTIAL) == {'eu-west-1', 'global'}
+    assert store.load_failed_policies(BUCKET, PARTIAL) == {
+        ('eu-west-1', 'p2'): (PolicyErrorType.ACCESS, 'denied', []),
+    }
+
+    coll = store.load_partial_collection(Cloud.AWS, BUCKET, PARTIAL)
+    assert {(p.policy, p.location) for p in coll.iter_all_parts()} == {
+        ('p1', 'eu-west-1'),
+        ('p3', 'global'),
+    }
+    assert coll.meta == {
+        'p1': {'resource': 'aws.ec2'},
+        'p3': {'resource': 'aws.iam-user'},
+    }
+
+    store.delete_partial(BUCKET, PARTIAL)
+    assert not store.completed_regions(BUCKET, PARTIAL)
+
+
+def test_region_delta_shares_alias_resources():
+    from executor.job.scan import decode_region_delta, encode_region_delta
+
+    resources = [{'id': 'i-1'}]
+    raw = encode_region_delta(
+        region='eu-west-1',
+        parts=[
+            ShardPart(policy='p1', location='eu-west-1', resources=resources),
+            ShardPart(policy='p2', location='eu-west-1', resources=resources),
+        ],
+        meta={},
+        failed={},
+    )
+    assert raw.count(b'i-1') == 1
+    p1, p2 = decode_region_delta(raw).parts
+    assert p2.policy == 'p2'
+    assert p2.resources is p1.resources == resources
+
+
+def _write_rule(work_dir, region, name, resources=None):
+    import json
+
+    root = work_dir / region / name
+    root.mkdir(parents=True)
+    (root / 'metadata.json').write_text(
+        json.dumps(
+            {
+                'policy': {'name': name, 'resource': 'aws.ec2'},
+                'execution': {'start': 1.0, 'end_time': 2.0},
+            }
+        )
+    )
+    if resources is not None:
+        (root / 'resources.json').write_text(json.dumps(resources))
+
+
+def test_completed_policies_without_names(store):
+    # checkpoints written before the names sidecars existed
+    SP.s3.gz_put_object(
+        bucket=BUCKET,
+        key=f'{PARTIAL}/policies/eu-west-1/1.json',
+        body=encode_region_delta('eu-west-1', [], {}, {}, ['p1']),
+    )
+    store.write_policies_delta(
+        BUCKET, PARTIAL, 'eu-west-1', ['p2'], [], {}, {}
+    )
+    assert store.completed_policies(BUCKET, PARTIAL) == {
+        'eu-west-1': {'p1', 'p2'}
+    }
+
+
+def test_policy_checkpoints(store, tmp_path):
+    from executor.job.execution.checkpoints import PolicyCheckpoints
+    from executor.job.scan.journal import PoliciesJournal, journal_path
+    from executor.services.report_service import JobResult
+
+    region = 'eu-west-1'
+    result = JobResult(tmp_path, Cloud.AWS)
+    checkpoints = PolicyCheckpoints(store, BUCKET, PARTIAL, result, tmp_path)
+    checkpoints.start([region])
+    journal = PoliciesJournal(journal_path(tmp_path, region))
+
+    _write_rule(tmp_path, region, 'p1', [{'id': 1}])
+    _write_rule(tmp_path, region, 'p2')
+    _write_rule(tmp_path, region, 'running')  # not in the journal yet
+    journal.record('p1')
+    journal.record('p2', (PolicyErrorType.ACCESS, 'denied', []))
+    checkpoints.flush()
+    checkpoints.flush()  # nothing new
+
+    assert len(list(SP.s3.list_dir(BUCKET, PARTIAL))) == 2  # + names
+    with patch.object(
+        ScanPartialStore, '_get_raw', wraps=store._get_raw
+    ) as get_raw:
+        completed = store.completed_policies(BUCKET, PARTIAL)
+    assert completed == {region: {'p1', 'p2'}}
+    assert all('/names/' in c.args[1] for c in get_raw.call_args_list)
+    assert not store.completed_regions(BUCKET, PARTIAL)
+    assert store.load_failed_policies(BUCKET, PARTIAL) == {
+        (region, 'p2'): (PolicyErrorType.ACCESS, 'denied', []),
+    }
+
+    # the region is finished, its delta contains only other policies
+    exclude = checkpoints.finish(region)
+    assert exclude == {'p1', 'p2'}
+    store.write_region_delta(
+        bucket=BUCKET,
+        partial_key=PARTIAL,
+        region=region,
+        parts=result.iter_shard_parts_for_region(region, {}, exclude=exclude),
+        meta=result.rules_meta_for_region(region, exclude=exclude),
+        failed={},
+    )
+    coll = store.load_partial_collection(Cloud.AWS, BUCKET, PARTIAL)
+    parts = {p.policy: p for p in coll.iter_all_parts()}
+    assert set(parts) == {'p1', 'p2', 'running'}
+    assert parts['p1'].resources == [{'id': 1}]
+    assert parts['p2'].error == 'ACCESS:denied'
+    assert set(coll.meta) == {'p1', 'p2', 'running'}
@@ -0,0 +1,128 @@
+import boto3
+import pytest
+from moto.backends import get_backend
+
+from executor.job.policies.scheduling import (
+    PolicyOrder,
+    RuleDurationsService,
+    order_policies,
+    schedule_policies,
+)
+from helpers.constants import Cloud, Env
+from services import SP
+
+BUCKET = 'statistics'
+
+
+@pytest.fixture
+def service():
+    boto3.client('s3')
+    SP.s3.create_bucket(BUCKET, 'eu-central-1')
+    yield RuleDurationsService(SP.s3, BUCKET)
+    get_backend('s3').reset()
+
+
+def _names(policies):
+    return [p['name'] for p in policies]
+
+
+def test_order_policies():
+    policies = [{'name': n} for n in ('a', 'b', 'c', 'd')]
+    durations = {'a': 1.0, 'b': 10.0, 'c': 5.0}  # "d" gets median 5.0
+    assert _names(
+        order_policies(policies, durations, PolicyOrder.LONGEST)
+    ) == ['b', 'c', 'd', 'a']
+    assert _names(
+        order_policies(policies, durations, PolicyOrder.CHEAPEST)
+    ) == ['a', 'c', 'd', 'b']
+    assert order_policies(policies, durations, PolicyOrder.NONE) is policies
+    assert order_policies(policies, {}, PolicyOrder.LONGEST) is policies
+
+
+def test_policy_order_resolve():
+    assert PolicyOrder.AUTO.resolve(4) is PolicyOrder.LONGEST
+    assert PolicyOrder.AUTO.resolve(1) is PolicyOrder.NONE
+    assert PolicyOrder.CHEAPEST.resolve(4) is PolicyOrder.CHEAPEST
+
+
+def test_rule_durations(service):
+    assert service.get(Cloud.AWS) == {}
+    stats = [
+        {'policy': 'a', 'start_time': 0, 'end_time': 10},
+        {'policy': 'a', 'start_time': 0, 'end_time': 20},
+        {'policy': 'b', 'start_time': 0, 'end_time': 0, 'error_type': 'x'},
+    ]
+    service.update(Cloud.AWS, stats)
+    assert service.get(Cloud.AWS) == {'a': 15.0}
+
+    service.update(Cloud.AWS, [{'policy': 'a', 'start_time': 0, 'end_time': 5}])
+    assert service.get(Cloud.AWS) == {'a': 12.0}  # 0.3 * 5 + 0.7 * 15
+    assert service.get(Cloud.AZURE) == {}
+
+
+def test_schedule_policies(service, monkeypatch):
+    service.update(
+        Cloud.AWS,
+        [
+            {'policy': 'a', 'start_time': 0, 'end_time': 1},
+            {'policy': 'b', 'start_time': 0, 'end_time': 9},
+        ],
+    )
+    policies = [{'name': 'a'}, {'name': 'b'}]
+    monkeypatch.setenv(Env.EXECUTOR_POLICIES_CONCURRENCY.value, '4')
+    assert _names(schedule_policies(policies, Cloud.AWS, service)) == ['b', 'a']
+    monkeypatch.setenv(Env.EXECUTOR_POLICIES_CONCURRENCY.value, '1')
+    assert _names(schedule_policies(policies, Cloud.AWS, service)) == ['a', 'b']
+    monkeypatch.setenv(Env.EXECUTOR_POLICIES_ORDER.value, 'longest')
+    assert _names(schedule_policies(policies, Cloud.AWS, service)) == ['b', 'a']
+
+
+def test_merged_finalize_records_durations(
+    service, aws_tenant, monkeypatch, tmp_path
+):
+    from types import SimpleNamespace
+    from unittest.mock import MagicMock
+
+    from executor.job.execution.publish import finalize_standard_job_reports
+    from executor.job.scan import ScanPartialStore
+    from helpers.constants import JobType
+    from services.sharding import ShardPart
+
+    SP.s3.create_bucket('reports', 'eu-central-1')
+    monkeypatch.setattr(
+        'executor.job.integration.siem.upload_to_siem', MagicMock()
+    )
+    store = ScanPartialStore(SP.s3)
+    store.write_region_delta(
+        bucket='reports',
+        partial_key='partial',
+        region='eu-west-1',
+        parts=[
+            ShardPart(
+                policy='a', location='eu-west-1', timestamp=100.0,
+                resources=[{'id': 1}],
+            ),
+            ShardPart(policy='b', location='eu-west-1', timestamp=100.0),
+        ],
+        meta={},
+        failed={},
+        durations={('eu-west-1', 'a'): 12.5},  # "b" has no duration
+    )
+    collection, durations = store.load_partial(Cloud.AWS, 'reports', 'partial')
+    keys_builder = MagicMock()
+    keys_builder.job_result.return_value = 'result/'
+    keys_builder.latest_key.return_value = 'latest/'
+    keys_builder.parts_folder.return_value = 'parts/'
+    ctx = SimpleNamespace(
+        tenant=aws_tenant,
+        job=SimpleNamespace(id='job-id', job_type=JobType.STANDARD),
+        fingerprint_aliases={},
+        region_peak_memory={},
+        work_dir=tmp_path,
+    )
+    finalize_standard_job_reports(
+        ctx, keys_builder, Cloud.AWS, {}, 0,
+        merged_collection=collection,
+        durations=durations,
+    )
+    assert service.get(Cloud.AWS) == {'a': 12.5}
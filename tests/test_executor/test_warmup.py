@@ -0,0 +1,25 @@
+import gc
+
+from executor.job.execution.warmup import preloaded, warm_up
+from helpers.constants import Cloud, Env
+
+
+def test_preloaded_unfreezes(monkeypatch):
+    monkeypatch.setenv(Env.EXECUTOR_PRELOAD_CC.value, 'true')
+    monkeypatch.delenv(Env.ENABLE_CUSTOM_CC_PLUGINS.value, raising=False)
+    assert gc.get_freeze_count() == 0
+    with preloaded((Cloud.KUBERNETES,)):
+        assert gc.get_freeze_count() > 0
+    assert gc.get_freeze_count() == 0
+
+    from c7n.provider import resources
+
+    assert 'k8s.pod' in resources()
+    assert warm_up(Cloud.KUBERNETES)  # loaded once, no second freeze
+
+
+def test_preloaded_disabled(monkeypatch):
+    monkeypatch.setenv(Env.EXECUTOR_PRELOAD_CC.value, 'false')
+    with preloaded((Cloud.KUBERNETES,)):
+        assert gc.get_freeze_count() == 0
+    assert not warm_up(Cloud.KUBERNETES)
@@ -0,0 +1,38 @@
+from unittest.mock import create_autospec
+
+from handlers.reports.resource_report_handler import fetch_resources
+from helpers.constants import Cloud
+from services.sharding import ShardsCollection
+
+
+def make_collection():
+    collection = create_autospec(ShardsCollection, instance=True)
+    collection.meta = {
+        'bucket-1': {'resource': 'aws.s3'},
+        'bucket-2': {'resource': 's3'},
+        'instance': {'resource': 'aws.ec2'},
+        'no-meta': {},
+    }
+    return collection
+
+
+def test_fetch_resources_by_type():
+    collection = make_collection()
+    fetch_resources(collection, Cloud.AWS, 's3', 'eu-west-1')
+    collection.fetch_parts.assert_called_once_with({'bucket-1', 'bucket-2'})
+    collection.fetch.assert_not_called()
+    collection.fetch_all.assert_not_called()
+
+    collection = make_collection()
+    fetch_resources(collection, Cloud.AWS, 'aws.lambda')
+    collection.fetch_parts.assert_not_called()
+
+
+def test_fetch_resources_by_region():
+    collection = make_collection()
+    fetch_resources(collection, Cloud.AWS, region='eu-west-1')
+    collection.fetch.assert_called_once_with(region='eu-west-1')
+
+    collection = make_collection()
+    fetch_resources(collection, Cloud.AWS)
+    collection.fetch_all.assert_called_once_with()
@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from lambdas.metrics_updater.processors.findings_processor import (
+    FindingsUpdater,
+)
+
+
+def test_snapshot_keeps_layout_folder(monkeypatch):
+    monkeypatch.setenv('SRE_REPORTS_BUCKET_NAME', 'reports')
+    prefix = 'raw/customer/aws/123/latest/'
+    s3 = MagicMock()
+    s3.common_prefixes.return_value = iter([prefix])
+    s3.list_objects.return_value = iter([
+        SimpleNamespace(key=f'{prefix}0.json.gz'),
+        SimpleNamespace(key=f'{prefix}hash-8-v1/3.json.gz'),
+    ])
+    with patch(
+        'services.reports_bucket.ReportsBucketKeysBuilder.datetime',
+        return_value='2023-10-10-10/',
+    ):
+        FindingsUpdater(s3_client=s3)()
+
+    destinations = [
+        c.kwargs['destination_key'] for c in s3.copy.call_args_list
+    ]
+    assert destinations == [
+        'raw/customer/aws/123/snapshots/2023-10-10-10/0.json.gz',
+        'raw/customer/aws/123/snapshots/2023-10-10-10/hash-8-v1/3.json.gz',
+    ]
@@ -0,0 +1,10 @@
+from onprem.celery import prepare_beat_schedule
+
+
+def test_default_beat_schedule():
+    schedule = prepare_beat_schedule()
+    sweep = schedule['sweep-shards-parts']['schedule']
+    assert sweep.minute == {0}
+    assert sweep.hour == {10}
+    assert sweep.day_of_week == {0}
+    assert sweep.day_of_month == set(range(1, 32))
@@ -0,0 +1,89 @@
+from unittest.mock import patch
+
+import pytest
+from mongomock.collection import Collection
+
+from helpers.constants import ResourcesCollectorType
+from models.resource import Resource
+from services.resources_service import ResourcesService
+
+ACCOUNT_ID = '000000000023'
+
+
+@pytest.fixture
+def service():
+    svc = ResourcesService()
+    yield svc
+    svc.remove_policy_resources(ACCOUNT_ID, 'eu-west-1', 'aws.ec2')
+
+
+def _resources(svc: ResourcesService, data: dict[str, dict], ts: float):
+    return [
+        svc.create(
+            account_id=ACCOUNT_ID,
+            location='eu-west-1',
+            resource_type='aws.ec2',
+            id=i,
+            name=i,
+            arn=None,
+            data=d,
+            sync_date=ts,
+            collector_type=ResourcesCollectorType.CUSTODIAN,
+            tenant_name='TENANT',
+            customer_name='CUSTOMER',
+        )
+        for i, d in data.items()
+    ]
+
+
+def _bulk_write(col: Collection, requests, ordered=True):
+    # mongomock does not accept bulk requests of recent pymongo versions
+    for req in requests:
+        col.replace_one(req._filter, req._doc, upsert=req._upsert)
+
+
+def _stored(svc: ResourcesService) -> dict[str, tuple[dict, float]]:
+    col = Resource.mongo_adapter().get_collection(Resource)
+    return {
+        item['i']: (item['d'], item['s'])
+        for item in col.find({'aid': ACCOUNT_ID})
+    }
+
+
+@patch.object(Collection, 'bulk_write', _bulk_write)
+def _sync(service: ResourcesService, data: dict[str, dict], ts: float):
+    return service.sync_policy_resources(
+        ACCOUNT_ID, 'eu-west-1', 'aws.ec2', _resources(service, data, ts), ts
+    )
+
+
+def test_sync_policy_resources(service):
+    first = {'a': {'v': 1}, 'b': {'v': 2}, 'c': {'v': 3}}
+    stats = _sync(service, first, 1.0)
+    assert (stats.upserted, stats.deleted, stats.unchanged) == (3, 0, 0)
+    assert service.get_policy_resources_hashes(
+        ACCOUNT_ID, 'eu-west-1', 'aws.ec2'
+    ) == {r.id: r.sha256 for r in _resources(service, first, 1.0)}
+
+    # b is changed, c is gone, d is new, a is the same
+    second = {'a': {'v': 1}, 'b': {'v': 20}, 'd': {'v': 4}}
+    with patch.object(
+        Collection, 'bulk_write', autospec=True, side_effect=_bulk_write
+    ) as bulk_write:
+        stats = service.sync_policy_resources(
+            ACCOUNT_ID,
+            'eu-west-1',
+            'aws.ec2',
+            _resources(service, second, 2.0),
+            2.0,
+        )
+    assert (stats.upserted, stats.deleted, stats.unchanged) == (2, 1, 1)
+    assert stats.total == 3
+    (_, requests), kwargs = bulk_write.call_args
+    assert len(requests) == 2 and kwargs == {'ordered': False}
+
+    assert _stored(service) == {
+        'a': ({'v': 1}, 2.0),
+        'b': ({'v': 20}, 2.0),
+        'd': ({'v': 4}, 2.0),
+    }
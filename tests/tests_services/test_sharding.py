@@ -1,14 +1,50 @@
+import gzip
 import io
 import operator
-from unittest.mock import create_autospec, MagicMock
+import os
+from unittest.mock import create_autospec, MagicMock, patch
 
+import boto3
+import msgspec
 import pytest
+from moto.backends import get_backend
 
 from helpers.constants import PolicyErrorType
+from services import SP
 from services.clients.s3 import S3Client
 from services.sharding import (SingleShardDistributor, ShardPart,
                                AWSRegionDistributor, Shard, ShardsIterator,
-                               ShardsS3IO, ShardsCollection)
+                               ShardsIO, ShardsS3IO, ShardsCollection,
+                               ShardsLayout, PolicyHashDistributor,
+                               LAYOUT_META_KEY, RESOURCES_META_KEY,
+                               MAX_SHARDS, fitting_layout,
+                               diff_resources, resource_fingerprint,
+                               encode_shard, decode_shard, read_manifest,
+                               SHARD_FORMAT_MAGIC, SHARD_MANIFEST_READ_SIZE,
+                               PartsStore)
+
+
+class MemoryShardsIO(ShardsIO):
+    def __init__(self):
+        self.shards = {}
+        self.meta = {}
+        self.written = []
+
+    def write(self, n, shard):
+        self.written.append(n)
+        self.shards[n] = list(shard)
+
+    def read_raw(self, n):
+        return self.shards.get(n)
+
+    def write_meta(self, meta):
+        self.written.append('meta')
+        self.meta = {
+            k: dict(v) if isinstance(v, dict) else v for k, v in meta.items()
+        }
+
+    def read_meta(self):
+        return self.meta
 
 
 @pytest.fixture
@@ -131,14 +167,32 @@ class TestShardIterator:
         assert list(it) == [(1, shard2)]
 
 
+    def test_dirty(self, make_shard_part):
+        shard = Shard()
+        assert not shard.dirty
+        part = make_shard_part('global', 'policy1', [{'k1': 'v1'}])
+        shard.put(part)
+        assert shard.dirty
+        shard.dirty = False
+        shard.put(part)  # the same part
+        assert not shard.dirty
+        shard.pop('policy1', 'unknown')
+        assert not shard.dirty
+        shard.pop('policy1', 'global')
+        assert shard.dirty
+
+
 class TestShardsS3IO:
     @staticmethod
-    def create_writer() -> tuple[ShardsS3IO, MagicMock]:
+    def create_writer(
+        binary: bool | None = None
+    ) -> tuple[ShardsS3IO, MagicMock]:
         client = create_autospec(S3Client)
         writer = ShardsS3IO(
             bucket='reports',
             key='one/two/three',
-            client=client
+            client=client,
+            binary=binary
         )
         return writer, client
 
@@ -172,6 +226,96 @@ class TestShardsS3IO:
 
         client.gz_get_object.assert_called()
 
+    def test_aliases_are_written_by_reference(self):
+        writer, client = self.create_writer(binary=True)
+        resources = [{'id': 1}, {'id': 2}]
+        shard = Shard()
+        shard.put(ShardPart(policy='primary', location='global',
+                            timestamp=1.0, resources=resources))
+        shard.put(ShardPart(policy='alias', location='global',
+                            timestamp=1.0, resources=resources))
+        shard.put(ShardPart(policy='other', location='global',
+                            timestamp=1.0, resources=[{'id': 1}, {'id': 2}]))
+        writer.write(0, shard)
+        compressed = client.gz_put_object.call_args.kwargs['body']
+        manifest, _ = read_manifest(compressed)
+        entries = {e.policy: e for e in manifest.parts}
+        assert entries['alias'].alias_of == 'primary'
+        assert entries['other'].alias_of is None
+        assert entries['alias'].size < entries['other'].size
+
+        body = gzip.decompress(compressed)
+        client.gz_get_object.return_value = io.BytesIO(body)
+        parts = {p.policy: p for p in writer.read_raw(0)}
+        assert parts['alias'].resources is parts['primary'].resources
+        assert parts['alias'].resources == resources
+        assert parts['alias'].alias_of is None
+        assert parts['other'].resources is not parts['primary'].resources
+
+    def test_json_is_readable_by_previous_versions(self):
+        writer, client = self.create_writer()  # json by default
+        resources = [{'id': 1}]
+        shard = Shard()
+        shard.put(ShardPart(policy='primary', location='global',
+                            timestamp=1.0, resources=resources))
+        shard.put(ShardPart(policy='alias', location='global',
+                            timestamp=1.0, resources=resources))
+        writer.write(0, shard)
+        body = gzip.decompress(client.gz_put_object.call_args.kwargs['body'])
+        assert body.startswith(b'[')
+        assert b'"a"' not in body
+        assert body.count(b'"id"') == 2
+
+    def test_read_raw_many_ordered(self):
+        import time
+
+        client = create_autospec(S3Client)
+        writer = ShardsS3IO('reports', 'one', client, workers=4)
+
+        def get(bucket, key):
+            n = int(key.rsplit('/', 1)[-1].split('.')[0])
+            time.sleep(0.01 * (5 - n))  # the first shard is the slowest
+            if n == 2:
+                return None
+            return io.BytesIO(
+                b'[{"p":"p%d","l":"global","t":1.0}]' % n
+            )
+
+        client.gz_get_object.side_effect = get
+        result = list(writer.read_raw_many([0, 1, 2, 3, 4]))
+        assert [r and r[0].policy for r in result] == [
+            'p0', 'p1', None, 'p3', 'p4'
+        ]
+
+        writer.write_many((n, Shard()) for n in range(5))
+        keys = sorted(
+            c.kwargs['key'] for c in client.gz_put_object.call_args_list
+        )
+        assert keys == [f'one/{n}.json' for n in range(5)]
+
+    def test_formats(self):
+        parts = [
+            ShardPart(policy='p1', timestamp=1.0, resources=[{'id': 1}]),
+            ShardPart(policy='p2', location='eu-west-1', timestamp=2.0,
+                      error='INTERNAL:boom', previous_timestamp=1.0),
+        ]
+        binary = gzip.decompress(encode_shard(parts))
+        assert binary.startswith(SHARD_FORMAT_MAGIC + b'\x02')
+        plain = gzip.decompress(encode_shard(parts, binary=False))
+        assert plain.startswith(b'[')
+        v1 = SHARD_FORMAT_MAGIC + b'\x01' + msgspec.msgpack.encode(parts)
+        for data in (binary, plain, v1):
+            decoded = decode_shard(data)
+            assert [msgspec.structs.asdict(p) for p in decoded] == [
+                msgspec.structs.asdict(p) for p in parts
+            ]
+        with pytest.raises(ValueError):
+            decode_shard(SHARD_FORMAT_MAGIC + b'\x03' + binary[5:])
+
+        writer, client = self.create_writer()
+        client.gz_get_object.return_value = io.BytesIO(plain)
+        assert writer.read_raw(0)[1].error == 'INTERNAL:boom'
+
     def test_read_meta(self):
         writer, client = self.create_writer()
         client.gz_get_json.return_value = {'policy': {'description': 'data'}}
@@ -264,6 +408,14 @@ class TestShardCollection:
                 and {'k3': 'v3'} in p1.resources)
         assert p2.resources == [{'k3': 'v3'}]
 
+    def test_get_part(self, make_shard_part):
+        collection = self.create_collection()
+        part = make_shard_part(location='eu-west-1', policy='p1')
+        collection.put_part(part)
+        assert collection.get_part('p1', 'eu-west-1') is part
+        assert collection.get_part('p1', 'global') is None
+        assert collection.get_part('p2', 'eu-west-1') is None
+
     def test_bool(self, make_shard_part):
         collection = self.create_collection()
         assert not collection
@@ -285,3 +437,350 @@ class TestShardCollection:
 
         collection.drop_part('policy2', 'eu-west-1')
         assert not collection
+
+    def test_write_dirty(self, make_shard_part):
+        io = MemoryShardsIO()
+        collection = self.create_collection()
+        collection.io = io
+        collection.put_parts((
+            make_shard_part(location='global', policy='p1'),
+            make_shard_part(location='eu-west-1', policy='p2'),
+        ))
+        collection.meta = {'p1': {'resource': 'aws.iam'}}
+        collection.write_dirty()
+        assert io.written == [0, 1, 'meta']
+
+        # single region is merged into latest
+        io.written.clear()
+        latest = self.create_collection()
+        latest.io = io
+        latest.fetch_all()
+        latest.fetch_meta()
+        assert not latest.dirty_shards()
+        latest.put_part(make_shard_part(location='eu-west-1', policy='p3'))
+        latest.update_meta({'p1': {'resource': 'aws.iam'}})
+        latest.write_dirty()
+        assert io.written == [1, 'meta']  # the number of resources
+        assert io.meta[RESOURCES_META_KEY] == 0
+
+        # shard that became empty is written
+        io.written.clear()
+        latest.drop_part('p1', 'global')
+        latest.write_dirty()
+        assert io.written == [0]
+        assert io.shards[0] == []
+
+    def test_total_resources(self, make_shard_part):
+        io = MemoryShardsIO()
+        collection = self.create_collection()
+        collection.io = io
+        collection.put_parts((
+            make_shard_part('global', 'p1', [{'id': 1}, {'id': 2}]),
+            make_shard_part('eu-west-1', 'p2', [{'id': 3}]),
+        ))
+        collection.meta = {'p1': {'resource': 'aws.iam'}}
+        assert collection.total_resources() is None
+        collection.write_dirty()
+        assert RESOURCES_META_KEY not in io.meta
+
+        # counted once the whole collection is fetched
+        latest = self.create_collection()
+        latest.io = io
+        latest.fetch_meta()
+        latest.fetch_by_indexes([1])
+        assert latest.total_resources() is None
+        latest.fetch_rest()
+        assert latest.total_resources() == 3
+        latest.write_dirty()
+        assert io.meta[RESOURCES_META_KEY] == 3
+        assert io.meta['p1'] == {'resource': 'aws.iam'}
+
+        # only the changed shard is fetched to update the total
+        latest = self.create_collection()
+        latest.io = io
+        latest.fetch_meta()
+        latest.fetch_by_indexes([1])
+        latest.put_part(
+            make_shard_part('eu-west-1', 'p2', [{'id': 3}, {'id': 4}])
+        )
+        assert latest.total_resources() == 4
+        assert latest.fits(4, target=2)
+        assert not latest.fits(5, target=2)
+        io.written.clear()
+        latest.write_dirty()
+        assert io.written == [1, 'meta']
+        assert io.meta[RESOURCES_META_KEY] == 4
+
+
+def test_fitting_layout():
+    legacy = AWSRegionDistributor(2)
+    assert fitting_layout(200, legacy, target=100) is None
+    assert fitting_layout(250, legacy, target=100) == ShardsLayout('hash', 4)
+    assert fitting_layout(0, legacy, target=100) is None  # legacy stays
+
+    four = PolicyHashDistributor(4)
+    assert fitting_layout(400, four, target=100) is None
+    assert fitting_layout(150, four, target=100) is None
+    assert fitting_layout(50, four, target=100) == ShardsLayout('hash', 1)
+    assert fitting_layout(10 ** 9, four, target=1) == ShardsLayout(
+        'hash', MAX_SHARDS
+    )
+
+
+class TestLayoutMigration:
+    BUCKET = 'reports'
+
+    @pytest.fixture
+    def s3(self):
+        boto3.client('s3')
+        SP.s3.create_bucket(self.BUCKET, 'eu-central-1')
+        yield SP.s3
+        get_backend('s3').reset()
+
+    def collection(self, s3) -> ShardsCollection:
+        collection = ShardsCollection(AWSRegionDistributor(2))
+        collection.io = ShardsS3IO(self.BUCKET, 'latest', s3)
+        return collection
+
+    def keys(self, s3) -> list[str]:
+        return sorted(
+            obj.key for obj in s3.resource.Bucket(self.BUCKET).objects.all()
+        )
+
+    def test_migration(self, s3):
+        parts = [
+            ShardPart(policy=f'p{i}', location=region, resources=[{'i': i}])
+            for i in range(10)
+            for region in ('eu-west-1', 'eu-central-1')
+        ]
+        old = self.collection(s3)
+        old.put_parts(parts)
+        old.meta = {'p0': {'resource': 'aws.s3'}}
+        old.write_dirty()
+        assert self.keys(s3) == [
+            'latest/0.json.gz', 'latest/1.json.gz', 'latest/meta.json.gz'
+        ]
+
+        latest = self.collection(s3)
+        latest.fetch_all()
+        assert not latest.rebalance(target=10)  # 20 resources fit 2 shards
+        assert latest.rebalance(target=4)
+        assert latest.distributor.layout == ShardsLayout('hash', 8)
+        latest.write_dirty()
+        keys = self.keys(s3)
+        assert 'latest/0.json.gz' not in keys
+        assert 'latest/hash-8-v1/0.json.gz' in keys
+        assert s3.gz_get_json(self.BUCKET, 'latest/meta.json')[
+            LAYOUT_META_KEY
+        ] == {'kind': 'hash', 'n': 8, 'v': 1}
+
+        # readers that know nothing about the layout
+        reader = self.collection(s3)
+        reader.fetch(region='eu-west-1')
+        assert reader.meta == {'p0': {'resource': 'aws.s3'}}
+        assert {(p.policy, p.location) for p in reader.iter_all_parts()} == {
+            (p.policy, p.location) for p in parts
+        }
+        reader = self.collection(s3)
+        reader.fetch_all()
+        assert reader.resources_count() == 20
+        assert not reader.dirty_shards()
+
+    def test_legacy_read_without_meta(self, s3):
+        old = self.collection(s3)
+        old.put_part(ShardPart(policy='p', location='eu-west-1'))
+        old.meta = {'p': {'resource': 'aws.s3'}}
+        old.write_dirty()
+
+        reader = self.collection(s3)
+        with patch.object(ShardsS3IO, 'read_meta') as read_meta:
+            reader.fetch_all()
+            reader.fetch(region='eu-west-1')
+        read_meta.assert_not_called()
+        assert len(list(reader.iter_all_parts())) == 1
+
+        empty = ShardsCollection(AWSRegionDistributor(2))
+        empty.io = ShardsS3IO(self.BUCKET, 'missing', s3)
+        with patch.object(ShardsS3IO, 'read_meta', return_value={}) as rm:
+            empty.fetch_all()
+            empty.fetch_all()
+        rm.assert_called_once()
+
+
+def test_diff_resources():
+    assert resource_fingerprint({'a': 1, 'b': [1, 2]}) == resource_fingerprint(
+        {'b': [1, 2], 'a': 1}
+    )
+    assert resource_fingerprint({'b': [1, 2]}) != resource_fingerprint(
+        {'b': [2, 1]}
+    )
+    one, two, three = {'id': 1}, {'id': 2, 'tags': {'a': 'b'}}, {'id': 3}
+    diff = diff_resources([one, two, dict(one)], [{'tags': {'a': 'b'}, 'id': 2},
+                                                  three])
+    assert diff.added == [one]
+    assert diff.unchanged == [two]
+    assert diff.removed == [three]
+    assert diff.added[0] is one
+
+
+class TestPartialReads:
+    BUCKET = 'reports'
+
+    @pytest.fixture
+    def s3(self):
+        boto3.client('s3')
+        SP.s3.create_bucket(self.BUCKET, 'eu-central-1')
+        yield SP.s3
+        get_backend('s3').reset()
+
+    def test_fetch_parts(self, s3):
+        written = ShardsCollection(AWSRegionDistributor(2))
+        written.io = ShardsS3IO(self.BUCKET, 'latest', s3, binary=True)
+        for i in range(200):
+            written.put_part(ShardPart(policy=f'p{i}', location='eu-west-1',
+                                       resources=[{'id': os.urandom(64).hex()}
+                                                  for _ in range(10)]))
+        resources = written.get_part('p150', 'eu-west-1').resources
+        written.put_part(ShardPart(policy='alias', location='eu-west-1',
+                                   resources=written.get_part(
+                                       'p150', 'eu-west-1').resources))
+        written.write_all()
+
+        ranges = []
+        original = s3.gz_get_object_range
+
+        def get_range(*args):
+            ranges.append(args[2:4])
+            return original(*args)
+
+        # the format is known from meta.json
+        written.meta = {'p1': {'resource': 'aws.s3'}}
+        written.write_meta()
+        collection = ShardsCollection(AWSRegionDistributor(2))
+        collection.io = ShardsS3IO(self.BUCKET, 'latest', s3, binary=False)
+        collection.fetch_meta()
+        with patch.object(s3, 'gz_get_object_range', get_range):
+            collection.fetch_parts({'p1', 'alias'}, region='eu-west-1')
+        assert {p.policy for p in collection.iter_all_parts()} == {
+            'p1', 'alias'
+        }
+        assert collection.get_part('alias', 'eu-west-1').resources == resources
+        # manifest with p1, then blocks of p150 and its alias
+        assert len(ranges) == 3
+        assert all(end - start < 1000 for start, end in ranges[1:])
+        assert ranges[0] == (0, SHARD_MANIFEST_READ_SIZE - 1)
+
+        collection.put_part(ShardPart(policy='p1', location='eu-west-1'))
+        with pytest.raises(ValueError):
+            collection.write_dirty()
+
+    def test_fetch_parts_json(self, s3):
+        written = ShardsCollection(SingleShardDistributor())
+        written.io = ShardsS3IO(self.BUCKET, 'latest', s3, binary=False)
+        written.put_parts([ShardPart(policy='p1'), ShardPart(policy='p2')])
+        written.write_all()
+
+        collection = ShardsCollection(SingleShardDistributor())
+        collection.io = ShardsS3IO(self.BUCKET, 'latest', s3, binary=True)
+        collection.fetch_parts(['p2'])  # probed, no manifest
+        assert [p.policy for p in collection.iter_all_parts()] == ['p2']
+        collection.fetch_parts(['p3'], region='global')
+        assert [p.policy for p in collection.iter_all_parts()] == ['p2']
+
+        # JSON shards are expected, they are not probed
+        collection = ShardsCollection(SingleShardDistributor())
+        collection.io = ShardsS3IO(self.BUCKET, 'latest', s3, binary=False)
+        with patch.object(s3, 'gz_get_object_range') as get_range:
+            collection.fetch_parts(['p1'])
+        get_range.assert_not_called()
+        assert [p.policy for p in collection.iter_all_parts()] == ['p1']
+
+
+class TestPartsStore:
+    BUCKET = 'reports'
+
+    @pytest.fixture
+    def s3(self):
+        boto3.client('s3')
+        SP.s3.create_bucket(self.BUCKET, 'eu-central-1')
+        yield SP.s3
+        get_backend('s3').reset()
+
+    def keys(self, s3, prefix) -> list[str]:
+        bucket = s3.resource.Bucket(self.BUCKET)
+        return sorted(o.key for o in bucket.objects.filter(Prefix=prefix))
+
+    def test_parts_are_shared(self, s3):
+        store = PartsStore(s3, self.BUCKET, 'tenant/parts', min_resources=2)
+        big = [{'id': i} for i in range(5)]
+        parts = [
+            ShardPart(policy='big', location='eu-west-1', resources=big),
+            ShardPart(policy='alias', location='eu-west-1', resources=big),
+            ShardPart(policy='small', location='eu-west-1',
+                      resources=[{'id': 1}]),
+        ]
+        for key in ('job', 'latest'):
+            collection = ShardsCollection(AWSRegionDistributor(2))
+            collection.io = ShardsS3IO(self.BUCKET, f'tenant/{key}', s3,
+                                       binary=True, parts=store)
+            collection.put_parts(parts)
+            collection.write_all()
+        stored = self.keys(s3, 'tenant/parts')
+        assert len(stored) == 1  # one object for both collections and alias
+
+        # another writer finds the object and does not put it again
+        other = PartsStore(s3, self.BUCKET, 'tenant/parts', min_resources=2)
+        with patch.object(s3, 'gz_put_object') as put:
+            other.externalize(parts[0])
+        put.assert_not_called()
+
+        reader = ShardsCollection(AWSRegionDistributor(2))
+        reader.io = ShardsS3IO(self.BUCKET, 'tenant/latest', s3)
+        reader.fetch_all()
+        assert reader.get_part('big', 'eu-west-1').resources == big
+        assert reader.get_part('alias', 'eu-west-1').resources == big
+        assert reader.get_part('small', 'eu-west-1').resources == [{'id': 1}]
+        assert reader.get_part('big', 'eu-west-1').ref is None
+
+        reader = ShardsCollection(AWSRegionDistributor(2))
+        reader.io = ShardsS3IO(self.BUCKET, 'tenant/job', s3)
+        reader.fetch_parts(['alias'])
+        assert reader.get_part('alias', 'eu-west-1').resources == big
+
+    def test_json_shards_keep_parts(self, s3):
+        store = PartsStore(s3, self.BUCKET, 'tenant/parts', min_resources=1)
+        collection = ShardsCollection(SingleShardDistributor())
+        collection.io = ShardsS3IO(self.BUCKET, 'tenant/latest', s3,
+                                   binary=False, parts=store)
+        collection.put_part(ShardPart(policy='p', resources=[{'id': 1}]))
+        collection.write_all()
+        assert not self.keys(s3, 'tenant/parts')
+
+    def test_sweep(self, s3):
+        store = PartsStore(s3, self.BUCKET, 'tenant/parts', min_resources=1,
+                           grace=0)
+        for key, resources in (('latest', [{'id': 1}]),
+                               ('snapshot', [{'id': 2}])):
+            collection = ShardsCollection(SingleShardDistributor())
+            collection.io = ShardsS3IO(self.BUCKET, f'tenant/{key}', s3,
+                                       binary=True, parts=store)
+            collection.put_part(ShardPart(policy='p', resources=resources))
+            collection.write_all()
+        assert len(self.keys(s3, 'tenant/parts')) == 2
+
+        # recent objects are kept even if nothing refers to them
+        kept = PartsStore(s3, self.BUCKET, 'tenant/parts', grace=3600)
+        assert kept.sweep([]) == 0
+
+        # the snapshot expired
+        assert store.sweep(['tenant/latest/0.json.gz']) == 1
+        reader = ShardsCollection(SingleShardDistributor())
+        reader.io = ShardsS3IO(self.BUCKET, 'tenant/latest', s3)
+        reader.fetch_all()
+        assert reader.get_part('p', 'global').resources == [{'id': 1}]
+        assert len(self.keys(s3, 'tenant/parts')) == 1
+
+    def test_disabled_by_default(self, s3):
+        store = PartsStore(s3, self.BUCKET, 'tenant/parts')
+        part = ShardPart(policy='p', resources=[{'id': i} for i in range(500)])
+        assert store.externalize(part) is part
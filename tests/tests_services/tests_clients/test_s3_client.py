@@ -1,6 +1,13 @@
-from services.clients.s3 import S3Url
+import gzip
+import io
+import os
 
+import boto3
 import pytest
+from moto.backends import get_backend
+
+from services import SP
+from services.clients.s3 import GzipStream, S3Url
 
 def test_s3_url():
     assert S3Url('s3://my-bucket/one/two/three.json').bucket == 'my-bucket'
@@ -20,3 +27,32 @@ def test_s3_url():
     assert S3Url.build('my-bucket', '/one/two/three.json').bucket == 'my-bucket'
     assert S3Url.build('my-bucket', '/one/two/three.json').key == 'one/two/three.json'
     assert S3Url.build('my-bucket', '/one/two/three.json').url == 's3://my-bucket/one/two/three.json'
+
+
+def test_gzip_stream():
+    data = os.urandom(1 << 16) * 40  # compressible, several chunks
+    stream = GzipStream(io.BytesIO(data), chunk_size=1 << 16)
+    compressed = b''
+    while chunk := stream.read(5000):
+        compressed += chunk
+    assert gzip.decompress(compressed) == data
+
+
+@pytest.fixture
+def s3():
+    boto3.client('s3')
+    SP.s3.create_bucket('bucket', 'eu-central-1')
+    yield SP.s3
+    get_backend('s3').reset()
+
+
+def test_gz_put_get_object(s3):
+    s3.gz_put_object('bucket', 'bytes.json', b'{"a": 1}')
+    assert s3.gz_get_json('bucket', 'bytes.json') == {'a': 1}
+
+    data = os.urandom(1 << 20) * 10  # multipart upload
+    s3.gz_put_object('bucket', 'stream.bin', io.BytesIO(data))
+    assert s3.object_exists('bucket', 'stream.bin.gz')
+    assert s3.gz_get_object('bucket', 'stream.bin').getvalue() == data
+
+    assert s3.gz_get_object('bucket', 'missing.json') is None